@@ -1,12 +1,37 @@
 import hashlib
 import os
-import pickle
-import json
-from pathlib import Path
+import atexit
+from functools import lru_cache
+from ci_engine.cache_store import CacheStore
+from ci_engine.remote_cache import HttpCacheBackend, TieredCacheBackend
 
 CACHE_DIR = ".ci_cache"
 LANGUAGE_AWARE_CACHE_DIR = os.path.join(CACHE_DIR, "language_aware")
 
+# Single SQLite file inside CACHE_DIR holding every cache entry
+CACHE_DB_NAME = "cache.db"
+
+# Directory inside CACHE_DIR for cross-process run locks
+LOCK_DIR_NAME = "locks"
+
+# Eviction: byte budget, age limit and policy ("lru" or "lfu")
+CACHE_MAX_BYTES = int(os.environ.get("CI_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+CACHE_TTL_SECONDS = int(os.environ.get("CI_CACHE_TTL", 30 * 24 * 3600))
+CACHE_EVICTION_POLICY = os.environ.get("CI_CACHE_EVICTION", "lru")
+
+# Shared cache server (see ci_engine/cache_server.py); unset for local-only caching
+REMOTE_CACHE_URL = os.environ.get("CI_REMOTE_CACHE_URL")
+
+# Seconds to wait at exit for background uploads to the shared cache
+UPLOAD_FLUSH_TIMEOUT = 30
+
+# Dependency lockfiles whose contents are folded into cache keys
+DEPENDENCY_LOCKFILES = [
+    "requirements.txt", "poetry.lock", "Pipfile.lock", "uv.lock",
+    "package-lock.json", "yarn.lock", "pnpm-lock.yaml",
+    "go.sum", "Cargo.lock", "Gemfile.lock", "composer.lock"
+]
+
 # Mapping of file extensions to programming languages
 LANGUAGE_EXTENSIONS = {
     ".py": "python",
@@ -29,81 +54,283 @@ LANGUAGE_EXTENSIONS = {
     ".scala": "scala",
 }
 
-def get_file_language(filepath):
-    """Extract language from file extension."""
-    ext = Path(filepath).suffix.lower()
-    return LANGUAGE_EXTENSIONS.get(ext, "unknown")
+# Interpreters named on a #! line, after stripping any version suffix
+SHEBANG_LANGUAGES = {
+    "python": "python",
+    "pypy": "python",
+    "node": "javascript",
+    "nodejs": "javascript",
+    "deno": "typescript",
+    "ts-node": "typescript",
+    "ruby": "ruby",
+    "php": "php",
+    "scala": "scala",
+    "kotlin": "kotlin",
+    "swift": "swift",
+}
+
+# Bytes read from an extensionless file to detect its language
+CONTENT_SNIFF_BYTES = 256
+
+_SEPARATORS = os.sep + (os.altsep or "")
+
+def _file_suffix(filepath):
+    """Path(filepath).suffix without building a Path."""
+    name = filepath
+    for sep in _SEPARATORS:
+        name = name.rpartition(sep)[2]
+    dot = name.rfind(".")
+    return name[dot:] if 0 < dot < len(name) - 1 else ""
+
+@lru_cache(maxsize=1024)
+def _suffix_language(suffix):
+    return LANGUAGE_EXTENSIONS.get(suffix.lower(), "unknown")
+
+def _shebang_language(head):
+    """Language of a script from its first bytes, or "unknown"."""
+    if head.startswith(b"<?php"):
+        return "php"
+    if not head.startswith(b"#!"):
+        return "unknown"
+    words = head[2:].split(b"\n", 1)[0].decode("utf-8", "replace").split()
+    if words and os.path.basename(words[0]) == "env":
+        # #!/usr/bin/env [-S] [VAR=value ...] interpreter
+        words = [w for w in words[1:] if not w.startswith("-") and "=" not in w]
+    if not words:
+        return "unknown"
+    interpreter = os.path.basename(words[0]).rstrip("0123456789.")
+    return SHEBANG_LANGUAGES.get(interpreter, "unknown")
+
+# abspath -> ((mtime_ns, size), language) for extensionless files
+_CONTENT_LANGUAGE_MEMO = {}
+
+def _content_language(filepath):
+    """Language of an extensionless file from its #! line, memoized by mtime."""
+    path = os.path.abspath(filepath)
+    try:
+        st = os.stat(path)
+    except OSError:
+        _CONTENT_LANGUAGE_MEMO.pop(path, None)
+        return "unknown"
+    signature = (st.st_mtime_ns, st.st_size)
+    memo = _CONTENT_LANGUAGE_MEMO.get(path)
+    if memo and memo[0] == signature:
+        return memo[1]
+    language = "unknown"
+    if st.st_size:
+        try:
+            with open(path, "rb") as f:
+                language = _shebang_language(f.read(CONTENT_SNIFF_BYTES))
+        except OSError:
+            pass
+    _CONTENT_LANGUAGE_MEMO[path] = (signature, language)
+    return language
+
+def get_file_language(filepath, detect_content=False):
+    """Extract language from file extension.
+
+    With detect_content, files without an extension are classified by
+    their #! line instead.
+    """
+    suffix = _file_suffix(filepath)
+    if not suffix and detect_content:
+        return _content_language(filepath)
+    return _suffix_language(suffix)
+
+def classify_files(paths, detect_content=False, root="."):
+    """Language of each of paths, in order; a batch get_file_language.
+
+    Each distinct suffix is looked up once. Relative paths are opened
+    against root when detect_content reads extensionless files.
+    """
+    by_suffix = {}
+    languages = []
+    append = languages.append
+    for path in paths:
+        suffix = _file_suffix(path)
+        if not suffix and detect_content:
+            append(_content_language(os.path.join(root, path)))
+            continue
+        language = by_suffix.get(suffix)
+        if language is None:
+            language = by_suffix[suffix] = _suffix_language(suffix)
+        append(language)
+    return languages
+
+def group_by_language(paths, detect_content=False, root="."):
+    """{language: [indices into paths]}, in path order."""
+    groups = {}
+    for i, language in enumerate(classify_files(paths, detect_content, root)):
+        groups.setdefault(language, []).append(i)
+    return groups
 
 def hash_dependencies(requirements_file):
     with open(requirements_file, "rb") as f:
         return hashlib.md5(f.read()).hexdigest()
 
+def hash_lockfiles(lockfiles=DEPENDENCY_LOCKFILES, root="."):
+    """Combined digest of whichever dependency lockfiles exist under root."""
+    h = hashlib.sha256()
+    for lockfile in lockfiles or ():
+        path = os.path.join(root, lockfile)
+        if os.path.exists(path):
+            h.update(f"{lockfile}\0{hash_dependencies(path)}\n".encode())
+    return h.hexdigest()
+
+# abspath -> ((inode, mtime_ns, size), git blob id)
+_DIGEST_MEMO = {}
+
+def file_digest(filepath):
+    """Content digest of a file, memoized by (inode, mtime, size).
+
+    The digest is the file's git blob id, so ids git already reports
+    (see seed_file_digests) are used without reading the file.
+    Returns "missing" for files that no longer exist (e.g. deletions).
+    """
+    path = os.path.abspath(filepath)
+    try:
+        st = os.stat(path)
+    except OSError:
+        _DIGEST_MEMO.pop(path, None)
+        return "missing"
+
+    signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+    memo = _DIGEST_MEMO.get(path)
+    if memo and memo[0] == signature:
+        return memo[1]
+
+    h = hashlib.sha1(b"blob %d\0" % st.st_size)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    _DIGEST_MEMO[path] = (signature, digest)
+    return digest
+
+def seed_file_digests(blob_ids, root="."):
+    """Record known git blob ids ({path: id}) as file digests.
+
+    Paths are relative to root. Only use ids git has checked against
+    the working tree, such as the new side of a diff against it.
+    """
+    for rel_path, blob_id in blob_ids.items():
+        if not blob_id:
+            continue
+        path = os.path.abspath(os.path.join(root, rel_path))
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        _DIGEST_MEMO[path] = ((st.st_ino, st.st_mtime_ns, st.st_size), blob_id)
+
+# Namespaces within the cache store
+STANDARD_NAMESPACE = "standard"
+LANGUAGE_NAMESPACE = "language_aware"
+LANGUAGE_MAP_NAMESPACE = "language_map"
+TEST_RESULT_NAMESPACE = "tests"
+
+_STORES = {}
+
+def get_cache_store():
+    """Return the cache store for the current CACHE_DIR, opening it on first use."""
+    path = os.path.join(CACHE_DIR, CACHE_DB_NAME)
+    store = _STORES.get(path)
+    if store is None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        store = _STORES[path] = CacheStore(
+            path,
+            max_bytes=CACHE_MAX_BYTES or None,
+            ttl_seconds=CACHE_TTL_SECONDS or None,
+            policy=CACHE_EVICTION_POLICY
+        )
+    return store
+
+def get_lock_dir():
+    """Directory for lock files coordinating runs across processes."""
+    return os.path.join(CACHE_DIR, LOCK_DIR_NAME)
+
+_BACKENDS = {}
+
+def get_cache_backend():
+    """Backend used by the load/save functions.
+
+    The local store, or when REMOTE_CACHE_URL is set, the local store
+    reading through to the shared cache with background uploads.
+    """
+    store = get_cache_store()
+    if not REMOTE_CACHE_URL:
+        return store
+    key = (store.path, REMOTE_CACHE_URL)
+    backend = _BACKENDS.get(key)
+    if backend is None:
+        backend = _BACKENDS[key] = TieredCacheBackend(store, HttpCacheBackend(REMOTE_CACHE_URL))
+        atexit.register(backend.flush, UPLOAD_FLUSH_TIMEOUT)
+    return backend
+
 def load_cache(cache_key):
     """Load standard cache."""
-    path = os.path.join(CACHE_DIR, cache_key)
-    if os.path.exists(path):
-        with open(path, "rb") as f:
-            return pickle.load(f)
-    return None
+    return get_cache_backend().get(STANDARD_NAMESPACE, cache_key)
 
 def save_cache(cache_key, data):
     """Save standard cache."""
-    os.makedirs(CACHE_DIR, exist_ok=True)
-    with open(os.path.join(CACHE_DIR, cache_key), "wb") as f:
-        pickle.dump(data, f)
+    get_cache_backend().put(STANDARD_NAMESPACE, cache_key, data)
+
+def _test_result_key(test, digest):
+    return f"{test}\0{digest}"
+
+def load_test_results(digests):
+    """Load cached per-test results for a dict of test -> input digest."""
+    keys = {_test_result_key(test, digest): test for test, digest in digests.items() if digest is not None}
+    found = get_cache_backend().get_many(TEST_RESULT_NAMESPACE, keys)
+    return {keys[key]: record for key, record in found.items()}
+
+def save_test_results(records):
+    """Save per-test results from a dict of test -> (input digest, result)."""
+    get_cache_backend().put_many(TEST_RESULT_NAMESPACE, {
+        _test_result_key(test, digest): record
+        for test, (digest, record) in records.items() if digest is not None
+    })
 
 def load_language_aware_cache(cache_key, language=None):
     """Load language-aware cache. If language is None, loads the language map."""
-    lang_dir = LANGUAGE_AWARE_CACHE_DIR
     if language:
-        path = os.path.join(lang_dir, f"{cache_key}_{language}.pkl")
-    else:
-        path = os.path.join(lang_dir, f"{cache_key}_map.json")
-    
-    if os.path.exists(path):
-        if language:
-            with open(path, "rb") as f:
-                return pickle.load(f)
-        else:
-            with open(path, "r") as f:
-                return json.load(f)
-    return None
+        return get_cache_backend().get(LANGUAGE_NAMESPACE, f"{cache_key}:{language}")
+    return get_cache_backend().get(LANGUAGE_MAP_NAMESPACE, cache_key)
 
 def save_language_aware_cache(cache_key, data, language):
     """Save language-aware cache for a specific language."""
-    os.makedirs(LANGUAGE_AWARE_CACHE_DIR, exist_ok=True)
-    path = os.path.join(LANGUAGE_AWARE_CACHE_DIR, f"{cache_key}_{language}.pkl")
-    with open(path, "wb") as f:
-        pickle.dump(data, f)
+    get_cache_backend().put(LANGUAGE_NAMESPACE, f"{cache_key}:{language}", data, tag=language)
 
 def save_language_map(cache_key, language_map):
     """Save the language distribution map for a cache key."""
-    os.makedirs(LANGUAGE_AWARE_CACHE_DIR, exist_ok=True)
-    path = os.path.join(LANGUAGE_AWARE_CACHE_DIR, f"{cache_key}_map.json")
-    with open(path, "w") as f:
-        json.dump(language_map, f, indent=2)
+    get_cache_backend().put(LANGUAGE_MAP_NAMESPACE, cache_key, language_map)
 
 def get_cache_stats():
-    """Get statistics about cached items, including language breakdown."""
+    """Get statistics about cached items, including language breakdown.
+
+    Read from counters the store maintains on every write, so this does
+    not scan entries.
+    """
+    counters = get_cache_store().counters()
+
+    def total(namespace):
+        return counters.get(namespace, {}).get("", {}).get("entries", 0)
+
     stats = {
-        "total_caches": 0,
-        "total_language_caches": 0,
+        "total_caches": total(STANDARD_NAMESPACE),
+        "total_language_caches": total(LANGUAGE_NAMESPACE),
+        "total_test_results": total(TEST_RESULT_NAMESPACE),
         "languages": {},
+        "total_bytes": sum(c.get("", {}).get("bytes", 0) for c in counters.values()),
         "cache_dir": CACHE_DIR,
-        "language_aware_dir": LANGUAGE_AWARE_CACHE_DIR
+        "language_aware_dir": LANGUAGE_AWARE_CACHE_DIR,
+        "cache_db": get_cache_store().path,
+        "eviction": get_cache_store().eviction_stats(),
+        "remote_url": REMOTE_CACHE_URL
     }
-    
-    if os.path.exists(CACHE_DIR):
-        stats["total_caches"] = len([f for f in os.listdir(CACHE_DIR) if f.endswith(".pkl")])
-    
-    if os.path.exists(LANGUAGE_AWARE_CACHE_DIR):
-        for file in os.listdir(LANGUAGE_AWARE_CACHE_DIR):
-            if file.endswith(".pkl"):
-                stats["total_language_caches"] += 1
-                # Extract language from filename (format: key_language.pkl)
-                parts = file.replace(".pkl", "").rsplit("_", 1)
-                if len(parts) == 2:
-                    language = parts[1]
-                    stats["languages"][language] = stats["languages"].get(language, 0) + 1
+
+    for tag, counts in counters.get(LANGUAGE_NAMESPACE, {}).items():
+        if tag and counts["entries"]:
+            stats["languages"][tag] = counts["entries"]
     
     return stats
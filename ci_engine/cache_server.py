@@ -0,0 +1,110 @@
+"""
+Reference server for the shared HTTP cache.
+Backs the HttpCacheBackend protocol with a local CacheStore; meant for
+local testing and small teams, not as a hardened service.
+
+Usage:
+    python -m ci_engine.cache_server --port 8765 --db .ci_cache/shared.db
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ci_engine.cache_store import CacheStore
+
+# Largest request body accepted, in bytes
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+class CacheRequestHandler(BaseHTTPRequestHandler):
+    """POST /v1/get, POST /v1/put and GET /v1/stats over a CacheStore."""
+
+    store = None
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length <= 0 or length > MAX_REQUEST_BYTES:
+            return None
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return None
+
+    def do_POST(self):
+        payload = self._read_json()
+        if not isinstance(payload, dict) or not isinstance(payload.get("namespace"), str):
+            self._reply(400, {"error": "expected a JSON object with a namespace"})
+            return
+
+        if self.path == "/v1/get":
+            keys = [k for k in payload.get("keys", []) if isinstance(k, str)]
+            found = self.store.get_many_tagged(payload["namespace"], keys)
+            self._reply(200, {
+                "found": {key: value for key, (value, _) in found.items()},
+                # Lets clients that copy hits into a local store keep the tags
+                "tags": {key: tag for key, (_, tag) in found.items() if tag}
+            })
+        elif self.path == "/v1/put":
+            items = payload.get("items")
+            if not isinstance(items, dict):
+                self._reply(400, {"error": "items must be an object"})
+                return
+            self.store.put_many(payload["namespace"], items, payload.get("tag") or "")
+            self._reply(200, {"stored": len(items)})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_GET(self):
+        if self.path == "/v1/stats":
+            self._reply(200, {"counters": self.store.counters(), "eviction": self.store.eviction_stats()})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def log_message(self, format, *args):
+        pass
+
+def make_server(store, host="127.0.0.1", port=8765):
+    """Create (but do not start) a cache server bound to host:port."""
+    handler = type("BoundCacheRequestHandler", (CacheRequestHandler,), {"store": store})
+    return ThreadingHTTPServer((host, port), handler)
+
+def serve_in_background(store, host="127.0.0.1", port=0):
+    """Start a server on a daemon thread; returns (server, base_url)."""
+    server = make_server(store, host, port)
+    threading.Thread(target=server.serve_forever, name="cache-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description="HybridCI shared cache server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--db", default=os.path.join(".ci_cache", "shared.db"))
+    parser.add_argument("--max-bytes", type=int, default=None)
+    parser.add_argument("--ttl", type=int, default=None)
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+    store = CacheStore(args.db, max_bytes=args.max_bytes, ttl_seconds=args.ttl)
+    server = make_server(store, args.host, args.port)
+    print(f"Serving cache at http://{args.host}:{server.server_address[1]} (db: {args.db})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
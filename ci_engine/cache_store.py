@@ -0,0 +1,311 @@
+"""
+Single-file cache storage backed by SQLite in WAL mode.
+Replaces one-pickle-per-key files with an indexed table, batch
+get/put, atomic transactions and stats counters maintained on write,
+bounded by a byte budget (LRU or LFU) and a TTL.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+EVICTION_POLICIES = ("lru", "lfu")
+
+# Eviction trims the store to this fraction of the byte budget so it
+# runs once per batch of writes rather than on every write
+EVICTION_LOW_WATERMARK = 0.9
+
+# Minimum seconds between TTL sweeps
+TTL_SWEEP_INTERVAL = 60
+
+# Buffered access updates are flushed after this many reads
+TOUCH_FLUSH_THRESHOLD = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    tag TEXT NOT NULL DEFAULT '',
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL DEFAULT 0,
+    hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS metrics (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS counters (
+    namespace TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    entries INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (namespace, tag)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    INSERT INTO counters (namespace, tag, entries, bytes) VALUES (NEW.namespace, '', 1, NEW.size)
+        ON CONFLICT (namespace, tag) DO UPDATE SET entries = entries + 1, bytes = bytes + NEW.size;
+    INSERT INTO counters (namespace, tag, entries, bytes) SELECT NEW.namespace, NEW.tag, 1, NEW.size WHERE NEW.tag != ''
+        ON CONFLICT (namespace, tag) DO UPDATE SET entries = entries + 1, bytes = bytes + NEW.size;
+END;
+
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    UPDATE counters SET entries = entries - 1, bytes = bytes - OLD.size
+        WHERE namespace = OLD.namespace AND tag IN ('', OLD.tag);
+END;
+"""
+
+# Created after migrating stores written before access tracking existed
+INDEXES = """
+CREATE INDEX IF NOT EXISTS entries_created ON entries (created);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (accessed);
+CREATE INDEX IF NOT EXISTS entries_lfu ON entries (hits, accessed);
+"""
+
+class CacheBackend:
+    """Interface for cache storage behind cache_manager's load/save functions.
+
+    Backends store JSON-serializable values by (namespace, key) and only
+    need to implement get_many and put_many.
+    """
+
+    def get_many(self, namespace, keys):
+        raise NotImplementedError
+
+    def put_many(self, namespace, items, tag=""):
+        raise NotImplementedError
+
+    def get_many_tagged(self, namespace, keys):
+        """Like get_many, as {key: (value, tag)}; "" where tags are not kept."""
+        return {key: (value, "") for key, value in self.get_many(namespace, keys).items()}
+
+    def get(self, namespace, key):
+        return self.get_many(namespace, [key]).get(key)
+
+    def put(self, namespace, key, value, tag=""):
+        self.put_many(namespace, {key: value}, tag)
+
+    def flush(self, timeout=None):
+        """Wait for any pending background writes."""
+
+class CacheStore(CacheBackend):
+    """Key/value cache in one SQLite file, partitioned by namespace.
+
+    Values are stored as JSON, so loading never executes code. Each
+    thread gets its own connection; writes are single transactions.
+    """
+
+    def __init__(self, path, max_bytes=None, ttl_seconds=None, policy="lru"):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.policy = policy
+        self._local = threading.local()
+        self._touch_lock = threading.Lock()
+        self._pending_touches = {}
+        self._last_sweep = 0
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(entries)")}
+        with conn:
+            if "accessed" not in columns:
+                conn.execute("ALTER TABLE entries ADD COLUMN accessed REAL NOT NULL DEFAULT 0")
+                conn.execute("UPDATE entries SET accessed = created")
+            if "hits" not in columns:
+                conn.execute("ALTER TABLE entries ADD COLUMN hits INTEGER NOT NULL DEFAULT 0")
+        conn.executescript(INDEXES)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def get_many(self, namespace, keys):
+        """Return a dict of key -> value for the keys that are present."""
+        return {key: value for key, (value, _) in self.get_many_tagged(namespace, keys).items()}
+
+    def get_many_tagged(self, namespace, keys):
+        """Return a dict of key -> (value, tag) for the keys that are present."""
+        keys = list(keys)
+        found = {}
+        conn = self._connect()
+        # Stay well under SQLite's bound-parameter limit
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, value, tag FROM entries WHERE namespace = ? AND key IN ({placeholders})",
+                [namespace] + chunk
+            )
+            for key, value, tag in rows:
+                found[key] = (json.loads(value), tag)
+        if found:
+            self._touch(namespace, found)
+        return found
+
+    def _touch(self, namespace, keys):
+        """Record reads in memory; they reach the database in batches."""
+        now = time.time()
+        with self._touch_lock:
+            for key in keys:
+                _, hits = self._pending_touches.get((namespace, key), (now, 0))
+                self._pending_touches[(namespace, key)] = (now, hits + 1)
+            should_flush = len(self._pending_touches) >= TOUCH_FLUSH_THRESHOLD
+        if should_flush:
+            self.flush_access()
+
+    def flush_access(self):
+        """Write buffered access times and hit counts."""
+        with self._touch_lock:
+            touches, self._pending_touches = self._pending_touches, {}
+        if not touches:
+            return
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "UPDATE entries SET accessed = MAX(accessed, ?), hits = hits + ? WHERE namespace = ? AND key = ?",
+                [(accessed, hits, ns, key) for (ns, key), (accessed, hits) in touches.items()]
+            )
+
+    def put_many(self, namespace, items, tag=""):
+        """Store a dict of key -> value atomically in one transaction."""
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            blob = json.dumps(value, separators=(",", ":")).encode()
+            rows.append((namespace, key, tag, blob, len(blob), now))
+        if not rows:
+            return
+        conn = self._connect()
+        with conn:
+            # Delete first so the counter triggers see the replaced size
+            conn.executemany(
+                "DELETE FROM entries WHERE namespace = ? AND key = ?",
+                [(r[0], r[1]) for r in rows]
+            )
+            conn.executemany(
+                "INSERT INTO entries (namespace, key, tag, value, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [row + (now,) for row in rows]
+            )
+        self.maybe_evict()
+
+    def delete(self, namespace, key):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def total_bytes(self):
+        row = self._connect().execute("SELECT COALESCE(SUM(bytes), 0) FROM counters WHERE tag = ''").fetchone()
+        return row[0]
+
+    def maybe_evict(self):
+        """Amortized eviction check, run after writes.
+
+        Evicts only when the byte budget is exceeded or a TTL sweep is due.
+        """
+        now = time.time()
+        sweep_due = self.ttl_seconds is not None and now - self._last_sweep >= TTL_SWEEP_INTERVAL
+        over_budget = self.max_bytes is not None and self.total_bytes() > self.max_bytes
+        if sweep_due or over_budget:
+            self.evict(now)
+
+    def evict(self, now=None):
+        """Drop expired entries, then trim to the byte budget by policy.
+
+        Returns a dict with the number of entries and bytes removed.
+        """
+        now = now or time.time()
+        self.flush_access()
+        self._last_sweep = now
+        conn = self._connect()
+        removed = {"expired": 0, "evicted": 0, "bytes": 0}
+
+        with conn:
+            if self.ttl_seconds is not None:
+                cutoff = now - self.ttl_seconds
+                expired_bytes = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE created < ?", (cutoff,)
+                ).fetchone()
+                conn.execute("DELETE FROM entries WHERE created < ?", (cutoff,))
+                removed["expired"], removed["bytes"] = expired_bytes
+
+        total = self.total_bytes()
+        if self.max_bytes is not None and total > self.max_bytes:
+            order = "accessed" if self.policy == "lru" else "hits, accessed"
+            excess = total - int(self.max_bytes * EVICTION_LOW_WATERMARK)
+            while excess > 0:
+                victims = []
+                freed = 0
+                for namespace, key, size in conn.execute(
+                    f"SELECT namespace, key, size FROM entries ORDER BY {order} LIMIT 500"
+                ).fetchall():
+                    victims.append((namespace, key))
+                    freed += size
+                    if freed >= excess:
+                        break
+                if not victims:
+                    break
+                with conn:
+                    conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", victims)
+                removed["evicted"] += len(victims)
+                removed["bytes"] += freed
+                excess -= freed
+
+        if removed["expired"] or removed["evicted"]:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO metrics (name, value) VALUES (?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+                    [
+                        ("expired_entries", removed["expired"]),
+                        ("evicted_entries", removed["evicted"]),
+                        ("evicted_bytes", removed["bytes"]),
+                        ("eviction_runs", 1)
+                    ]
+                )
+                conn.execute(
+                    "INSERT INTO metrics (name, value) VALUES ('last_eviction', ?) "
+                    "ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+                    (now,)
+                )
+        return removed
+
+    def eviction_stats(self):
+        """Eviction configuration and cumulative metrics."""
+        metrics = dict(self._connect().execute("SELECT name, value FROM metrics"))
+        return {
+            "policy": self.policy,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "evicted_entries": int(metrics.get("evicted_entries", 0)),
+            "expired_entries": int(metrics.get("expired_entries", 0)),
+            "evicted_bytes": int(metrics.get("evicted_bytes", 0)),
+            "eviction_runs": int(metrics.get("eviction_runs", 0)),
+            "last_eviction": metrics.get("last_eviction")
+        }
+
+    def counters(self):
+        """Return {namespace: {tag: {"entries": n, "bytes": b}}}; tag "" is the total."""
+        stats = {}
+        rows = self._connect().execute("SELECT namespace, tag, entries, bytes FROM counters")
+        for namespace, tag, entries, size in rows:
+            stats.setdefault(namespace, {})[tag] = {"entries": entries, "bytes": size}
+        return stats
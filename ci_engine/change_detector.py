@@ -1,55 +1,320 @@
-import subprocess
+"""
+Change detection against a base commit.
+The repository is read in-process (see git_reader) with the git
+command line as fallback; the diff gives the changed paths with their
+blob ids, and a persistent index of the blobs seen at the last green
+run covers the case where there is no diff to a base. A ChangeSet is
+computed once per pipeline run and passed to everything that needs it.
+"""
+
+import json
 import os
-from pathlib import Path
-from ci_engine.cache_manager import get_file_language
+import subprocess
+from ci_engine import cache_manager
+from ci_engine.cache_manager import classify_files
+from ci_engine.git_reader import GitRepository, GitError
+
+# Commit to diff against; overrides the last green commit and merge-base
+BASE_REF = os.environ.get("CI_BASE_REF")
+
+# "auto" reads the repository in-process, "subprocess" always runs git
+GIT_BACKEND = os.environ.get("CI_GIT_BACKEND", "auto")
+
+# Branches whose merge-base with HEAD is tried as the base, in order
+MAIN_BRANCHES = ("origin/main", "main", "origin/master", "master")
 
-def get_changed_files():
+# File inside CACHE_DIR with the blob ids seen at the last green run
+FILE_INDEX_NAME = "file_index.json"
+FILE_INDEX_VERSION = 1
+
+ZERO_OID = "0" * 40
+
+# The dashboard's run database and its SQLite journals, relative to the
+# working directory like models.DB_PATH. Runs rewrite them, as they do
+# cache_manager.CACHE_DIR, so they never count as changes even if tracked
+GENERATED_FILES = ("ci.db", "ci.db-wal", "ci.db-shm", "ci.db-journal")
+
+def _git(*args):
+    """stdout of a git command as bytes, or None if it fails."""
     try:
-        # Case 1: Normal diff
-        result = subprocess.run(
-            ["git", "diff", "--name-only", "HEAD~1"],
-            capture_output=True,
-            text=True
-        )
-        files = result.stdout.splitlines()
-
-        if files:
-            return files
-
-        # Case 2: No diff → use last commit files
-        result = subprocess.run(
-            ["git", "show", "--name-only", "--pretty=format:"],
-            capture_output=True,
-            text=True
-        )
-        files = result.stdout.splitlines()
-        return [f for f in files if f.endswith(".py")]
-
-    except:
-        # Case 3: Git edge cases
-        result = subprocess.run(
-            ["git", "ls-files"],
-            capture_output=True,
-            text=True
-        )
-        return result.stdout.splitlines()
-
-def get_changed_files_by_language():
+        result = subprocess.run(["git", *args], capture_output=True)
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout
+
+def find_repo_root(path="."):
+    """Top-level directory of the git work tree containing path, or None."""
+    path = os.path.abspath(path)
+    while True:
+        if os.path.exists(os.path.join(path, ".git")):
+            return path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+def parse_raw_diff(output):
+    """Parse `git diff --raw -z --no-renames` output into {path: blob id}.
+
+    The id is that of the new side, or None for deletions and for files
+    whose working-tree content git has not hashed.
+    """
+    changes = {}
+    fields = output.split(b"\0")
+    for i in range(0, len(fields) - 1, 2):
+        meta = fields[i].decode()
+        if not meta.startswith(":"):
+            break
+        _, _, _, new_oid, status = meta[1:].split(" ")
+        path = fields[i + 1].decode("utf-8", "surrogateescape")
+        changes[path] = None if status == "D" or new_oid == ZERO_OID else new_oid
+    return changes
+
+def open_repository(root):
+    """In-process reader for the repository at root, or None to use the git CLI."""
+    if GIT_BACKEND == "subprocess":
+        return None
+    try:
+        return GitRepository(root)
+    except GitError:
+        return None
+
+def diff_against(base, repo=None):
+    """{path: blob id} of files differing between base and the working tree.
+
+    Returns None if base cannot be diffed (e.g. missing in a shallow clone).
+    """
+    if repo is not None:
+        try:
+            changes = repo.diff_workdir(base, hash_file=cache_manager.file_digest)
+            if changes is not None:
+                return changes
+        except GitError:
+            pass
+    output = _git("diff", "--raw", "-z", "--no-renames", "--no-abbrev", base, "--")
+    if output is None:
+        return None
+    return parse_raw_diff(output)
+
+def tracked_blobs(repo=None):
+    """{path: blob id} for every file in git's index, or None outside a repo."""
+    if repo is not None:
+        try:
+            return {path: entry.sha for path, entry in repo.read_index().entries.items() if not entry.stage}
+        except GitError:
+            pass
+    output = _git("ls-files", "-s", "-z")
+    if output is None:
+        return None
+    blobs = {}
+    for entry in output.split(b"\0"):
+        if not entry:
+            continue
+        meta, path = entry.split(b"\t", 1)
+        blobs[path.decode("utf-8", "surrogateescape")] = meta.split(b" ")[1].decode()
+    return blobs
+
+def _head(repo=None):
+    if repo is not None:
+        try:
+            head = repo.head()
+            if head:
+                return head
+        except GitError:
+            pass
+    head = _git("rev-parse", "HEAD")
+    return head.decode().strip() if head else None
+
+def _merge_base(branch, head, repo=None):
+    if repo is not None:
+        try:
+            tip = repo.resolve(branch)
+            return repo.merge_base(head, tip) if tip else None
+        except GitError:
+            pass
+    merge_base = _git("merge-base", head, branch)
+    return merge_base.decode().strip() if merge_base else None
+
+def _file_index_path():
+    return os.path.join(cache_manager.CACHE_DIR, FILE_INDEX_NAME)
+
+def load_file_index():
+    """The index saved by record_green_state, or an empty dict."""
+    try:
+        with open(_file_index_path()) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if index.get("version") != FILE_INDEX_VERSION:
+        return {}
+    return index
+
+def record_green_state(repo=None):
+    """Remember HEAD and the tracked blob ids after a successful run.
+
+    The next run diffs against this commit, and a run with no diff only
+    selects files whose blobs changed since.
+    """
+    if repo is None:
+        root = find_repo_root()
+        repo = open_repository(root) if root else None
+    head = _head(repo)
+    blobs = tracked_blobs(repo)
+    if head is None or blobs is None:
+        return
+    path = _file_index_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"version": FILE_INDEX_VERSION, "last_green": head, "blobs": blobs}, f)
+    os.replace(tmp, path)
+
+def _base_candidates(index, repo=None):
+    """Bases to try in order: CI_BASE_REF alone, else last green, merge-base with main, HEAD~1."""
+    if BASE_REF:
+        yield BASE_REF
+        return
+    if index.get("last_green"):
+        yield index["last_green"]
+    head = _head(repo)
+    if head:
+        for branch in MAIN_BRANCHES:
+            merge_base = _merge_base(branch, head, repo)
+            if merge_base:
+                # On the main branch itself the merge-base is HEAD, which
+                # only shows uncommitted changes
+                if merge_base != head:
+                    yield merge_base
+                break
+    yield "HEAD~1"
+
+class ChangeSet(dict):
+    """Files changed since a base commit: {path: blob id or None}.
+
+    Computed once per pipeline run by get_change_set and passed to
+    test selection and the language helpers, so git is read once.
+    base is the commit diffed against, or None when the changes did not
+    come from a diff; root is the directory the paths are relative to.
+    The language grouping is cached until mutation.
+    """
+
+    def __init__(self, changes=(), base=None, repo=None, root="."):
+        super().__init__(changes)
+        self.base = base
+        self.repo = repo
+        self.root = root
+        self._by_language = None
+
+    def __setitem__(self, path, blob):
+        self._by_language = None
+        super().__setitem__(path, blob)
+
+    def __delitem__(self, path):
+        self._by_language = None
+        super().__delitem__(path)
+
+    def update(self, *args, **kwargs):
+        self._by_language = None
+        super().update(*args, **kwargs)
+
+    @property
+    def files(self):
+        return sorted(self)
+
+    def by_language(self):
+        """{language: [files]} for the changed files."""
+        if self._by_language is None:
+            files = self.files
+            language_map = {}
+            for file, language in zip(files, classify_files(files)):
+                language_map.setdefault(language, []).append(file)
+            self._by_language = language_map
+        return self._by_language
+
+    def languages(self):
+        """Sorted known languages among the changed files."""
+        return sorted(lang for lang in self.by_language() if lang != "unknown")
+
+def _without_generated(changes, root):
+    """changes without the files HybridCI writes itself (see GENERATED_FILES)."""
+    def relative(path):
+        return os.path.relpath(os.path.abspath(path), root).replace(os.sep, "/")
+
+    generated = {relative(name) for name in GENERATED_FILES}
+    cache_dir = relative(cache_manager.CACHE_DIR) + "/"
+    return {
+        path: blob for path, blob in changes.items()
+        if path not in generated and not path.startswith(cache_dir)
+    }
+
+def get_change_set(base=None):
+    """Compute the ChangeSet for the working tree, or None outside a git repository.
+
+    Paths are relative to the repository root; the run database and
+    cache directory are left out. The blob ids are seeded into
+    cache_manager's file digests so changed files are not re-read.
+    An empty diff falls back to comparing git's index with the blobs
+    seen at the last green run; with no such record every tracked file
+    counts as changed.
+    """
+    root = find_repo_root()
+    if root is None:
+        return None
+    repo = open_repository(root)
+    index = load_file_index()
+
+    candidates = [base] if base else _base_candidates(index, repo)
+    changes = None
+    for candidate in candidates:
+        changes = diff_against(candidate, repo)
+        if changes is not None:
+            base = candidate
+            changes = _without_generated(changes, root)
+            break
+    if changes:
+        cache_manager.seed_file_digests(changes, root)
+        return ChangeSet(changes, base, repo, root)
+
+    blobs = tracked_blobs(repo)
+    if blobs is None:
+        return None if changes is None else ChangeSet(base=base, repo=repo, root=root)
+    blobs = _without_generated(blobs, root)
+    last_seen = index.get("blobs")
+    if last_seen is None:
+        return ChangeSet(dict.fromkeys(blobs), repo=repo, root=root)
+    last_seen = _without_generated(last_seen, root)
+    change_set = ChangeSet(
+        {path: None for path, blob in blobs.items() if last_seen.get(path) != blob}, base, repo, root
+    )
+    change_set.update((path, None) for path in last_seen if path not in blobs)
+    return change_set
+
+def detect_changes(base=None):
+    """Files changed since the base commit as {path: blob id or None}.
+
+    Returns None outside a git repository. See get_change_set.
+    """
+    return get_change_set(base)
+
+def get_changed_files(change_set=None):
+    """Paths changed since the base commit (see get_change_set)."""
+    if change_set is None:
+        change_set = get_change_set()
+    return change_set.files if change_set is not None else []
+
+def get_changed_files_by_language(change_set=None):
     """Get changed files grouped by programming language."""
-    changed_files = get_changed_files()
-    language_map = {}
-    
-    for file in changed_files:
-        lang = get_file_language(file)
-        if lang not in language_map:
-            language_map[lang] = []
-        language_map[lang].append(file)
-    
-    return language_map, changed_files
+    if change_set is None:
+        change_set = get_change_set()
+    if change_set is None:
+        return {}, []
+    return change_set.by_language(), change_set.files
 
 def filter_changes_by_language(changed_files, language=None):
     """Filter changed files by language. If language is None, returns all."""
     if language is None:
         return changed_files
-    
-    return [f for f in changed_files if get_file_language(f) == language]
+
+    return [f for f, lang in zip(changed_files, classify_files(changed_files)) if lang == language]
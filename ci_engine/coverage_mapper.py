@@ -0,0 +1,244 @@
+"""
+Coverage-derived test map.
+Runs each test file once in a child process that records which source
+files execute (sys.monitoring on Python 3.12+, sys.settrace before),
+and stores the result on disk. Later builds only re-trace tests whose
+test file or covered sources changed since they were traced.
+
+Usage:
+    python -m ci_engine.coverage_mapper build --test-dir sample_repo/tests --src-dir sample_repo/src
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ci_engine import cache_manager
+from ci_engine.executor import _resolve_test, default_worker_count, DEFAULT_TEST_TIMEOUT
+from ci_engine.test_mapper import IndexedTestMap, generate_test_map, is_test_file
+
+# "naming" maps test_foo.py to foo.py; "coverage" traces the suite
+TEST_MAP_MODE = os.environ.get("CI_TEST_MAP", "naming")
+
+# Stored maps with another version are re-traced from scratch
+COVERAGE_MAP_VERSION = 1
+
+_PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def start_tracing(record):
+    """Call record(filename) for each code object that starts running.
+
+    Uses sys.monitoring where available, disabling each code object
+    after its first call so steady-state overhead is near zero. Returns
+    a function that stops tracing.
+    """
+    monitoring = getattr(sys, "monitoring", None)
+    if monitoring is not None:
+        tool = monitoring.COVERAGE_ID
+        try:
+            monitoring.use_tool_id(tool, "hybridci")
+        except ValueError:
+            # Another coverage tool holds the id
+            monitoring = None
+    if monitoring is not None:
+        def on_start(code, offset):
+            record(code.co_filename)
+            return monitoring.DISABLE
+
+        monitoring.register_callback(tool, monitoring.events.PY_START, on_start)
+        monitoring.set_events(tool, monitoring.events.PY_START)
+
+        def stop():
+            monitoring.set_events(tool, 0)
+            monitoring.register_callback(tool, monitoring.events.PY_START, None)
+            monitoring.free_tool_id(tool)
+        return stop
+
+    def tracer(frame, event, arg):
+        # Only "call" events reach a global trace function; returning
+        # None skips line tracing inside the frame
+        record(frame.f_code.co_filename)
+
+    previous, previous_threading = sys.gettrace(), threading.gettrace()
+    sys.settrace(tracer)
+    threading.settrace(tracer)
+
+    def stop():
+        sys.settrace(previous)
+        threading.settrace(previous_threading)
+    return stop
+
+def _source_files(filenames, src_dir):
+    """Executed filenames that are Python sources under src_dir, relative to it."""
+    src_root = os.path.abspath(src_dir) + os.sep
+    covered = set()
+    for filename in filenames:
+        if not filename.endswith(".py"):
+            continue
+        path = os.path.abspath(filename)
+        if path.startswith(src_root):
+            covered.add(os.path.relpath(path, src_root).replace(os.sep, "/"))
+    return sorted(covered)
+
+def _trace_main(args):
+    """Child process: run pytest under tracing and write the covered sources."""
+    filenames = set()
+    stop = start_tracing(filenames.add)
+    try:
+        import pytest
+        returncode = pytest.main(args.pytest_args)
+    finally:
+        stop()
+    with open(args.out, "w") as f:
+        json.dump({"files": _source_files(filenames, args.src_dir), "returncode": int(returncode)}, f)
+    return int(returncode)
+
+def trace_test(test, test_dir, src_dir, timeout=DEFAULT_TEST_TIMEOUT):
+    """Run one test file under tracing; returns the src_dir-relative files it ran, or None."""
+    cwd, test_path = _resolve_test(test, test_dir)
+    out = os.path.join(cache_manager.CACHE_DIR, f"trace_{os.getpid()}_{threading.get_ident()}.json")
+    os.makedirs(cache_manager.CACHE_DIR, exist_ok=True)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [_PACKAGE_ROOT, os.environ.get("PYTHONPATH")])))
+    command = [
+        sys.executable, "-m", "ci_engine.coverage_mapper", "trace",
+        "--src-dir", os.path.abspath(src_dir), "--out", os.path.abspath(out),
+        "--", "-q", "-p", "no:cacheprovider", test_path
+    ]
+    try:
+        subprocess.run(command, cwd=cwd, env=env, capture_output=True, timeout=timeout)
+        with open(out) as f:
+            return json.load(f)["files"]
+    except (OSError, ValueError, KeyError, subprocess.TimeoutExpired):
+        return None
+    finally:
+        try:
+            os.unlink(out)
+        except OSError:
+            pass
+
+def coverage_map_path(test_dir, src_dir):
+    roots = f"{os.path.abspath(test_dir)}\0{os.path.abspath(src_dir)}"
+    return os.path.join(cache_manager.CACHE_DIR, f"coverage_map_{hashlib.md5(roots.encode()).hexdigest()}.json")
+
+def _input_digest(test, test_dir, src_dir, covered):
+    """Digest of a test file and the sources it covered when traced."""
+    h = hashlib.sha256(f"{test}\0{cache_manager.file_digest(os.path.join(test_dir, test))}\n".encode())
+    for rel_path in covered:
+        h.update(f"{rel_path}\0{cache_manager.file_digest(os.path.join(src_dir, rel_path))}\n".encode())
+    return h.hexdigest()
+
+def load_coverage_entries(test_dir, src_dir):
+    """{test: {"digest", "covers"}} from disk, with covers as relative paths."""
+    try:
+        with open(coverage_map_path(test_dir, src_dir)) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != COVERAGE_MAP_VERSION:
+        return {}
+    # Sources are stored once and referenced by index
+    files = data["files"]
+    return {
+        test: {"digest": entry["digest"], "covers": [files[i] for i in entry["covers"]]}
+        for test, entry in data["tests"].items()
+    }
+
+def save_coverage_entries(test_dir, src_dir, entries):
+    files = sorted({rel_path for entry in entries.values() for rel_path in entry["covers"]})
+    ids = {rel_path: i for i, rel_path in enumerate(files)}
+    data = {
+        "version": COVERAGE_MAP_VERSION,
+        "files": files,
+        "tests": {
+            test: {"digest": entry["digest"], "covers": [ids[p] for p in entry["covers"]]}
+            for test, entry in sorted(entries.items())
+        }
+    }
+    path = coverage_map_path(test_dir, src_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+def build_coverage_map(test_dir, src_dir, max_workers=None, timeout=DEFAULT_TEST_TIMEOUT):
+    """Test map from traced coverage, re-tracing only stale tests.
+
+    A test is stale when it is new or its test file or any covered
+    source changed. Tests whose trace fails keep their previous entry,
+    or fall back to the naming convention.
+    """
+    tests = sorted(t for t in os.listdir(test_dir) if is_test_file(t))
+    previous = load_coverage_entries(test_dir, src_dir)
+    entries = {}
+    stale = []
+    for test in tests:
+        entry = previous.get(test)
+        if entry and entry["digest"] == _input_digest(test, test_dir, src_dir, entry["covers"]):
+            entries[test] = entry
+        else:
+            stale.append(test)
+
+    if stale:
+        workers = max(1, min(max_workers or default_worker_count(), len(stale)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            traced = list(pool.map(lambda t: trace_test(t, test_dir, src_dir, timeout), stale))
+        fallback = generate_test_map(test_dir, src_dir)
+        for test, covered in zip(stale, traced):
+            if covered is None:
+                if test in previous:
+                    entries[test] = previous[test]
+                else:
+                    # Not saved, so the next build traces it again
+                    entries[test] = {"digest": None, "covers": fallback[test]}
+                continue
+            entries[test] = {"digest": _input_digest(test, test_dir, src_dir, covered), "covers": covered}
+
+    if stale or set(previous) != set(entries):
+        save_coverage_entries(test_dir, src_dir, {t: e for t, e in entries.items() if e["digest"]})
+
+    # select_tests matches sources by file name
+    test_map = IndexedTestMap({
+        test: sorted({os.path.basename(p) for p in entry["covers"]}) for test, entry in entries.items()
+    })
+    test_map.test_dir = test_dir
+    test_map.src_dir = src_dir
+    return test_map
+
+def load_test_map(test_dir, src_dir, mode=None):
+    """Test map in the configured mode (CI_TEST_MAP: "naming" or "coverage")."""
+    if (mode or TEST_MAP_MODE) == "coverage":
+        return build_coverage_map(test_dir, src_dir)
+    return generate_test_map(test_dir, src_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description="HybridCI coverage-derived test map")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="trace stale tests and print the map")
+    build.add_argument("--test-dir", default="sample_repo/tests")
+    build.add_argument("--src-dir", default="sample_repo/src")
+    build.add_argument("--workers", type=int, default=None)
+    trace = commands.add_parser("trace", help=argparse.SUPPRESS)
+    trace.add_argument("--src-dir", required=True)
+    trace.add_argument("--out", required=True)
+    trace.add_argument("pytest_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    if args.command == "trace":
+        if args.pytest_args[:1] == ["--"]:
+            args.pytest_args = args.pytest_args[1:]
+        sys.exit(_trace_main(args))
+
+    test_map = build_coverage_map(args.test_dir, args.src_dir, args.workers)
+    print(json.dumps(dict(test_map), indent=2, sort_keys=True))
+
+if __name__ == "__main__":
+    main()
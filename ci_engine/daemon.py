@@ -0,0 +1,525 @@
+"""
+Watch-mode daemon that keeps test selection inputs warm.
+Holds the test map (with its reverse index), the dependency graph and
+the current change set in memory and updates them from file system
+events (inotify on Linux, polling elsewhere). Clients ask "which tests
+would run" over a Unix socket speaking one JSON object per line.
+
+Usage:
+    python -m ci_engine.daemon serve --test-dir sample_repo/tests --src-dir sample_repo/src
+    python -m ci_engine.daemon select [FILE ...]
+    python -m ci_engine.daemon status
+    python -m ci_engine.daemon stop
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import select
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ci_engine import cache_manager
+from ci_engine.change_detector import get_change_set, FILE_INDEX_NAME
+from ci_engine.dependency_graph import build_dependency_graph, parse_file_imports
+from ci_engine.ibst import select_tests
+from ci_engine.repo_scanner import scan_dirs, scan_files
+from ci_engine.coverage_mapper import load_test_map, TEST_MAP_MODE
+from ci_engine.test_mapper import is_test_file, covered_sources
+
+# Socket file inside CACHE_DIR, unless CI_DAEMON_SOCKET is set
+SOCKET_NAME = "daemon.sock"
+
+# Seconds a client waits for the daemon to answer
+CLIENT_TIMEOUT = 10
+
+# Seconds between scans when inotify is unavailable
+POLL_INTERVAL = 1.0
+
+# Longest request line accepted from a client, in bytes
+MAX_REQUEST_BYTES = 1024 * 1024
+
+# Directories never watched, in addition to what scan_dirs skips
+UNWATCHED_DIRS = {"__pycache__", "node_modules"}
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct("iIII")
+
+class DaemonError(Exception):
+    """The daemon answered a request with an error."""
+
+def get_socket_path():
+    return os.environ.get("CI_DAEMON_SOCKET") or os.path.join(cache_manager.CACHE_DIR, SOCKET_NAME)
+
+def _git_paths(root):
+    """Directories under .git whose changes move the change detection base."""
+    git_dir = os.path.join(root, ".git")
+    dirs = [git_dir]
+    for dirpath, dirnames, _ in os.walk(os.path.join(git_dir, "refs")):
+        dirs.append(dirpath)
+    return dirs
+
+def _walk_new_dir(path):
+    """(directories, files) under a directory that appeared after startup."""
+    dirs, files = [], []
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".") and d not in UNWATCHED_DIRS]
+        dirs.append(dirpath)
+        files.extend(os.path.join(dirpath, name) for name in filenames)
+    return dirs, files
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, "inotify_init1"):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+class InotifyWatcher:
+    """Recursive watch of a tree through inotify, via ctypes.
+
+    read() returns the absolute paths touched since the last read, or
+    None when the kernel queue overflowed and everything must be
+    rescanned.
+    """
+
+    cheap_read = True
+
+    def __init__(self, root, libc=None):
+        self.libc = libc or _load_libc()
+        if self.libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.root = os.path.abspath(root)
+        self.fd = -1
+        self._start()
+
+    def _start(self):
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._paths = {}
+        for rel in scan_dirs(self.root):
+            if not any(part in UNWATCHED_DIRS for part in rel.split("/")):
+                self._add(os.path.join(self.root, rel) if rel else self.root)
+        for path in _git_paths(self.root):
+            self._add(path)
+
+    def _add(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            # ENOSPC means fs.inotify.max_user_watches is exhausted
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise OSError(err, "inotify watch limit reached")
+            return
+        self._paths[wd] = path
+
+    def wait(self, timeout):
+        """Block until events are pending or timeout seconds pass."""
+        return bool(select.select([self.fd], [], [], timeout)[0])
+
+    def read(self):
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, pos)
+                pos += _EVENT_HEADER.size
+                name = os.fsdecode(data[pos:pos + length].rstrip(b"\0"))
+                pos += length
+                if mask & IN_Q_OVERFLOW:
+                    changed = None
+                    continue
+                if mask & IN_IGNORED:
+                    self._paths.pop(wd, None)
+                    continue
+                parent = self._paths.get(wd)
+                if parent is None or changed is None:
+                    continue
+                path = os.path.join(parent, name) if name else parent
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and name not in UNWATCHED_DIRS and not name.startswith("."):
+                        # Files written before the watch existed get no events
+                        dirs, files = _walk_new_dir(path)
+                        for new_dir in dirs:
+                            self._add(new_dir)
+                        changed.update(files)
+                    elif mask & IN_MOVED_FROM:
+                        # Everything under a moved-away directory is gone
+                        changed = None
+                        continue
+                changed.add(path)
+        if changed is None:
+            # Watches may point at moved directories; start over
+            self.close()
+            self._start()
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+class PollingWatcher:
+    """Portable fallback: rescans the tree's file stats every interval."""
+
+    cheap_read = False
+
+    def __init__(self, root, interval=POLL_INTERVAL):
+        self.root = os.path.abspath(root)
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        paths = [os.path.join(self.root, rel) for rel in scan_files(self.root)]
+        for git_dir in _git_paths(self.root):
+            try:
+                paths.extend(entry.path for entry in os.scandir(git_dir) if entry.is_file())
+            except OSError:
+                pass
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def wait(self, timeout):
+        time.sleep(min(self.interval, timeout))
+        return True
+
+    def read(self):
+        snapshot = self._scan()
+        previous, self._snapshot = self._snapshot, snapshot
+        changed = {path for path, stat in snapshot.items() if previous.get(path) != stat}
+        changed.update(path for path in previous if path not in snapshot)
+        return changed
+
+    def close(self):
+        pass
+
+def make_watcher(root, polling=False):
+    """inotify watcher where available, else a polling one."""
+    if not polling:
+        try:
+            return InotifyWatcher(root)
+        except OSError:
+            pass
+    return PollingWatcher(root)
+
+class Workspace:
+    """Test map, dependency graph and change set, kept current incrementally."""
+
+    def __init__(self, test_dir, src_dir, root=".", map_mode=None):
+        self.test_dir = test_dir
+        self.src_dir = src_dir
+        self.root = os.path.abspath(root)
+        # The test map is always rebuilt the way it was first built
+        self.map_mode = map_mode or TEST_MAP_MODE
+        self.generation = 0
+        self.reload()
+
+    def reload(self):
+        self.test_map = load_test_map(self.test_dir, self.src_dir, self.map_mode)
+        self.dependency_graph = build_dependency_graph(self.src_dir)
+        self._change_set = None
+        self._file_index_mtime = None
+        self.generation += 1
+
+    def apply(self, paths):
+        """Update from changed absolute paths; None means reload everything."""
+        if paths is None:
+            self.reload()
+            return
+        src_root = os.path.abspath(self.src_dir)
+        test_root = os.path.abspath(self.test_dir)
+        git_dir = os.path.join(self.root, ".git") + os.sep
+        retrace = False
+        for path in paths:
+            if path.startswith(git_dir):
+                continue
+            if path.endswith(".py"):
+                if os.path.dirname(path) == test_root:
+                    if self.map_mode == "coverage":
+                        retrace = retrace or is_test_file(os.path.basename(path))
+                    else:
+                        self._update_test(path)
+                elif path.startswith(src_root + os.sep):
+                    self._update_source(path, os.path.relpath(path, src_root).replace(os.sep, "/"))
+            # Keep content digests for changed files warm
+            if os.path.isfile(path):
+                cache_manager.file_digest(path)
+        if retrace:
+            # Re-traces only tests whose file or covered sources changed
+            self.test_map = load_test_map(self.test_dir, self.src_dir, self.map_mode)
+        self._change_set = None
+        self.generation += 1
+
+    def _update_test(self, path):
+        test_file = os.path.basename(path)
+        if not is_test_file(test_file):
+            return
+        if os.path.isfile(path):
+            if test_file not in self.test_map:
+                self.test_map[test_file] = covered_sources(test_file)
+        else:
+            self.test_map.pop(test_file, None)
+
+    def _update_source(self, path, rel_path):
+        if any(part.startswith(".") or part == "__pycache__" for part in rel_path.split("/")):
+            return
+        try:
+            _, imports = parse_file_imports(path, rel_path)
+        except OSError:
+            if rel_path in self.dependency_graph:
+                del self.dependency_graph[rel_path]
+            return
+        # Edits that keep the imports keep the cached impact index
+        if self.dependency_graph.get(rel_path) != imports:
+            self.dependency_graph[rel_path] = imports
+
+    def change_set(self):
+        """The current ChangeSet, recomputed only after events or a green run."""
+        try:
+            file_index_mtime = os.stat(os.path.join(cache_manager.CACHE_DIR, FILE_INDEX_NAME)).st_mtime_ns
+        except OSError:
+            file_index_mtime = None
+        if self._change_set is None or file_index_mtime != self._file_index_mtime:
+            self._change_set = get_change_set()
+            self._file_index_mtime = file_index_mtime
+        return self._change_set
+
+    def selection(self, files=None, impact_depth=None):
+        """Tests CI would run for files, or for the current changes."""
+        detected = True
+        if files is None:
+            change_set = self.change_set()
+            detected = change_set is not None
+            files = change_set.files if detected else sorted(self.test_map.reverse_index)
+        tests = select_tests(files, self.dependency_graph, self.test_map, impact_depth)
+        return {"changed": list(files), "tests": sorted(tests), "detected": detected}
+
+    def status(self):
+        return {
+            "tests": len(self.test_map),
+            "sources": len(self.dependency_graph),
+            "generation": self.generation,
+        }
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """One JSON request per line, one JSON response per line."""
+
+    daemon = None
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline(MAX_REQUEST_BYTES + 1)
+            if not line:
+                return
+            cmd = None
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("expected a JSON object")
+                cmd = request.get("cmd")
+                response = dict(self.daemon.handle(request), ok=True)
+            except (ValueError, TypeError, KeyError) as e:
+                response = {"ok": False, "error": str(e)}
+            except Exception as e:
+                # Git or file system errors while answering; the client
+                # gets an error instead of a dropped connection
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(response, separators=(",", ":")).encode() + b"\n")
+            self.wfile.flush()
+            if cmd == "shutdown":
+                return
+
+class Daemon:
+    """Serves a Workspace over a Unix socket while a watcher keeps it current."""
+
+    def __init__(self, workspace, watcher, socket_path=None):
+        self.workspace = workspace
+        self.watcher = watcher
+        self.socket_path = socket_path or get_socket_path()
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self._stop = threading.Event()
+        handler = type("BoundDaemonRequestHandler", (DaemonRequestHandler,), {"daemon": self})
+        _remove_stale_socket(self.socket_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.socket_path)), exist_ok=True)
+        self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, handler)
+        self.server.daemon_threads = True
+        os.chmod(self.socket_path, 0o600)
+
+    def sync(self):
+        """Apply pending watcher events; the caller holds the lock."""
+        if self.watcher.cheap_read:
+            changed = self.watcher.read()
+            if changed is None or changed:
+                self.workspace.apply(changed)
+
+    def handle(self, request):
+        cmd = request.get("cmd")
+        with self.lock:
+            self.sync()
+            if cmd == "ping":
+                return {"pid": os.getpid()}
+            if cmd == "status":
+                return dict(self.workspace.status(), pid=os.getpid(), uptime=time.time() - self.started,
+                            watcher=type(self.watcher).__name__)
+            if cmd == "changes":
+                change_set = self.workspace.change_set()
+                return {"files": change_set.files if change_set is not None else None}
+            if cmd == "select":
+                files = request.get("files")
+                if files is not None and not all(isinstance(f, str) for f in files):
+                    raise ValueError("files must be a list of paths")
+                return self.workspace.selection(files, request.get("impact_depth"))
+            if cmd == "reload":
+                self.workspace.reload()
+                return self.workspace.status()
+            if cmd == "shutdown":
+                threading.Thread(target=self.stop, daemon=True).start()
+                return {}
+        raise ValueError(f"unknown command: {cmd!r}")
+
+    def _watch(self):
+        while not self._stop.is_set():
+            if not self.watcher.wait(0.5):
+                continue
+            if self.watcher.cheap_read:
+                # Read under the lock so a query never misses pending events
+                with self.lock:
+                    self.sync()
+                continue
+            changed = self.watcher.read()
+            if changed:
+                with self.lock:
+                    self.workspace.apply(changed)
+
+    def serve_forever(self):
+        watch_thread = threading.Thread(target=self._watch, name="ci-daemon-watch", daemon=True)
+        watch_thread.start()
+        try:
+            self.server.serve_forever()
+        finally:
+            self._stop.set()
+            watch_thread.join(2)
+            self.server.server_close()
+            self.watcher.close()
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+
+    def stop(self):
+        self._stop.set()
+        self.server.shutdown()
+
+def _remove_stale_socket(path):
+    """Remove a socket file left by a dead daemon; fail if one is running."""
+    if not os.path.exists(path):
+        return
+    try:
+        query("ping", socket_path=path, timeout=1)
+    except OSError:
+        os.unlink(path)
+        return
+    raise OSError(errno.EADDRINUSE, f"a daemon is already serving {path}")
+
+def query(cmd, socket_path=None, timeout=CLIENT_TIMEOUT, **args):
+    """Send one request to the daemon and return its response.
+
+    Raises OSError when no daemon is listening and DaemonError when it
+    rejects the request.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path or get_socket_path())
+        sock.sendall(json.dumps(dict(args, cmd=cmd)).encode() + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError("daemon closed the connection")
+    response = json.loads(line)
+    if not response.pop("ok", False):
+        raise DaemonError(response.get("error", "request failed"))
+    return response
+
+def main():
+    parser = argparse.ArgumentParser(description="HybridCI watch-mode daemon")
+    parser.add_argument("--socket", default=None)
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="run the daemon in the foreground")
+    serve.add_argument("--test-dir", default="sample_repo/tests")
+    serve.add_argument("--src-dir", default="sample_repo/src")
+    serve.add_argument("--poll", action="store_true", help="poll instead of using inotify")
+    select_cmd = commands.add_parser("select", help="print the tests CI would run")
+    select_cmd.add_argument("files", nargs="*", help="changed files (default: detect changes)")
+    commands.add_parser("status")
+    commands.add_parser("stop")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        workspace = Workspace(args.test_dir, args.src_dir)
+        daemon = Daemon(workspace, make_watcher(".", polling=args.poll), args.socket)
+        print(f"Watching {os.getcwd()} ({type(daemon.watcher).__name__}), serving {daemon.socket_path}")
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    request = {"files": args.files} if args.command == "select" and args.files else {}
+    try:
+        response = query(args.command if args.command != "stop" else "shutdown", args.socket, **request)
+    except OSError as e:
+        print(f"daemon not reachable at {args.socket or get_socket_path()}: {e}", file=sys.stderr)
+        sys.exit(2)
+    except DaemonError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+    if args.command == "select":
+        for test in response["tests"]:
+            print(test)
+    elif args.command == "status":
+        print(json.dumps(response, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,381 @@
 # ci_engine/dependency_graph.py
 import ast
-from pathlib import Path
-
-def build_dependency_graph(src_dir):
-    graph = {}
-    for file in Path(src_dir).rglob("*.py"):
-        with open(file) as f:
-            tree = ast.parse(f.read())
-        imports = [n.names[0].name for n in ast.walk(tree) if isinstance(n, ast.Import)]
-        graph[file.name] = imports
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# On-disk cache of per-file import lists, one JSON file per source root
+IMPORT_CACHE_DIR = os.path.join(".ci_cache", "imports")
+IMPORT_CACHE_VERSION = 1
+
+# Below this many files to parse, a process pool costs more than it saves
+PARALLEL_PARSE_THRESHOLD = 64
+
+class DependencyGraph(dict):
+    """Dependency graph (file -> imported module names).
+
+    Keeps a lazily built ImpactIndex that is discarded whenever the
+    graph changes, so reachability is computed once per graph version.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._impact_index = None
+        # Directory the file keys are relative to, when built from disk
+        self.root = None
+
+    def __setitem__(self, file, imports):
+        super().__setitem__(file, imports)
+        self._impact_index = None
+
+    def __delitem__(self, file):
+        super().__delitem__(file)
+        self._impact_index = None
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._impact_index = None
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def setdefault(self, file, default=None):
+        if file not in self:
+            self[file] = default if default is not None else []
+        return self[file]
+
+    def pop(self, file, *default):
+        self._impact_index = None
+        return super().pop(file, *default)
+
+    def popitem(self):
+        self._impact_index = None
+        return super().popitem()
+
+    def clear(self):
+        super().clear()
+        self._impact_index = None
+
+    def copy(self):
+        graph = DependencyGraph(self)
+        graph.root = self.root
+        return graph
+
+    def __reduce__(self):
+        return (DependencyGraph, (dict(self),), {"root": self.root})
+
+    def impact_index(self):
+        """Return the reverse-import reachability index for this graph."""
+        if self._impact_index is None:
+            self._impact_index = ImpactIndex(self)
+        return self._impact_index
+
+def get_impact_index(dependency_graph):
+    """Impact index for a graph; cached for DependencyGraph, built for plain dicts."""
+    if isinstance(dependency_graph, DependencyGraph):
+        return dependency_graph.impact_index()
+    return ImpactIndex(dependency_graph)
+
+def module_name_for(path):
+    """Dotted module name for a graph node path ("pkg/mod.py" -> "pkg.mod")."""
+    path = path.replace("\\", "/")
+    if path.endswith(".py"):
+        path = path[:-3]
+    parts = [p for p in path.split("/") if p and p != "."]
+    if len(parts) > 1 and parts[-1] == "__init__":
+        parts.pop()
+    return ".".join(parts)
+
+class ImpactIndex:
+    """Precomputed reverse-import reachability over a dependency graph.
+
+    Nodes are the graph's files. An edge runs from a file to every file
+    that imports it, so the nodes reachable from a changed file are the
+    files it can impact. Strongly connected components (import cycles)
+    are collapsed and each component's full closure is stored as an
+    integer bitset over components.
+    """
+
+    def __init__(self, dependency_graph):
+        self.nodes = list(dependency_graph.keys())
+        self._node_ids = {node: i for i, node in enumerate(self.nodes)}
+
+        # Every dotted suffix of a module name -> nodes, so "src.pkg.mod",
+        # "pkg.mod" and "mod" all resolve to "pkg/mod.py"
+        self._modules = {}
+        self._by_basename = {}
+        for i, node in enumerate(self.nodes):
+            parts = module_name_for(node).split(".")
+            for start in range(len(parts)):
+                self._modules.setdefault(".".join(parts[start:]), set()).add(i)
+            self._by_basename.setdefault(os.path.basename(node.replace("\\", "/")), []).append(i)
+
+        self.importers = [set() for _ in self.nodes]
+        self.dependencies = [set() for _ in self.nodes]
+        for node, imports in dependency_graph.items():
+            src = self._node_ids[node]
+            for name in imports:
+                for dst in self.resolve_import(name):
+                    if dst != src:
+                        self.importers[dst].add(src)
+                        self.dependencies[src].add(dst)
+
+        self._build_closure()
+
+    def resolve_import(self, name):
+        """Node ids of the files an imported module name refers to."""
+        parts = name.split(".")
+        for start in range(len(parts)):
+            nodes = self._modules.get(".".join(parts[start:]))
+            if nodes:
+                return nodes
+        # "from pkg import name" may be recorded as "pkg.name" for a non-module name
+        for end in range(len(parts) - 1, 0, -1):
+            nodes = self._modules.get(".".join(parts[:end]))
+            if nodes:
+                return nodes
+        return ()
+
+    def _build_closure(self):
+        """Collapse import cycles with Tarjan's algorithm and store closures."""
+        count = len(self.nodes)
+        index = [None] * count
+        lowlink = [0] * count
+        on_stack = [False] * count
+        stack = []
+        self.component_of = [0] * count
+        self.components = []
+        counter = 0
+
+        for root in range(count):
+            if index[root] is not None:
+                continue
+            work = [(root, iter(self.importers[root]))]
+            index[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            while work:
+                node, successors = work[-1]
+                advanced = False
+                for succ in successors:
+                    if index[succ] is None:
+                        index[succ] = lowlink[succ] = counter
+                        counter += 1
+                        stack.append(succ)
+                        on_stack[succ] = True
+                        work.append((succ, iter(self.importers[succ])))
+                        advanced = True
+                        break
+                    if on_stack[succ]:
+                        lowlink[node] = min(lowlink[node], index[succ])
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        self.component_of[member] = len(self.components)
+                        component.append(member)
+                        if member == node:
+                            break
+                    self.components.append(component)
+
+        # Tarjan emits components in reverse topological order, so every
+        # successor's closure is complete before its predecessors need it
+        self.closure = []
+        for comp_id, component in enumerate(self.components):
+            reach = 1 << comp_id
+            for member in component:
+                for succ in self.importers[member]:
+                    succ_comp = self.component_of[succ]
+                    if succ_comp != comp_id:
+                        reach |= self.closure[succ_comp]
+            self.closure.append(reach)
+
+    def transitive_digests(self, digest_for):
+        """Merkle digest per node over the node and everything it imports.
+
+        digest_for(node) returns a file's own content digest. Members of
+        an import cycle share their component's digest.
+        """
+        component_digests = [None] * len(self.components)
+        # Dependencies of a component are emitted after it, so walk backwards
+        for comp_id in range(len(self.components) - 1, -1, -1):
+            component = self.components[comp_id]
+            h = hashlib.sha256()
+            for member in sorted(component, key=lambda i: self.nodes[i]):
+                h.update(f"{self.nodes[member]}\0{digest_for(self.nodes[member])}\n".encode())
+            deps = {self.component_of[d] for member in component for d in self.dependencies[member]}
+            deps.discard(comp_id)
+            for dep in sorted(component_digests[d] for d in deps):
+                h.update(dep.encode())
+            component_digests[comp_id] = h.hexdigest()
+        return [component_digests[self.component_of[i]] for i in range(len(self.nodes))]
+
+    def match_nodes(self, path):
+        """Node ids whose path matches a changed file path."""
+        path = path.replace("\\", "/")
+        matches = []
+        for i in self._by_basename.get(os.path.basename(path), ()):
+            node = self.nodes[i].replace("\\", "/")
+            if path == node or path.endswith("/" + node) or "/" not in node:
+                matches.append(i)
+        return matches
+
+    def impacted(self, changed_files, max_depth=None):
+        """Files impacted by changes, following importers up to max_depth hops.
+
+        max_depth=None follows the full transitive closure.
+        """
+        start = set()
+        for path in changed_files:
+            start.update(self.match_nodes(path))
+
+        if max_depth is None:
+            reach = 0
+            for i in start:
+                reach |= self.closure[self.component_of[i]]
+            impacted = set()
+            while reach:
+                low = reach & -reach
+                impacted.update(self.components[low.bit_length() - 1])
+                reach ^= low
+            return {self.nodes[i] for i in impacted}
+
+        seen = set(start)
+        frontier = start
+        for _ in range(max_depth):
+            frontier = {succ for node in frontier for succ in self.importers[node]} - seen
+            if not frontier:
+                break
+            seen |= frontier
+        return {self.nodes[i] for i in seen}
+
+def _import_names(tree, module_name, is_package):
+    """Full dotted names imported by a module, with relative imports resolved."""
+    package = module_name.split(".") if module_name else []
+    if not is_package:
+        package = package[:-1]
+
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                keep = len(package) - (node.level - 1)
+                if keep < 0:
+                    continue
+                base = package[:keep]
+            else:
+                base = []
+            if node.module:
+                base = base + node.module.split(".")
+            if base:
+                names.append(".".join(base))
+            # "from pkg import name" may name a submodule
+            for alias in node.names:
+                if alias.name != "*":
+                    names.append(".".join(base + [alias.name]))
+
+    seen = set()
+    return [n for n in names if not (n in seen or seen.add(n))]
+
+def parse_file_imports(path, rel_path):
+    """Read and parse one file; returns (content digest, imported module names)."""
+    with open(path, "rb") as f:
+        source = f.read()
+    return hashlib.sha1(source).hexdigest(), _parse_source(source, path, rel_path)
+
+def _parse_source(source, path, rel_path):
+    try:
+        tree = ast.parse(source, filename=str(path))
+    except (SyntaxError, ValueError):
+        return []
+    is_package = os.path.basename(rel_path) == "__init__.py"
+    return _import_names(tree, module_name_for(rel_path), is_package)
+
+def _parse_job(job):
+    """Process pool worker: skip the parse when content matches the cached digest."""
+    path, rel_path, cached = job
+    with open(path, "rb") as f:
+        source = f.read()
+    digest = hashlib.sha1(source).hexdigest()
+    if cached and cached.get("sha1") == digest:
+        return rel_path, digest, cached["imports"]
+    return rel_path, digest, _parse_source(source, path, rel_path)
+
+def _iter_python_files(src_dir):
+    for dirpath, dirnames, filenames in os.walk(src_dir):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".") and d != "__pycache__"]
+        for name in filenames:
+            if name.endswith(".py"):
+                path = os.path.join(dirpath, name)
+                yield path, os.path.relpath(path, src_dir).replace(os.sep, "/")
+
+def _import_cache_path(src_dir, cache_dir):
+    root = os.path.abspath(src_dir)
+    return os.path.join(cache_dir, f"imports_{hashlib.md5(root.encode()).hexdigest()}.json")
+
+def _load_import_cache(path):
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != IMPORT_CACHE_VERSION:
+        return {}
+    return data.get("files", {})
+
+def _save_import_cache(path, entries):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"version": IMPORT_CACHE_VERSION, "files": entries}, f)
+    os.replace(tmp, path)
+
+def build_dependency_graph(src_dir, cache_dir=IMPORT_CACHE_DIR, max_workers=None):
+    """Build the import graph for src_dir, keyed by path relative to src_dir.
+
+    Per-file import lists are cached on disk keyed by mtime+size, with a
+    content digest as a second check, so only changed files are parsed.
+    Parsing runs in a process pool when many files changed. Pass
+    cache_dir=None to disable the on-disk cache.
+    """
+    cache_path = _import_cache_path(src_dir, cache_dir) if cache_dir else None
+    cached_entries = _load_import_cache(cache_path) if cache_path else {}
+
+    entries = {}
+    jobs = []
+    for path, rel_path in _iter_python_files(src_dir):
+        st = os.stat(path)
+        cached = cached_entries.get(rel_path)
+        if cached and cached["mtime_ns"] == st.st_mtime_ns and cached["size"] == st.st_size:
+            entries[rel_path] = cached
+            continue
+        entries[rel_path] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+        jobs.append((path, rel_path, cached))
+
+    if len(jobs) >= PARALLEL_PARSE_THRESHOLD and (max_workers or os.cpu_count() or 1) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            parsed = list(pool.map(_parse_job, jobs, chunksize=32))
+    else:
+        parsed = [_parse_job(job) for job in jobs]
+
+    for rel_path, digest, imports in parsed:
+        entries[rel_path].update({"sha1": digest, "imports": imports})
+
+    if cache_path and (jobs or len(entries) != len(cached_entries)):
+        _save_import_cache(cache_path, entries)
+
+    graph = DependencyGraph({rel_path: entry["imports"] for rel_path, entry in sorted(entries.items())})
+    graph.root = src_dir
     return graph
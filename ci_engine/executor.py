@@ -0,0 +1,219 @@
+"""
+Parallel test execution engine.
+Runs selected tests in separate processes and collects per-test results.
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from pathlib import Path
+
+# Seconds a single test file may run before it is killed
+DEFAULT_TEST_TIMEOUT = 600
+
+# Longest tail of test output kept per result
+MAX_OUTPUT_CHARS = 20000
+
+# Extra attempts for a test that fails or times out; a test that passes
+# on retry is reported as passed with its "retries" count
+DEFAULT_TEST_RETRIES = int(os.environ.get("CI_TEST_RETRIES", "0"))
+
+# Outcomes worth another attempt
+RETRY_STATUSES = ("failed", "timeout")
+
+# Estimate, in seconds, for a test when no test in the set has any history
+DEFAULT_TEST_DURATION = 1.0
+
+# "process" starts a new interpreter per test file; "warm" runs Python
+# test files on pre-imported, forking workers (see warm_pool.py)
+EXECUTOR_MODE = os.environ.get("CI_EXECUTOR", "process")
+
+def default_worker_count():
+    """Number of parallel test processes to use on this machine."""
+    return os.cpu_count() or 1
+
+def estimate_durations(tests, durations=None):
+    """{test: seconds} for every test; tests without history get the median known duration."""
+    durations = durations or {}
+    known = [durations[t] for t in tests if durations.get(t) is not None]
+    fallback = statistics.median(known) if known else DEFAULT_TEST_DURATION
+    return {t: durations[t] if durations.get(t) is not None else fallback for t in tests}
+
+def build_test_command(test_path):
+    """Command line used to run a single Python test file."""
+    return [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", test_path]
+
+def _resolve_test(test, test_dir):
+    """Return (cwd, path) for running a test relative to its project root."""
+    if test_dir is None:
+        return ".", test
+    test_dir = Path(test_dir)
+    return str(test_dir.parent), str(Path(test_dir.name) / test)
+
+class RunControl:
+    """Lets fail-fast skip queued tests and kill the ones in flight.
+
+    One control may be shared by concurrent run_tests calls.
+    """
+
+    def __init__(self):
+        self.stopped = threading.Event()
+        self._lock = threading.Lock()
+        # Running process -> function that kills it
+        self._procs = {}
+        self._killed = set()
+
+    def spawn(self, command, cwd):
+        """Start a test process, or return None once the run is stopped."""
+        with self._lock:
+            if self.stopped.is_set():
+                return None
+            proc = subprocess.Popen(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            self._procs[proc] = proc.kill
+            return proc
+
+    def track(self, proc, kill):
+        """Register a process that is about to run a test; False once the run is stopped."""
+        with self._lock:
+            if self.stopped.is_set():
+                return False
+            self._procs[proc] = kill
+            return True
+
+    def release(self, proc):
+        """Forget a finished process; True if stop() killed it."""
+        with self._lock:
+            self._procs.pop(proc, None)
+            return proc in self._killed
+
+    def stop(self):
+        with self._lock:
+            self.stopped.set()
+            for proc, kill in self._procs.items():
+                # Tests that already exited keep their own result
+                if proc.poll() is None:
+                    kill()
+                    self._killed.add(proc)
+
+def skipped_result(test):
+    """Result record for a test that was not run to completion."""
+    return {"test": test, "status": "skipped", "duration": 0.0, "returncode": None, "output": "", "retries": 0}
+
+def _run_single_test(test, test_dir, timeout, control=None, command=None):
+    """Run one test in its own process and return its result record."""
+    control = control or RunControl()
+    cwd, test_path = _resolve_test(test, test_dir)
+    start = time.time()
+    try:
+        proc = control.spawn((command or build_test_command)(test_path), cwd)
+    except OSError as e:
+        return {"test": test, "status": "error", "duration": time.time() - start,
+                "returncode": None, "output": str(e)[-MAX_OUTPUT_CHARS:]}
+    if proc is None:
+        return skipped_result(test)
+
+    try:
+        stdout, stderr = proc.communicate(timeout=timeout)
+        returncode = proc.returncode
+        status = "passed" if returncode == 0 else "failed"
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        stdout, stderr = proc.communicate()
+        returncode = None
+        status = "timeout"
+    if control.release(proc):
+        return skipped_result(test)
+
+    return {
+        "test": test,
+        "status": status,
+        "duration": time.time() - start,
+        "returncode": returncode,
+        "output": (stdout + stderr)[-MAX_OUTPUT_CHARS:]
+    }
+
+def _run_warm(pool, test, test_dir, timeout, control, command):
+    if not test.endswith(".py"):
+        return _run_single_test(test, test_dir, timeout, control, command)
+    _, test_path = _resolve_test(test, test_dir)
+    return pool.run(test, test_path, timeout, control)
+
+def _run_with_retries(test, test_dir, timeout, control, retries, pool=None, command=None):
+    """Run a test until it passes or retries are used up; returns the last attempt."""
+    attempt = 0
+    while True:
+        if pool is None:
+            record = _run_single_test(test, test_dir, timeout, control, command)
+        else:
+            record = _run_warm(pool, test, test_dir, timeout, control, command)
+        if record["status"] not in RETRY_STATUSES or attempt >= retries or control.stopped.is_set():
+            record["retries"] = attempt
+            return record
+        attempt += 1
+
+def run_tests(tests, test_dir=None, max_workers=None, timeout=DEFAULT_TEST_TIMEOUT, on_result=None,
+              fail_fast=False, retries=None, mode=None, command=None, control=None):
+    """Run tests in parallel, one process each, sized to the machine's cores.
+
+    Returns a dict mapping each test to its result record with
+    status, duration, return code and captured output. If on_result is
+    given it is called with each record as soon as its test finishes.
+    Tests start in the given order. With fail_fast the first test that
+    does not pass stops the run: its record is marked "stopped_run",
+    running tests are killed and they and the queued ones are
+    reported as "skipped". Failing tests are retried up to retries
+    times (CI_TEST_RETRIES by default) before they count as failed.
+    mode overrides CI_EXECUTOR; "warm" falls back to "process" where
+    fork is not available. command maps a test path to the command line
+    that runs it (build_test_command by default); warm workers always
+    run Python files with pytest. Runs that share a control also share
+    fail-fast: a failure in one stops them all.
+    """
+    tests = list(tests)
+    if not tests:
+        return {}
+
+    workers = max(1, min(max_workers or default_worker_count(), len(tests)))
+    retries = DEFAULT_TEST_RETRIES if retries is None else retries
+    control = control or RunControl()
+    warm = _warm_pool(tests, test_dir, mode or EXECUTOR_MODE)
+    records = {}
+    with warm or nullcontext(), ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_run_with_retries, t, test_dir, timeout, control, retries, warm, command) for t in tests
+        ]
+        for future in as_completed(futures):
+            record = future.result()
+            if fail_fast and record["status"] not in ("passed", "skipped") and not control.stopped.is_set():
+                record["stopped_run"] = True
+                control.stop()
+            records[record["test"]] = record
+            if on_result is not None:
+                on_result(record)
+    return {test: records[test] for test in tests}
+
+def _warm_pool(tests, test_dir, mode):
+    """A WarmPool for the run's Python test files, or None to start a process per test."""
+    if mode != "warm":
+        return None
+    from ci_engine import warm_pool
+
+    if not warm_pool.available():
+        return None
+    cwd, _ = _resolve_test("", test_dir)
+    paths = [os.path.join(cwd, _resolve_test(t, test_dir)[1]) for t in tests if t.endswith(".py")]
+    return warm_pool.WarmPool(cwd, warm_pool.preload_modules(paths))
+
+def summarize_results(results):
+    """Count outcomes in a results dict returned by run_tests."""
+    summary = {"passed": 0, "failed": 0, "timeout": 0, "error": 0}
+    for record in results.values():
+        summary[record["status"]] = summary.get(record["status"], 0) + 1
+    summary["total"] = len(results)
+    summary["success"] = summary["total"] == summary["passed"]
+    return summary
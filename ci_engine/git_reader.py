@@ -0,0 +1,652 @@
+"""
+In-process reader for git repositories.
+Reads refs, the index, loose objects and packfiles directly so change
+detection does not fork a git process per query. Repositories using
+features it does not understand raise UnsupportedRepository and the
+caller falls back to the git command line.
+"""
+
+import hashlib
+import mmap
+import os
+import re
+import stat
+import struct
+import zlib
+from collections import deque
+
+# Commits visited per side before merge_base gives up
+MERGE_BASE_WALK_LIMIT = 10000
+
+# Decompressed pack objects kept for resolving delta chains
+PACK_OBJECT_CACHE_SIZE = 256
+
+OBJECT_TYPES = {1: "commit", 2: "tree", 3: "blob", 4: "tag"}
+OFS_DELTA = 6
+REF_DELTA = 7
+
+MODE_TREE = 0o040000
+MODE_FILE = 0o100644
+MODE_EXECUTABLE = 0o100755
+MODE_SYMLINK = 0o120000
+MODE_GITLINK = 0o160000
+
+HEX_SHA = re.compile(r"^[0-9a-f]{40}$")
+REV_SUFFIX = re.compile(r"[~^]\d*")
+
+class GitError(Exception):
+    """A repository could not be read, e.g. a missing object or ref."""
+
+class UnsupportedRepository(GitError):
+    """The repository uses a format this reader does not implement."""
+
+def blob_id(data):
+    """Git blob id of a bytes payload."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+def _find_git_dir(root):
+    """(git_dir, common_dir) for a work tree, following .git files and worktrees."""
+    git_dir = os.path.join(root, ".git")
+    if os.path.isfile(git_dir):
+        with open(git_dir) as f:
+            content = f.read().strip()
+        if not content.startswith("gitdir:"):
+            raise UnsupportedRepository(f"unrecognized .git file in {root}")
+        git_dir = os.path.normpath(os.path.join(root, content[len("gitdir:"):].strip()))
+    if not os.path.isdir(git_dir):
+        raise GitError(f"not a git repository: {root}")
+    common_dir = git_dir
+    commondir_file = os.path.join(git_dir, "commondir")
+    if os.path.exists(commondir_file):
+        with open(commondir_file) as f:
+            common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    return git_dir, common_dir
+
+def _offset_varint(data, pos):
+    """Decode the offset varint used by OFS_DELTA and index v4 paths."""
+    c = data[pos]
+    value = c & 0x7f
+    while c & 0x80:
+        pos += 1
+        c = data[pos]
+        value = ((value + 1) << 7) | (c & 0x7f)
+    return value, pos + 1
+
+def _size_varint(data, pos):
+    """Decode the little-endian size varint at the start of a delta."""
+    value = shift = 0
+    while True:
+        c = data[pos]
+        pos += 1
+        value |= (c & 0x7f) << shift
+        shift += 7
+        if not c & 0x80:
+            return value, pos
+
+def apply_delta(base, delta):
+    """Rebuild an object from its delta base and a git delta."""
+    source_size, pos = _size_varint(delta, 0)
+    target_size, pos = _size_varint(delta, pos)
+    if source_size != len(base):
+        raise GitError("delta base size mismatch")
+    out = bytearray()
+    while pos < len(delta):
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            offset = size = 0
+            for bit in range(4):
+                if op & (1 << bit):
+                    offset |= delta[pos] << (8 * bit)
+                    pos += 1
+            for bit in range(3):
+                if op & (0x10 << bit):
+                    size |= delta[pos] << (8 * bit)
+                    pos += 1
+            out += base[offset:offset + (size or 0x10000)]
+        elif op:
+            out += delta[pos:pos + op]
+            pos += op
+        else:
+            raise GitError("invalid delta opcode")
+    if len(out) != target_size:
+        raise GitError("delta result size mismatch")
+    return bytes(out)
+
+class _Pack:
+    """A packfile and its version 2 index."""
+
+    def __init__(self, idx_path):
+        with open(idx_path, "rb") as f:
+            idx = f.read()
+        if idx[:4] != b"\377tOc" or struct.unpack(">I", idx[4:8])[0] != 2:
+            raise UnsupportedRepository(f"unsupported pack index: {idx_path}")
+        self.fanout = struct.unpack(">256I", idx[8:8 + 1024])
+        count = self.fanout[255]
+        self.shas = idx[1032:1032 + 20 * count]
+        offsets_start = 1032 + 24 * count
+        self.offsets = idx[offsets_start:offsets_start + 4 * count]
+        self.large_offsets = idx[offsets_start + 4 * count:]
+        with open(idx_path[:-4] + ".pack", "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def find(self, sha):
+        """Offset of a binary sha in the pack, or None."""
+        first = sha[0]
+        lo = self.fanout[first - 1] if first else 0
+        hi = self.fanout[first]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            candidate = self.shas[20 * mid:20 * mid + 20]
+            if candidate < sha:
+                lo = mid + 1
+            elif candidate > sha:
+                hi = mid
+            else:
+                offset = struct.unpack(">I", self.offsets[4 * mid:4 * mid + 4])[0]
+                if offset & 0x80000000:
+                    i = offset & 0x7fffffff
+                    offset = struct.unpack(">Q", self.large_offsets[8 * i:8 * i + 8])[0]
+                return offset
+        return None
+
+    def inflate(self, pos, size):
+        """Inflate the zlib stream at pos whose output is size bytes."""
+        decompressor = zlib.decompressobj()
+        chunks = []
+        # Compressed data is rarely much larger than its output
+        step = size + 64
+        while not decompressor.eof:
+            chunk = self.data[pos:pos + step]
+            if not chunk:
+                raise GitError("truncated pack object")
+            chunks.append(decompressor.decompress(chunk))
+            pos += len(chunk)
+            step = 65536
+        return b"".join(chunks)
+
+    def read_header(self, offset):
+        """(type number, inflated size, data position, delta base) at offset."""
+        data = self.data
+        c = data[offset]
+        kind = (c >> 4) & 7
+        size = c & 15
+        shift = 4
+        pos = offset + 1
+        while c & 0x80:
+            c = data[pos]
+            pos += 1
+            size |= (c & 0x7f) << shift
+            shift += 7
+        base = None
+        if kind == OFS_DELTA:
+            distance, pos = _offset_varint(data, pos)
+            base = offset - distance
+        elif kind == REF_DELTA:
+            base = bytes(data[pos:pos + 20])
+            pos += 20
+        return kind, size, pos, base
+
+class GitRepository:
+    """Read-only access to one repository's refs, index and objects."""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.git_dir, self.common_dir = _find_git_dir(self.root)
+        self._check_format()
+        self._object_dirs = self._find_object_dirs()
+        self._packs = None
+        self._packed_refs = None
+        self._cache = {}
+
+    def _check_format(self):
+        # core.fileMode=false: the executable bit is taken from the index
+        self.filemode = True
+        try:
+            with open(os.path.join(self.common_dir, "config")) as f:
+                config = f.read().lower()
+        except OSError:
+            return
+        self.filemode = not re.search(r"filemode\s*=\s*(false|no|off|0)\b", config)
+        if re.search(r"objectformat\s*=\s*sha256", config):
+            raise UnsupportedRepository("sha256 repositories are not supported")
+
+    def _find_object_dirs(self):
+        objects = os.path.join(self.common_dir, "objects")
+        dirs = [objects]
+        try:
+            with open(os.path.join(objects, "info", "alternates")) as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        dirs.append(os.path.normpath(os.path.join(objects, line)))
+        except OSError:
+            pass
+        return dirs
+
+    def _load_packs(self):
+        if self._packs is None:
+            packs = []
+            for objects in self._object_dirs:
+                pack_dir = os.path.join(objects, "pack")
+                try:
+                    names = sorted(os.listdir(pack_dir))
+                except OSError:
+                    continue
+                for name in names:
+                    if name.endswith(".idx") and os.path.exists(os.path.join(pack_dir, name[:-4] + ".pack")):
+                        packs.append(_Pack(os.path.join(pack_dir, name)))
+            self._packs = packs
+        return self._packs
+
+    # ---------- objects ----------
+
+    def read_object(self, sha):
+        """(type, bytes) of an object by hex sha. Raises GitError if missing."""
+        cached = self._cache.get(sha)
+        if cached is not None:
+            return cached
+        obj = self._read_loose(sha)
+        if obj is None:
+            binary = bytes.fromhex(sha)
+            for pack in self._load_packs():
+                offset = pack.find(binary)
+                if offset is not None:
+                    obj = self._read_packed(pack, offset)
+                    break
+        if obj is None:
+            raise GitError(f"object not found: {sha}")
+        if obj[0] != "blob":
+            self._remember(sha, obj)
+        return obj
+
+    def _remember(self, key, obj):
+        if len(self._cache) >= PACK_OBJECT_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[key] = obj
+
+    def _read_loose(self, sha):
+        for objects in self._object_dirs:
+            try:
+                with open(os.path.join(objects, sha[:2], sha[2:]), "rb") as f:
+                    raw = zlib.decompress(f.read())
+            except FileNotFoundError:
+                continue
+            header, _, body = raw.partition(b"\0")
+            kind, _, _ = header.partition(b" ")
+            return kind.decode(), body
+        return None
+
+    def _read_packed(self, pack, offset):
+        key = (id(pack), offset)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        kind, size, pos, base = pack.read_header(offset)
+        if kind in OBJECT_TYPES:
+            obj = (OBJECT_TYPES[kind], pack.inflate(pos, size))
+        elif kind == OFS_DELTA:
+            base_kind, base_data = self._read_packed(pack, base)
+            obj = (base_kind, apply_delta(base_data, pack.inflate(pos, size)))
+        elif kind == REF_DELTA:
+            base_kind, base_data = self.read_object(base.hex())
+            obj = (base_kind, apply_delta(base_data, pack.inflate(pos, size)))
+        else:
+            raise GitError(f"unknown pack object type {kind}")
+        self._remember(key, obj)
+        return obj
+
+    def read_commit(self, sha):
+        """(tree sha, [parent shas]) of a commit, peeling annotated tags."""
+        kind, data = self.read_object(sha)
+        while kind == "tag":
+            target = data.split(b"\n", 1)[0]
+            if not target.startswith(b"object "):
+                raise GitError(f"malformed tag {sha}")
+            kind, data = self.read_object(target[7:].decode())
+        if kind != "commit":
+            raise GitError(f"{sha} is a {kind}, not a commit")
+        tree = None
+        parents = []
+        for line in data.split(b"\n"):
+            if not line:
+                break
+            if line.startswith(b"tree "):
+                tree = line[5:].decode()
+            elif line.startswith(b"parent "):
+                parents.append(line[7:].decode())
+        return tree, parents
+
+    def read_tree(self, sha):
+        """List of (mode, name, sha) entries of a tree object."""
+        kind, data = self.read_object(sha)
+        if kind != "tree":
+            raise GitError(f"{sha} is a {kind}, not a tree")
+        entries = []
+        pos = 0
+        while pos < len(data):
+            space = data.index(b" ", pos)
+            nul = data.index(b"\0", space)
+            mode = int(data[pos:space], 8)
+            name = data[space + 1:nul].decode("utf-8", "surrogateescape")
+            entries.append((mode, name, data[nul + 1:nul + 21].hex()))
+            pos = nul + 21
+        return entries
+
+    # ---------- refs ----------
+
+    def _read_packed_refs(self):
+        if self._packed_refs is None:
+            refs = {}
+            try:
+                with open(os.path.join(self.common_dir, "packed-refs")) as f:
+                    for line in f:
+                        if line.startswith(("#", "^")):
+                            continue
+                        parts = line.split()
+                        if len(parts) == 2:
+                            refs[parts[1]] = parts[0]
+            except OSError:
+                pass
+            self._packed_refs = refs
+        return self._packed_refs
+
+    def read_ref(self, name, depth=0):
+        """Sha a ref points to, following symbolic refs, or None."""
+        if depth > 5:
+            raise GitError(f"symbolic ref loop at {name}")
+        base = self.git_dir if "/" not in name or name.startswith(("refs/bisect/", "refs/worktree/")) else self.common_dir
+        try:
+            with open(os.path.join(base, name)) as f:
+                value = f.read().strip()
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            return self._read_packed_refs().get(name)
+        if value.startswith("ref:"):
+            return self.read_ref(value[4:].strip(), depth + 1)
+        return value if HEX_SHA.match(value) else None
+
+    def head(self):
+        """Sha of HEAD, or None on an unborn branch."""
+        return self.read_ref("HEAD")
+
+    def resolve(self, rev):
+        """Commit sha for a revision, or None if it cannot be resolved here.
+
+        Supports full shas and ref names as git rev-parse looks them up,
+        followed by ~N and ^N suffixes. Other syntax returns None so the
+        caller can ask git instead.
+        """
+        match = re.match(r"^(.*?)((?:[~^]\d*)*)$", rev)
+        name, suffix = match.group(1), match.group(2)
+        if HEX_SHA.match(name):
+            sha = name
+        else:
+            sha = None
+            for candidate in (name, f"refs/{name}", f"refs/tags/{name}", f"refs/heads/{name}",
+                              f"refs/remotes/{name}", f"refs/remotes/{name}/HEAD"):
+                sha = self.read_ref(candidate)
+                if sha:
+                    break
+        if sha is None:
+            return None
+        try:
+            for op in REV_SUFFIX.findall(suffix):
+                count = int(op[1:] or 1)
+                if op[0] == "~":
+                    for _ in range(count):
+                        sha = self.read_commit(sha)[1][0]
+                elif count:
+                    sha = self.read_commit(sha)[1][count - 1]
+        except IndexError:
+            raise GitError(f"{rev} does not exist")
+        return sha
+
+    def merge_base(self, a, b, limit=MERGE_BASE_WALK_LIMIT):
+        """A common ancestor of two commits, found by walking both histories.
+
+        Returns the first commit reached from both sides breadth-first,
+        which is the merge-base for ordinary branch histories. Raises
+        GitError if none is found within limit commits per side.
+        """
+        if a == b:
+            return a
+        sides = [(deque([a]), {a}), (deque([b]), {b})]
+        for _ in range(limit):
+            progressed = False
+            for i, (queue, seen) in enumerate(sides):
+                other = sides[1 - i][1]
+                if not queue:
+                    continue
+                progressed = True
+                try:
+                    parents = self.read_commit(queue.popleft())[1]
+                except GitError:
+                    # Shallow clones lack the parents of their oldest commits
+                    continue
+                for parent in parents:
+                    if parent in other:
+                        return parent
+                    if parent not in seen:
+                        seen.add(parent)
+                        queue.append(parent)
+            if not progressed:
+                return None
+        raise GitError("merge-base search limit reached")
+
+    # ---------- index and working tree ----------
+
+    def read_index(self):
+        """Parse the index into a GitIndex."""
+        return GitIndex.read(os.path.join(self.git_dir, "index"))
+
+    def flatten_tree(self, sha, prefix="", skip=None):
+        """{path: (mode, sha)} for every blob under a tree.
+
+        skip(prefix, tree_sha) may return True to leave a subtree out.
+        Returns (blobs, skipped prefixes).
+        """
+        blobs = {}
+        skipped = []
+        stack = [(prefix, sha)]
+        while stack:
+            prefix, sha = stack.pop()
+            if skip is not None and skip(prefix, sha):
+                skipped.append(prefix)
+                continue
+            for mode, name, entry_sha in self.read_tree(sha):
+                if mode == MODE_TREE:
+                    stack.append((f"{prefix}{name}/", entry_sha))
+                else:
+                    blobs[prefix + name] = (mode, entry_sha)
+        return blobs, skipped
+
+    def diff_workdir(self, rev, hash_file=None):
+        """Files differing between a commit and the working tree, as git diff <rev>.
+
+        Returns {path: blob id of the working-tree file, or None if it
+        was deleted}. Unchanged directories are skipped using the index's
+        cached tree ids; files whose stat data disagrees with the index
+        are hashed with hash_file(path), default blob_id of the contents.
+        Mode-only changes (chmod +x, a file replaced by a symlink) count.
+        Untracked files are ignored. Returns None if rev is unknown here.
+        """
+        sha = self.resolve(rev)
+        if sha is None:
+            return None
+        tree = self.read_commit(sha)[0]
+        index = self.read_index()
+        hash_file = hash_file or _hash_path
+
+        # Directories whose cached index tree equals the base tree match it entirely
+        base, skipped = self.flatten_tree(tree, skip=lambda prefix, sha: index.cache_tree.get(prefix) == sha)
+        skipped = set(skipped)
+
+        def in_skipped(path):
+            end = path.rfind("/")
+            while end >= 0:
+                if path[:end + 1] in skipped:
+                    return True
+                end = path.rfind("/", 0, end)
+            return "" in skipped
+
+        changes = {}
+        for path, entry in index.entries.items():
+            if entry.stage:
+                changes[path] = self._worktree_entry(path, entry, index, hash_file, trust_index=False)[1]
+                base.pop(path, None)
+                continue
+            if in_skipped(path):
+                base_entry = (entry.mode, entry.sha)
+            else:
+                base_entry = base.pop(path, None)
+            work_mode, work_id = self._worktree_entry(path, entry, index, hash_file)
+            if work_id is None:
+                if base_entry:
+                    changes[path] = None
+            elif base_entry != (work_mode, work_id):
+                changes[path] = work_id
+        for path in base:
+            changes[path] = None
+        return changes
+
+    def _worktree_entry(self, path, entry, index, hash_file, trust_index=True):
+        """(mode, blob id) of the working-tree file, (None, None) if missing."""
+        if entry.mode == MODE_GITLINK or entry.skip_worktree:
+            return entry.mode, entry.sha
+        full = os.path.join(self.root, path)
+        try:
+            st = os.lstat(full)
+        except OSError:
+            return None, None
+        # Stat data says nothing about chmod, so the mode is always re-derived
+        if stat.S_ISLNK(st.st_mode):
+            mode = MODE_SYMLINK
+        elif not self.filemode and entry.mode in (MODE_FILE, MODE_EXECUTABLE):
+            mode = entry.mode
+        else:
+            mode = MODE_EXECUTABLE if st.st_mode & 0o100 else MODE_FILE
+        if trust_index and mode == entry.mode and index.is_clean(entry, st):
+            return mode, entry.sha
+        if mode == MODE_SYMLINK:
+            return mode, blob_id(os.fsencode(os.readlink(full)))
+        return mode, hash_file(full)
+
+def _hash_path(path):
+    with open(path, "rb") as f:
+        return blob_id(f.read())
+
+class IndexEntry:
+    __slots__ = ("mode", "sha", "size", "mtime_ns", "stage", "skip_worktree", "intent_to_add")
+
+    def __init__(self, mode, sha, size, mtime_ns, stage, skip_worktree, intent_to_add):
+        self.mode = mode
+        self.sha = sha
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.stage = stage
+        self.skip_worktree = skip_worktree
+        self.intent_to_add = intent_to_add
+
+class GitIndex:
+    """Entries and cached tree ids of a git index file (versions 2-4)."""
+
+    def __init__(self, entries, cache_tree, mtime_ns):
+        self.entries = entries
+        self.cache_tree = cache_tree
+        self.mtime_ns = mtime_ns
+
+    @classmethod
+    def read(cls, path):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+                mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+        except FileNotFoundError:
+            return cls({}, {}, 0)
+        if data[:4] != b"DIRC":
+            raise GitError(f"not an index file: {path}")
+        version, count = struct.unpack(">II", data[4:12])
+        if version not in (2, 3, 4):
+            raise UnsupportedRepository(f"index version {version}")
+
+        entries = {}
+        pos = 12
+        previous = b""
+        for _ in range(count):
+            (_, _, mtime_s, mtime_n, _, _, mode, _, _, size) = struct.unpack(">10I", data[pos:pos + 40])
+            sha = data[pos + 40:pos + 60].hex()
+            flags = struct.unpack(">H", data[pos + 60:pos + 62])[0]
+            cursor = pos + 62
+            extended = 0
+            if flags & 0x4000:
+                extended = struct.unpack(">H", data[cursor:cursor + 2])[0]
+                cursor += 2
+            if version == 4:
+                strip, cursor = _offset_varint(data, cursor)
+                nul = data.index(b"\0", cursor)
+                name = previous[:len(previous) - strip] + data[cursor:nul]
+                pos = nul + 1
+            else:
+                nul = data.index(b"\0", cursor)
+                name = data[cursor:nul]
+                pos += (cursor - pos + len(name) + 8) & ~7
+            previous = name
+            if mode & 0o170000 == MODE_TREE:
+                raise UnsupportedRepository("sparse index")
+            entry = IndexEntry(
+                mode, sha, size, mtime_s * 1_000_000_000 + mtime_n,
+                (flags >> 12) & 3, bool(extended & 0x4000), bool(extended & 0x2000)
+            )
+            path = name.decode("utf-8", "surrogateescape")
+            # Keep stage 0 if present, otherwise any conflict stage
+            if path not in entries or entry.stage == 0:
+                entries[path] = entry
+
+        cache_tree = {}
+        end = len(data) - 20
+        while pos + 8 <= end:
+            signature = data[pos:pos + 4]
+            length = struct.unpack(">I", data[pos + 4:pos + 8])[0]
+            body = data[pos + 8:pos + 8 + length]
+            if signature == b"link":
+                raise UnsupportedRepository("split index")
+            if signature == b"TREE":
+                cache_tree = _parse_cache_tree(body)
+            pos += 8 + length
+        return cls(entries, cache_tree, mtime_ns)
+
+    def is_clean(self, entry, st):
+        """Whether stat data shows the working-tree file matches the entry.
+
+        Files modified in the same second as the index was written are
+        "racily clean" and must be hashed, as git does.
+        """
+        if entry.intent_to_add or st.st_size & 0xffffffff != entry.size:
+            return False
+        same_mtime = st.st_mtime_ns == entry.mtime_ns or (
+            entry.mtime_ns % 1_000_000_000 == 0 and st.st_mtime_ns // 1_000_000_000 == entry.mtime_ns // 1_000_000_000
+        )
+        return same_mtime and entry.mtime_ns // 1_000_000_000 < self.mtime_ns // 1_000_000_000
+
+def _parse_cache_tree(body):
+    """{directory prefix: tree sha} for valid entries of a TREE extension."""
+    trees = {}
+    pos = 0
+    # (prefix of the parent, subtrees still to read under it)
+    stack = [("", 1)]
+    while pos < len(body) and stack:
+        parent, remaining = stack.pop()
+        if remaining > 1:
+            stack.append((parent, remaining - 1))
+        nul = body.index(b"\0", pos)
+        name = body[pos:nul].decode("utf-8", "surrogateescape")
+        newline = body.index(b"\n", nul)
+        entry_count, subtrees = (int(x) for x in body[nul + 1:newline].split(b" "))
+        pos = newline + 1
+        prefix = f"{parent}{name}/" if name else parent
+        if entry_count >= 0:
+            trees[prefix] = body[pos:pos + 20].hex()
+            pos += 20
+        if subtrees:
+            stack.append((prefix, subtrees))
+    return trees
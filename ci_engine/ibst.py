@@ -1,14 +1,61 @@
 import os
+from ci_engine.test_mapper import build_reverse_index
+from ci_engine.dependency_graph import get_impact_index
+from ci_engine.executor import estimate_durations
 
-def select_tests(changed_files, dependency_graph, test_map):
+# Chance that a test fails with no failure history, by how it was selected
+DIRECT_FAILURE_PRIOR = 0.2
+TRANSITIVE_FAILURE_PRIOR = 0.05
+
+# Floor on expected durations, in seconds, so instant tests rank finitely
+MIN_EXPECTED_DURATION = 0.01
+
+def select_tests(changed_files, dependency_graph, test_map, max_depth=None):
+    """Select tests covering changed files or files that (transitively) import them.
+
+    max_depth limits how many import hops are followed; None follows the
+    full closure and 0 disables propagation.
+    """
     impacted_tests = set()
 
+    # Propagate changes to importers through the reverse dependency graph
+    impacted_files = set(changed_files)
+    if dependency_graph and max_depth != 0:
+        impacted_files |= get_impact_index(dependency_graph).impacted(changed_files, max_depth)
+
     # Normalize changed file names
-    changed_files = [os.path.basename(f) for f in changed_files]
+    impacted_files = {os.path.basename(f) for f in impacted_files}
+
+    # Source file -> tests lookup; prebuilt and kept current for IndexedTestMap
+    reverse_index = build_reverse_index(test_map)
 
-    for file in changed_files:
-        for test, covered_files in test_map.items():
-            if file in covered_files:
-                impacted_tests.add(test)
+    for file in impacted_files:
+        impacted_tests.update(reverse_index.get(file, ()))
 
     return list(impacted_tests)
+
+def prioritize_tests(tests, changed_files, test_map, test_stats=None):
+    """Order selected tests so that likely failures are reported first.
+
+    Tests mapped to a changed file run before tests selected through
+    imports, however long they take. Within each group, tests are
+    ordered by chance to fail per expected second, then by name; the
+    chance is the recent failure rate plus a prior for the group.
+
+    test_stats maps tests to {"duration", "failure_rate"}; tests
+    without history get the median duration and no failure rate.
+    """
+    test_stats = test_stats or {}
+    reverse_index = build_reverse_index(test_map)
+    direct = set()
+    for file in changed_files or ():
+        direct.update(reverse_index.get(os.path.basename(file), ()))
+
+    durations = estimate_durations(tests, {t: test_stats[t].get("duration") for t in tests if t in test_stats})
+
+    def priority(test):
+        prior = DIRECT_FAILURE_PRIOR if test in direct else TRANSITIVE_FAILURE_PRIOR
+        chance = min(1.0, ((test_stats.get(test) or {}).get("failure_rate") or 0.0) + prior)
+        return (test not in direct, -chance / max(durations[test], MIN_EXPECTED_DURATION), test)
+
+    return sorted(tests, key=priority)
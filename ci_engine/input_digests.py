@@ -0,0 +1,107 @@
+"""
+Per-test input digests for the per-test result cache.
+A test's digest covers the test file, the source files it covers and
+everything those files import, the conftest and pytest configuration
+files around it and the command that runs it, so unchanged inputs mean
+a reusable result.
+"""
+
+import os
+import sys
+import hashlib
+from ci_engine.cache_manager import file_digest, hash_lockfiles
+from ci_engine.dependency_graph import get_impact_index, parse_file_imports
+from ci_engine.executor import _resolve_test, build_test_command
+
+# Bumped whenever the digest layout changes
+INPUT_DIGEST_VERSION = "v3"
+
+# Files pytest reads from the test's directory and each one above it
+PYTEST_SUPPORT_FILES = ("conftest.py", "pytest.ini", "pyproject.toml", "setup.cfg", "tox.ini")
+
+# content digest -> imports of a test file
+_TEST_IMPORTS_MEMO = {}
+
+def _test_file_imports(path, digest):
+    imports = _TEST_IMPORTS_MEMO.get(digest)
+    if imports is None:
+        _, imports = parse_file_imports(path, os.path.basename(path))
+        _TEST_IMPORTS_MEMO[digest] = imports
+    return imports
+
+def _test_path(test, test_dir):
+    return os.path.join(test_dir, test) if test_dir else test
+
+def _support_inputs(test, test_dir, memo):
+    """conftest and config file digests from the test's directory up to the project root."""
+    cwd, test_path = _resolve_test(test, test_dir)
+    root = os.path.abspath(cwd)
+    directory = os.path.dirname(os.path.join(root, test_path))
+    inputs = []
+    while True:
+        if directory not in memo:
+            memo[directory] = []
+            for name in PYTEST_SUPPORT_FILES:
+                path = os.path.join(directory, name)
+                digest = file_digest(path)
+                if digest != "missing":
+                    memo[directory].append(f"{os.path.relpath(path, root)}\0{digest}")
+        inputs.extend(memo[directory])
+        parent = os.path.dirname(directory)
+        if directory == root or parent == directory:
+            return inputs
+        directory = parent
+
+def compute_test_digests(tests, test_map, dependency_graph, test_dir=None, command=None):
+    """Return a dict of test -> digest of its transitive inputs.
+
+    command is the function run_tests builds a test's command line with
+    (build_test_command by default), so another runner or other flags
+    give another digest. A digest is None when the test's inputs cannot
+    be located on disk (missing test file, or neither a rooted
+    dependency graph nor a test map source directory to resolve covered
+    files); such tests always run.
+    """
+    root = getattr(dependency_graph, "root", None)
+    src_dir = getattr(test_map, "src_dir", None)
+    index = get_impact_index(dependency_graph) if dependency_graph and root is not None else None
+    if index is None and src_dir is None:
+        return {test: None for test in tests}
+
+    node_digests = None
+    if index is not None:
+        node_digests = index.transitive_digests(lambda node: file_digest(os.path.join(root, node)))
+
+    shared = f"{INPUT_DIGEST_VERSION}\0{sys.version}\0{hash_lockfiles()}"
+    support_memo = {}
+    digests = {}
+    for test in tests:
+        path = _test_path(test, test_dir)
+        test_digest = file_digest(path)
+        if test_digest == "missing":
+            digests[test] = None
+            continue
+
+        inputs = set()
+        for covered in test_map.get(test, ()):
+            nodes = index.match_nodes(covered) if index is not None else ()
+            if nodes:
+                inputs.update(f"{index.nodes[n]}\0{node_digests[n]}" for n in nodes)
+            elif src_dir is not None:
+                inputs.add(f"{covered}\0{file_digest(os.path.join(src_dir, covered))}")
+            else:
+                inputs.add(f"{covered}\0missing")
+
+        if index is not None and path.endswith(".py"):
+            for name in _test_file_imports(path, test_digest):
+                inputs.update(f"{index.nodes[n]}\0{node_digests[n]}" for n in index.resolve_import(name))
+
+        inputs.update(_support_inputs(test, test_dir, support_memo))
+        command_line = "\0".join((command or build_test_command)(_resolve_test(test, test_dir)[1]))
+
+        h = hashlib.sha256(f"{shared}\0{test}\0{test_digest}\0{command_line}".encode())
+        for item in sorted(inputs):
+            h.update(item.encode())
+            h.update(b"\n")
+        digests[test] = h.hexdigest()
+    return digests
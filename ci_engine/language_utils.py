@@ -3,49 +3,105 @@ Language-aware utilities for cache management and test selection.
 Provides functions to analyze code changes by programming language.
 """
 
+import os
+import sys
+from itertools import islice
 from pathlib import Path
-from ci_engine.cache_manager import get_file_language, LANGUAGE_EXTENSIONS
-from ci_engine.change_detector import get_changed_files
-
-def get_language_stats():
-    """Analyze all project files and return language distribution."""
-    stats = {
-        "total_files": 0,
-        "by_language": {}
-    }
-    
-    # Scan current directory recursively
-    for file in Path(".").rglob("*"):
-        if file.is_file() and not file.parts[0].startswith("."):
-            lang = get_file_language(str(file))
+from ci_engine.cache_manager import get_file_language, classify_files, _file_suffix, LANGUAGE_EXTENSIONS
+from ci_engine.change_detector import get_change_set
+from ci_engine.executor import build_test_command, default_worker_count
+from ci_engine.repo_scanner import scan_files, tree_unchanged, SCAN_WORKERS
+
+# Paths classified per batch while a scan streams in
+CLASSIFY_BATCH_SIZE = 4096
+
+# Command templates per runner; {test} is the test file's path and
+# {name} its file name without the extension
+RUNNER_COMMANDS = {
+    "unittest": [sys.executable, "-m", "unittest", "{test}"],
+    "jest": ["npx", "jest", "{test}"],
+    "mocha": ["npx", "mocha", "{test}"],
+    "vitest": ["npx", "vitest", "run", "{test}"],
+    "junit": ["mvn", "-q", "test", "-Dtest={name}"],
+    "nunit": ["dotnet", "test", "--filter", "{name}"],
+    "testing": ["go", "test", "{test}"],
+    "cargo test": ["cargo", "test", "--test", "{name}"],
+    "rspec": ["bundle", "exec", "rspec", "{test}"],
+    "phpunit": ["vendor/bin/phpunit", "{test}"],
+}
+
+# Parallel test processes per language lane, when not the core count:
+# JVM and CLR runners are few and heavy. CI_LANE_WORKERS overrides
+# these, e.g. "java=2,python=16"
+LANE_WORKERS = {"java": 2, "csharp": 2}
+
+# abspath of root -> (mtimes recorded by the scan, stats)
+_STATS_CACHE = {}
+
+def _count_languages(root, workers, mtimes=None):
+    """{language: [files]} for the known-language files under root.
+
+    Extensionless files are classified by content, so their mtimes are
+    recorded in mtimes alongside the scanned directories'.
+    """
+    by_language = {}
+    files = scan_files(root, workers=workers, mtimes=mtimes)
+    while True:
+        batch = list(islice(files, CLASSIFY_BATCH_SIZE))
+        if not batch:
+            # Parallel scans yield in completion order
+            for files_of_language in by_language.values():
+                files_of_language.sort()
+            return by_language
+        languages = classify_files(batch, detect_content=True, root=root)
+        if mtimes is not None:
+            for file in batch:
+                if not _file_suffix(file):
+                    path = os.path.join(root, file)
+                    try:
+                        mtimes[path] = os.stat(path).st_mtime_ns
+                    except OSError:
+                        mtimes[path] = None
+        for file, lang in zip(batch, languages):
             if lang != "unknown":
-                stats["total_files"] += 1
-                if lang not in stats["by_language"]:
-                    stats["by_language"][lang] = []
-                stats["by_language"][lang].append(str(file))
-    
-    return stats
+                by_language.setdefault(lang, []).append(file)
+
+def get_language_stats(root=".", workers=SCAN_WORKERS):
+    """Analyze all project files and return language distribution.
 
-def get_changed_languages():
+    Files ignored by .gitignore and top-level dot directories are
+    skipped. The result is cached until a directory, ignore file or
+    extensionless (#!-classified) file in the tree changes (see
+    repo_scanner.tree_unchanged).
+    """
+    key = os.path.abspath(root)
+    cached = _STATS_CACHE.get(key)
+    if cached is None or not tree_unchanged(cached[0]):
+        mtimes = {}
+        by_language = _count_languages(root, workers, mtimes)
+        cached = _STATS_CACHE[key] = (mtimes, by_language)
+
+    by_language = cached[1]
+    return {
+        "total_files": sum(len(files) for files in by_language.values()),
+        # Copies, so callers cannot change the cached lists
+        "by_language": {lang: list(files) for lang, files in by_language.items()}
+    }
+
+def get_changed_languages(change_set=None):
     """Get list of languages affected by recent changes."""
-    changed_files = get_changed_files()
-    languages = set()
-    
-    for file in changed_files:
-        lang = get_file_language(file)
-        if lang != "unknown":
-            languages.add(lang)
-    
-    return sorted(list(languages))
+    if change_set is None:
+        change_set = get_change_set()
+    if change_set is None:
+        return []
+    return change_set.languages()
 
 def get_language_file_count(directory, language=None):
     """Count files of a specific language in a directory."""
-    count = 0
-    for file in Path(directory).rglob("*"):
-        if file.is_file():
-            if language is None or get_file_language(str(file)) == language:
-                count += 1
-    return count
+    files = list(scan_files(directory, workers=SCAN_WORKERS))
+    if language is None:
+        return len(files)
+    return classify_files(files, detect_content=True, root=directory).count(language)
 
 def analyze_file_impact(filepath):
     """Analyze potential impact of a file change based on language and type."""
@@ -82,6 +138,40 @@ def get_language_test_runners(language):
     }
     return runners.get(language, [])
 
+def get_test_command(test_path, language=None):
+    """Command line running one test file with its language's preferred runner.
+
+    The test file's own language decides, falling back to language.
+    Python and languages without a runner template use pytest.
+    """
+    detected = get_file_language(test_path)
+    if detected == "unknown":
+        detected = language
+    for runner in get_language_test_runners(detected):
+        if runner == "pytest":
+            break
+        template = RUNNER_COMMANDS.get(runner)
+        if template:
+            name = os.path.splitext(os.path.basename(test_path))[0]
+            return [arg.format(test=test_path, name=name) for arg in template]
+    return build_test_command(test_path)
+
+def _lane_workers_from_env(value):
+    workers = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        language, _, count = item.partition("=")
+        try:
+            workers[language.strip()] = max(1, int(count))
+        except ValueError:
+            continue
+    return workers
+
+def get_lane_worker_count(language, max_workers=None):
+    """Parallel test processes for a language's lane, capped at max_workers."""
+    configured = dict(LANE_WORKERS, **_lane_workers_from_env(os.environ.get("CI_LANE_WORKERS", "")))
+    workers = configured.get(language) or default_worker_count()
+    return min(workers, max_workers) if max_workers else workers
+
 def format_language_report(language_breakdown):
     """Format language breakdown data into a readable report."""
     report = "Language-Aware Test Execution Report\n"
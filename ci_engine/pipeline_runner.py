@@ -1,140 +1,341 @@
+import os
 import time
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from ci_engine.change_detector import get_changed_files, get_changed_files_by_language, filter_changes_by_language
-from ci_engine.ibst import select_tests
+from ci_engine.change_detector import ChangeSet, get_change_set, record_green_state, filter_changes_by_language
+from ci_engine.ibst import select_tests, prioritize_tests
+from ci_engine.executor import run_tests, summarize_results, RunControl
+from ci_engine.language_utils import get_test_command, get_lane_worker_count
 from ci_engine.cache_manager import (
     load_cache, save_cache,
     load_language_aware_cache, save_language_aware_cache, save_language_map,
-    get_file_language
+    load_test_results, save_test_results,
+    get_file_language, file_digest, hash_lockfiles, get_lock_dir, DEPENDENCY_LOCKFILES
 )
+from ci_engine.input_digests import compute_test_digests
+from ci_engine.single_flight import single_flight
+from ci_engine.test_mapper import hash_test_map
 
-def run_pipeline(test_map, dependency_graph, baseline=False, language_aware=True):
+# Bumped whenever the cache key layout changes
+CACHE_KEY_VERSION = "v3"
+
+def run_pipeline(test_map, dependency_graph, baseline=False, language_aware=True,
+                 test_dir=None, max_workers=None, impact_depth=None, progress=None,
+                 change_set=None, test_stats=None, fail_fast=False):
+    """Select and run the tests affected by the current changes.
+
+    change_set is a ChangeSet from get_change_set; it is computed here
+    when not given, once for the whole run.
+
+    Selected tests run in prioritize_tests order, using test_stats
+    ({test: {"duration", "failure_rate"}}) where given. With fail_fast
+    the first failing test stops the run; the remaining tests are
+    reported as "skipped" and the result names it as "first_failure".
+
+    progress, if given, is called with an event dict as work proceeds:
+    {"event": "selected", "tests": [...]} once tests are chosen (per
+    language in language-aware mode) and {"event": "test", ...} with
+    the status of each test as it finishes or is served from cache.
+    """
     start = time.time()
+    if test_dir is None:
+        test_dir = getattr(test_map, "test_dir", None)
 
     # ---------- BASELINE MODE ----------
     if baseline:
         selected_tests = list(test_map.keys())
-        time.sleep(0.5 * len(selected_tests))
+        _report(progress, "selected", tests=selected_tests)
+        results = run_tests(selected_tests, test_dir, max_workers, on_result=_test_reporter(progress),
+                            fail_fast=fail_fast)
         end = time.time()
 
         return {
             "tests": selected_tests,
             "time": end - start,
             "cache_hit": False,
-            "mode": "baseline"
+            "mode": "baseline",
+            "results": results,
+            "summary": summarize_results(results)
         }
 
     # ---------- HYBRIDCI MODE ----------
-    changed_files = get_changed_files()
+    if change_set is None:
+        change_set = get_change_set()
+    detected = change_set is not None
 
-    # 🔥 SAFETY NET
-    if not changed_files:
-        changed_files = []
-        for files in test_map.values():
-            changed_files.extend(files)
+    # 🔥 SAFETY NET: without git history every mapped source counts as changed.
+    # An empty change set is trusted: nothing changed since the last green run.
+    if not detected:
+        change_set = ChangeSet.fromkeys(f for files in test_map.values() for f in files)
 
     # Language-aware caching
     if language_aware:
-        return _run_pipeline_language_aware(changed_files, test_map, dependency_graph, start)
+        result = _run_pipeline_language_aware(change_set, test_map, dependency_graph, start,
+                                              test_dir, max_workers, impact_depth, progress,
+                                              test_stats, fail_fast)
     else:
-        return _run_pipeline_standard(changed_files, test_map, dependency_graph, start)
+        result = _run_pipeline_standard(change_set, test_map, dependency_graph, start,
+                                        test_dir, max_workers, impact_depth, progress,
+                                        test_stats, fail_fast)
+
+    if fail_fast:
+        result["first_failure"] = _first_failure(result.get("results") or {})
+
+    if detected and (result.get("summary") or {}).get("success"):
+        record_green_state(change_set.repo)
+    return result
+
+def _report(progress, event, **data):
+    if progress is not None:
+        data["event"] = event
+        progress(data)
+
+def _test_reporter(progress):
+    """on_result callback for run_tests that reports each finished test."""
+    if progress is None:
+        return None
+    def on_result(record):
+        _report(progress, "test", test=record["test"], status=record["status"],
+                duration=record["duration"], cached=record.get("cached", False))
+    return on_result
 
-def _run_pipeline_standard(changed_files, test_map, dependency_graph, start):
+def _first_failure(results):
+    """The test whose failure stopped a fail-fast run, if any."""
+    return next((test for test, record in results.items() if record.get("stopped_run")), None)
+
+def execute_tests(tests, test_map, dependency_graph, test_dir=None, max_workers=None, progress=None,
+                  fail_fast=False, control=None, command=None):
+    """Run tests, reusing per-test cached results whose inputs are unchanged.
+
+    Returns (results, cached_tests). Only passing results are cached.
+    Tests that do run start in the given order; control and command
+    are passed on to run_tests.
+    """
+    digests = compute_test_digests(tests, test_map, dependency_graph, test_dir, command)
+    cached = load_test_results(digests)
+    on_result = _test_reporter(progress)
+    for record in cached.values():
+        record["cached"] = True
+        if on_result:
+            on_result(record)
+
+    pending = [t for t in tests if t not in cached]
+    executed = run_tests(pending, test_dir, max_workers, on_result=on_result, fail_fast=fail_fast,
+                         command=command, control=control)
+    save_test_results({
+        test: (digests.get(test), record)
+        for test, record in executed.items() if record["status"] == "passed"
+    })
+
+    results = dict(cached)
+    results.update(executed)
+    return results, sorted(cached)
+
+def _run_once(mode, cache_key, run, progress=None, fail_fast=False):
+    """Share one run between concurrent callers for the same change set.
+
+    Callers in this process wait for the first one's result; other
+    processes wait on a lock file and then find the result in the cache,
+    which run checks before doing any work. Fail-fast runs only share
+    with each other, since a stopped run reports tests as "skipped".
+    Test order and worker counts do not change a finished run's
+    results, so they do not separate runs.
+    """
+    key = f"{mode}:{cache_key}:fail_fast" if fail_fast else f"{mode}:{cache_key}"
+    result, shared = single_flight(key, run, lock_dir=get_lock_dir())
+    if shared:
+        _report(progress, "selected", tests=result["tests"], coalesced=True)
+        result = dict(result, coalesced=True)
+    return result
+
+def _run_pipeline_standard(change_set, test_map, dependency_graph, start,
+                           test_dir=None, max_workers=None, impact_depth=None, progress=None,
+                           test_stats=None, fail_fast=False):
     """Standard caching mode (non-language-aware)."""
-    cache_key = generate_cache_key(changed_files)
+    cache_key = generate_cache_key(change_set, test_map)
+    run = lambda: _run_standard(
+        cache_key, change_set.files, test_map, dependency_graph, start,
+        test_dir, max_workers, impact_depth, progress, test_stats, fail_fast
+    )
+    return _run_once("hybrid", cache_key, run, progress, fail_fast) if cache_key else run()
 
-    cached = load_cache(cache_key)
+def _run_standard(cache_key, changed_files, test_map, dependency_graph, start,
+                  test_dir, max_workers, impact_depth, progress, test_stats, fail_fast):
+    cached = load_cache(cache_key) if cache_key else None
     if cached:
+        _report(progress, "selected", tests=cached["tests"], cached=True)
         return {
             "tests": cached["tests"],
             "time": cached["time"],
             "cache_hit": True,
-            "mode": "hybrid"
+            "mode": "hybrid",
+            "results": cached.get("results", {}),
+            "summary": cached.get("summary")
         }
 
-    selected_tests = select_tests(changed_files, dependency_graph, test_map)
+    selected_tests = select_tests(changed_files, dependency_graph, test_map, impact_depth)
+    selected_tests = prioritize_tests(selected_tests, changed_files, test_map, test_stats)
+    _report(progress, "selected", tests=selected_tests)
 
-    time.sleep(0.5 * len(selected_tests))
+    results, cached_tests = execute_tests(selected_tests, test_map, dependency_graph, test_dir,
+                                          max_workers, progress, fail_fast)
+    summary = summarize_results(results)
     end = time.time()
 
     result = {
         "tests": selected_tests,
         "time": end - start,
         "cache_hit": False,
-        "mode": "hybrid"
+        "mode": "hybrid",
+        "results": results,
+        "summary": summary,
+        "tests_cached": cached_tests
     }
 
-    save_cache(cache_key, result)
+    # Failed runs are never cached so the next run executes them again
+    if summary["success"] and cache_key:
+        save_cache(cache_key, result)
     return result
 
-def _run_pipeline_language_aware(changed_files, test_map, dependency_graph, start):
-    """Language-aware caching mode."""
-    base_cache_key = generate_cache_key(changed_files)
-    language_map, _ = get_changed_files_by_language()
+def _run_pipeline_language_aware(change_set, test_map, dependency_graph, start,
+                                 test_dir=None, max_workers=None, impact_depth=None, progress=None,
+                                 test_stats=None, fail_fast=False):
+    """Language-aware caching mode.
+
+    Languages with a cached result are reused; only the remaining
+    languages are selected and executed, through the per-test cache.
+    """
+    base_cache_key = generate_cache_key(change_set, test_map)
+    run = lambda: _run_language_aware(
+        base_cache_key, change_set.by_language(), test_map, dependency_graph, start,
+        test_dir, max_workers, impact_depth, progress, test_stats, fail_fast
+    )
+    return _run_once("language_aware", base_cache_key, run, progress, fail_fast) if base_cache_key else run()
+
+def _run_language_aware(base_cache_key, language_map, test_map, dependency_graph, start,
+                        test_dir, max_workers, impact_depth, progress, test_stats, fail_fast):
     
-    # Try to load all language-specific caches
+    # Load whichever language-specific caches exist
     cached_results = {}
-    all_cached = True
     
     for language in language_map.keys():
-        lang_cache = load_language_aware_cache(base_cache_key, language)
+        lang_cache = load_language_aware_cache(base_cache_key, language) if base_cache_key else None
         if lang_cache:
             cached_results[language] = lang_cache
-        else:
-            all_cached = False
     
-    # If all language caches exist, merge and return
-    if all_cached and cached_results:
-        merged_tests = set()
-        for lang_result in cached_results.values():
-            merged_tests.update(lang_result["tests"])
-        
-        end = time.time()
-        return {
-            "tests": list(merged_tests),
-            "time": end - start,
-            "cache_hit": True,
-            "mode": "language_aware",
-            "languages_cached": list(cached_results.keys())
-        }
-    
-    # Compute tests per language
+    # Compute tests per language, reusing cached languages
     selected_tests_by_language = {}
+    results_by_language = {}
+    time_by_language = {}
     all_selected_tests = set()
+    all_results = {}
+    all_cached_tests = set()
+    lanes = {}
     
     for language in language_map.keys():
+        if language in cached_results:
+            lang_cache = cached_results[language]
+            selected_tests_by_language[language] = lang_cache["tests"]
+            all_selected_tests.update(lang_cache["tests"])
+            all_results.update(lang_cache.get("results", {}))
+            all_cached_tests.update(lang_cache["tests"])
+            _report(progress, "selected", tests=lang_cache["tests"], language=language, cached=True)
+            continue
+
         lang_files = language_map[language]
-        lang_tests = select_tests(lang_files, dependency_graph, test_map)
+        lang_tests = select_tests(lang_files, dependency_graph, test_map, impact_depth)
+        lang_tests = prioritize_tests(lang_tests, lang_files, test_map, test_stats)
         selected_tests_by_language[language] = lang_tests
+        _report(progress, "selected", tests=lang_tests, language=language)
+
+        # A test selected for several languages runs once, in the first lane
+        lanes[language] = [t for t in lang_tests if t not in all_selected_tests]
         all_selected_tests.update(lang_tests)
-        
-        time.sleep(0.5 * len(lang_tests))
+
+    # Lanes run side by side, each with its own worker budget and runner;
+    # a shared control lets fail-fast stop all of them
+    control = RunControl()
+
+    def run_lane(language):
+        lane_start = time.time()
+        lane_results, lane_cached = execute_tests(
+            lanes[language], test_map, dependency_graph, test_dir,
+            get_lane_worker_count(language, max_workers), progress, fail_fast, control,
+            command=lambda test_path: get_test_command(test_path, language)
+        )
+        return language, lane_results, lane_cached, time.time() - lane_start
+
+    if lanes:
+        with ThreadPoolExecutor(max_workers=len(lanes)) as pool:
+            for language, lane_results, lane_cached, lane_time in pool.map(run_lane, lanes):
+                time_by_language[language] = lane_time
+                all_results.update(lane_results)
+                all_cached_tests.update(lane_cached)
+    for language in lanes:
+        results_by_language[language] = {t: all_results[t] for t in selected_tests_by_language[language]}
     
     end = time.time()
     
-    # Save per-language caches
-    for language, lang_tests in selected_tests_by_language.items():
+    # Save per-language caches for newly run languages, skipping failures
+    for language, lang_results in results_by_language.items():
+        if not base_cache_key or not summarize_results(lang_results)["success"]:
+            continue
         lang_result = {
-            "tests": lang_tests,
-            "time": (end - start) / len(selected_tests_by_language),
-            "language": language
+            "tests": selected_tests_by_language[language],
+            "time": time_by_language[language],
+            "language": language,
+            "results": lang_results
         }
         save_language_aware_cache(base_cache_key, lang_result, language)
     
     # Save language map
-    save_language_map(base_cache_key, language_map)
+    if results_by_language and base_cache_key:
+        save_language_map(base_cache_key, language_map)
     
-    return {
+    result = {
         "tests": list(all_selected_tests),
         "time": end - start,
-        "cache_hit": False,
+        "cache_hit": bool(cached_results) and not results_by_language,
         "mode": "language_aware",
         "languages": list(language_map.keys()),
-        "language_breakdown": {lang: len(tests) for lang, tests in selected_tests_by_language.items()}
+        "language_breakdown": {lang: len(tests) for lang, tests in selected_tests_by_language.items()},
+        "results": all_results,
+        "summary": summarize_results(all_results),
+        "tests_cached": sorted(all_cached_tests)
     }
+    if cached_results:
+        result["languages_cached"] = list(cached_results.keys())
+    return result
+
+def generate_cache_key(files, test_map=None, lockfiles=DEPENDENCY_LOCKFILES, root=None):
+    """Content-addressed cache key for a change set.
+
+    Merkle-style: each changed file contributes a leaf hash of its path
+    and content digest; the root combines the leaves with digests of the
+    test map and any dependency lockfiles present.
+
+    Paths and lockfiles are resolved against root, by default the
+    ChangeSet's own root or the current directory. Returns None, meaning
+    the run must not use the whole-run cache, when a file the change set
+    reports with a blob id cannot be read.
+    """
+    if root is None:
+        root = getattr(files, "root", ".")
+    blobs = files if isinstance(files, dict) else {}
+    normalized = sorted(set(f.replace("\\", "/") for f in files))
+    leaves = hashlib.sha256()
+    for f in normalized:
+        try:
+            digest = file_digest(os.path.join(root, f))
+        except OSError:
+            return None
+        if digest == "missing" and blobs.get(f) is not None:
+            return None
+        leaves.update(hashlib.sha256(f"{f}\0{digest}".encode()).digest())
 
-def generate_cache_key(files):
-    normalized = sorted([f.replace("\\", "/") for f in files])
-    joined = "|".join(normalized)
-    return hashlib.md5(joined.encode()).hexdigest()
+    key = hashlib.sha256(CACHE_KEY_VERSION.encode())
+    key.update(leaves.digest())
+    key.update(hash_test_map(test_map).encode() if test_map is not None else b"")
+    key.update(hash_lockfiles(lockfiles, root).encode())
+    return key.hexdigest()
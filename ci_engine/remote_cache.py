@@ -0,0 +1,134 @@
+"""
+Shared cache backends for reusing results across CI runners.
+An HTTP client for a content-addressed cache server, and a tiered
+backend that reads through a local store and uploads in the background.
+"""
+
+import http.client
+import json
+import queue
+import threading
+import urllib.error
+import urllib.request
+from ci_engine.cache_store import CacheBackend
+
+# Seconds to wait for the remote cache before treating a request as a miss
+REMOTE_TIMEOUT = 5
+
+# Keys per batched request
+REMOTE_BATCH_SIZE = 500
+
+class HttpCacheBackend(CacheBackend):
+    """Client for the cache server protocol (see ci_engine/cache_server.py).
+
+    Network errors count as misses and dropped writes so a slow or
+    unreachable server never fails a pipeline.
+    """
+
+    def __init__(self, base_url, timeout=REMOTE_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.errors = 0
+
+    def _post(self, path, payload):
+        request = urllib.request.Request(
+            f"{self.base_url}{path}",
+            data=json.dumps(payload, separators=(",", ":")).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        # HTTPException covers dropped connections and garbled replies,
+        # which are not OSErrors
+        except (urllib.error.URLError, http.client.HTTPException, OSError, ValueError):
+            self.errors += 1
+            return None
+
+    def get_many(self, namespace, keys):
+        return {key: value for key, (value, _) in self.get_many_tagged(namespace, keys).items()}
+
+    def get_many_tagged(self, namespace, keys):
+        keys = list(keys)
+        found = {}
+        for i in range(0, len(keys), REMOTE_BATCH_SIZE):
+            reply = self._post("/v1/get", {"namespace": namespace, "keys": keys[i:i + REMOTE_BATCH_SIZE]})
+            if reply:
+                tags = reply.get("tags") or {}
+                found.update((key, (value, tags.get(key, ""))) for key, value in reply.get("found", {}).items())
+        return found
+
+    def put_many(self, namespace, items, tag=""):
+        items = list(items.items())
+        for i in range(0, len(items), REMOTE_BATCH_SIZE):
+            self._post("/v1/put", {"namespace": namespace, "tag": tag, "items": dict(items[i:i + REMOTE_BATCH_SIZE])})
+
+class TieredCacheBackend(CacheBackend):
+    """Local store in front of a shared remote backend.
+
+    Reads hit the local store first and fetch only the missing keys from
+    the remote in one batch, copying remote hits into the local store
+    with their tags.
+    Writes go to the local store immediately and are uploaded by a
+    background thread.
+    """
+
+    def __init__(self, local, remote, async_uploads=True):
+        self.local = local
+        self.remote = remote
+        self.async_uploads = async_uploads
+        self.remote_hits = 0
+        self._uploads = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def get_many(self, namespace, keys):
+        keys = list(keys)
+        found = self.local.get_many(namespace, keys)
+        missing = [k for k in keys if k not in found]
+        if missing:
+            fetched = self.remote.get_many_tagged(namespace, missing)
+            if fetched:
+                self.remote_hits += len(fetched)
+                by_tag = {}
+                for key, (value, tag) in fetched.items():
+                    by_tag.setdefault(tag, {})[key] = value
+                    found[key] = value
+                # Per-tag stats and eviction count these like local writes
+                for tag, items in by_tag.items():
+                    self.local.put_many(namespace, items, tag)
+        return found
+
+    def put_many(self, namespace, items, tag=""):
+        if not items:
+            return
+        self.local.put_many(namespace, items, tag)
+        if self.async_uploads:
+            self._ensure_worker()
+            self._uploads.put((namespace, dict(items), tag))
+        else:
+            self.remote.put_many(namespace, items, tag)
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._upload_loop, name="cache-upload", daemon=True)
+                self._worker.start()
+
+    def _upload_loop(self):
+        while True:
+            namespace, items, tag = self._uploads.get()
+            try:
+                self.remote.put_many(namespace, items, tag)
+            finally:
+                self._uploads.task_done()
+
+    def flush(self, timeout=None):
+        """Block until queued uploads finish, or until timeout seconds pass."""
+        if timeout is None:
+            self._uploads.join()
+            return True
+        done = threading.Event()
+        threading.Thread(target=lambda: (self._uploads.join(), done.set()), daemon=True).start()
+        return done.wait(timeout)
@@ -0,0 +1,224 @@
+"""
+Ignore-aware repository scanner.
+Walks a tree with os.scandir in one pass, skipping VCS metadata and
+anything matched by .gitignore files (and .git/info/exclude), and yields
+file paths as directories are read. Directory subtrees can be scanned
+on a thread pool. The mtimes of every scanned directory and ignore file
+can be recorded so callers can tell cheaply whether a cached result
+for the tree is still valid.
+"""
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Directories never descended into
+ALWAYS_SKIP = {".git", ".hg", ".svn"}
+
+# Per-directory ignore file, and the repository-wide one under .git
+IGNORE_FILE_NAME = ".gitignore"
+INFO_EXCLUDE = os.path.join(".git", "info", "exclude")
+
+# Threads used by get_language_stats-style callers; 1 scans serially
+SCAN_WORKERS = int(os.environ.get("CI_SCAN_WORKERS", 4))
+
+class IgnorePattern:
+    """One .gitignore line compiled to a regex over "/"-separated paths."""
+
+    __slots__ = ("regex", "negated", "dir_only")
+
+    def __init__(self, regex, negated, dir_only):
+        self.regex = regex
+        self.negated = negated
+        self.dir_only = dir_only
+
+def _glob_to_regex(glob):
+    """Regex source for a gitignore glob: * and ? stop at "/", ** crosses it."""
+    out = []
+    i, n = 0, len(glob)
+    while i < n:
+        c = glob[i]
+        if glob.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif glob.startswith("**", i) and i + 2 == n:
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            # A "]" right after the opening (or its negation) is literal
+            start = i + 2 if glob[i + 1:i + 2] in ("!", "^") else i + 1
+            end = glob.find("]", start + 1)
+            if end == -1:
+                out.append(re.escape(c))
+                i += 1
+                continue
+            body = glob[i + 1:end]
+            if body[:1] in ("!", "^"):
+                body = "^" + body[1:]
+            out.append("[" + body.replace("\\", "\\\\") + "]")
+            i = end + 1
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(glob[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+def parse_ignore_lines(lines):
+    """Compile the lines of an ignore file into IgnorePatterns."""
+    patterns = []
+    for line in lines:
+        line = line.rstrip("\n").rstrip("\r")
+        if not line.endswith("\\ "):
+            line = line.rstrip(" ")
+        if not line or line.startswith("#"):
+            continue
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        elif line.startswith(("\\!", "\\#")):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        # A slash anywhere but the end anchors the pattern to its directory
+        anchored = "/" in line
+        source = _glob_to_regex(line.lstrip("/"))
+        if not anchored:
+            source = "(?:.*/)?" + source
+        patterns.append(IgnorePattern(re.compile(source, re.DOTALL), negated, dir_only))
+    return patterns
+
+def _read_ignore_file(path, mtimes):
+    try:
+        with open(path, encoding="utf-8", errors="surrogateescape") as f:
+            patterns = parse_ignore_lines(f)
+            if mtimes is not None:
+                mtimes[path] = os.fstat(f.fileno()).st_mtime_ns
+            return patterns
+    except OSError:
+        return []
+
+def is_ignored(rules, rel_path, is_dir):
+    """Whether rel_path is ignored by rules, a sequence of (base, patterns).
+
+    Later rules and later patterns take precedence, as in git.
+    """
+    ignored = False
+    for base, patterns in rules:
+        if base:
+            if not rel_path.startswith(base + "/"):
+                continue
+            path = rel_path[len(base) + 1:]
+        else:
+            path = rel_path
+        for pattern in patterns:
+            if pattern.dir_only and not is_dir:
+                continue
+            if pattern.regex.fullmatch(path):
+                ignored = not pattern.negated
+    return ignored
+
+def _scan_dir(root, rel, rules, use_ignore, mtimes):
+    """Read one directory: (files, [(subdir, rules)]), paths relative to root."""
+    path = os.path.join(root, rel) if rel else root
+    if mtimes is not None:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            return [], []
+    if use_ignore:
+        patterns = _read_ignore_file(os.path.join(path, IGNORE_FILE_NAME), mtimes)
+        if patterns:
+            rules = rules + ((rel, patterns),)
+
+    files, dirs = [], []
+    try:
+        entries = os.scandir(path)
+    except OSError:
+        return files, dirs
+    with entries:
+        for entry in entries:
+            name = entry.name
+            # Top-level dot entries are tool state (.venv, .ci_cache, ...)
+            if name in ALWAYS_SKIP or (not rel and name.startswith(".")):
+                continue
+            child = f"{rel}/{name}" if rel else name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if not is_dir and not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            if rules and is_ignored(rules, child, is_dir):
+                continue
+            if is_dir:
+                dirs.append((child, rules))
+            else:
+                files.append(child)
+    return files, dirs
+
+def _root_rules(root, use_ignore, mtimes):
+    if not use_ignore:
+        return ()
+    patterns = _read_ignore_file(os.path.join(root, INFO_EXCLUDE), mtimes)
+    return (("", patterns),) if patterns else ()
+
+def scan_files(root=".", use_ignore=True, workers=1, mtimes=None):
+    """Yield the files under root as "/"-separated paths relative to root.
+
+    Directories are read one at a time and their files yielded as soon
+    as they are listed; with workers > 1 directories are read on a
+    thread pool and files arrive in completion order. When mtimes is a
+    dict it is filled with {path: mtime_ns} for every directory and
+    ignore file read (see tree_unchanged).
+    """
+    rules = _root_rules(root, use_ignore, mtimes)
+    if workers <= 1:
+        stack = [("", rules)]
+        while stack:
+            files, dirs = _scan_dir(root, *stack.pop(), use_ignore, mtimes)
+            yield from files
+            stack.extend(reversed(dirs))
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(_scan_dir, root, "", rules, use_ignore, mtimes)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, dirs = future.result()
+                for rel, dir_rules in dirs:
+                    pending.add(pool.submit(_scan_dir, root, rel, dir_rules, use_ignore, mtimes))
+                yield from files
+
+def scan_dirs(root=".", use_ignore=True):
+    """Yield the directories scan_files enters, relative to root ("" for root)."""
+    stack = [("", _root_rules(root, use_ignore, None))]
+    while stack:
+        rel, rules = stack.pop()
+        yield rel
+        _, dirs = _scan_dir(root, rel, rules, use_ignore, None)
+        stack.extend(reversed(dirs))
+
+def tree_unchanged(mtimes):
+    """Whether every path recorded by scan_files still has its mtime.
+
+    Adding, removing or renaming a file changes its directory's mtime,
+    so an unchanged record means the scan would list the same files.
+    """
+    for path, mtime in mtimes.items():
+        try:
+            if os.stat(path).st_mtime_ns != mtime:
+                return False
+        except OSError:
+            return False
+    return True
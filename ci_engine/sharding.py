@@ -0,0 +1,198 @@
+"""
+Duration-aware test sharding.
+Splits selected tests across N nodes using each test's recent measured
+duration, writes one manifest per node, and merges the nodes' results
+back into a single run record.
+
+Usage:
+    python -m ci_engine.sharding plan --shards 4 --out shards < selected_tests.txt
+    python -m ci_engine.sharding run --manifest shards/shard-0.json --out result-0.json
+    python -m ci_engine.sharding merge result-*.json --store
+"""
+
+import argparse
+import hashlib
+import heapq
+import json
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ci_engine.executor import summarize_results, estimate_durations
+from ci_engine.pipeline_runner import execute_tests
+
+# Manifests with another version are rejected
+MANIFEST_VERSION = 1
+
+MANIFEST_NAME = "shard-{index}.json"
+
+def plan_shards(tests, shard_count, durations=None):
+    """Split tests into shard_count lists with balanced estimated time.
+
+    Longest processing time first: tests are taken in descending
+    duration and each goes to the currently lightest shard. Ties are
+    broken by name and shard index, so every node computes the same
+    plan from the same inputs. Each shard lists its longest test first.
+    """
+    if shard_count < 1:
+        raise ValueError("shard_count must be at least 1")
+    estimates = estimate_durations(sorted(set(tests)), durations)
+    shards = [[] for _ in range(shard_count)]
+    loads = [(0.0, i) for i in range(shard_count)]
+    for test in sorted(estimates, key=lambda t: (-estimates[t], t)):
+        load, index = heapq.heappop(loads)
+        shards[index].append(test)
+        heapq.heappush(loads, (load + estimates[test], index))
+    return {"shards": shards, "durations": estimates}
+
+def plan_digest(plan):
+    """Identifies a plan; shard results merge only when their digests agree."""
+    data = json.dumps(plan["shards"], separators=(",", ":"))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+def build_manifest(plan, index):
+    tests = plan["shards"][index]
+    return {
+        "version": MANIFEST_VERSION,
+        "index": index,
+        "shard_count": len(plan["shards"]),
+        "plan_digest": plan_digest(plan),
+        "tests": tests,
+        "estimated_duration": sum(plan["durations"][t] for t in tests)
+    }
+
+def write_manifests(plan, directory):
+    """Write one manifest per shard; returns their paths in index order."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(len(plan["shards"])):
+        path = os.path.join(directory, MANIFEST_NAME.format(index=index))
+        with open(path, "w") as f:
+            json.dump(build_manifest(plan, index), f, indent=2)
+        paths.append(path)
+    return paths
+
+def load_manifest(path):
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"unsupported shard manifest version in {path}")
+    return manifest
+
+def run_shard(manifest, test_map, dependency_graph, test_dir=None, max_workers=None, progress=None):
+    """Run one node's tests; returns a shard result for merge_shard_results.
+
+    Tests are submitted longest first, so the node's own workers are
+    balanced the same way the shards are.
+    """
+    start = time.time()
+    if test_dir is None:
+        test_dir = getattr(test_map, "test_dir", None)
+    results, cached_tests = execute_tests(manifest["tests"], test_map, dependency_graph, test_dir,
+                                          max_workers, progress)
+    return {
+        "index": manifest["index"],
+        "shard_count": manifest["shard_count"],
+        "plan_digest": manifest["plan_digest"],
+        "tests": manifest["tests"],
+        "time": time.time() - start,
+        "results": results,
+        "tests_cached": cached_tests
+    }
+
+def merge_shard_results(shard_results):
+    """Combine every node's shard result into one run record.
+
+    Raises ValueError unless the results come from the same plan and
+    cover each shard exactly once. The run's time is that of its
+    slowest shard, since the nodes ran side by side.
+    """
+    shard_results = sorted(shard_results, key=lambda r: r["index"])
+    if not shard_results:
+        raise ValueError("no shard results to merge")
+    digests = {r["plan_digest"] for r in shard_results}
+    if len(digests) != 1:
+        raise ValueError("shard results come from different plans")
+    shard_count = shard_results[0]["shard_count"]
+    indexes = [r["index"] for r in shard_results]
+    if indexes != list(range(shard_count)):
+        raise ValueError(f"expected shards 0..{shard_count - 1}, got {indexes}")
+
+    tests, results, cached_tests = [], {}, []
+    for shard in shard_results:
+        tests.extend(shard["tests"])
+        results.update(shard["results"])
+        cached_tests.extend(shard.get("tests_cached", ()))
+    return {
+        "tests": sorted(tests),
+        "time": max(r["time"] for r in shard_results),
+        "cache_hit": False,
+        "mode": "sharded",
+        "results": results,
+        "summary": summarize_results(results),
+        "tests_cached": sorted(cached_tests),
+        "shard_times": [r["time"] for r in shard_results]
+    }
+
+def _read_tests(args):
+    if args.tests:
+        return args.tests
+    return [line.strip() for line in sys.stdin if line.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="HybridCI duration-aware test sharding")
+    commands = parser.add_subparsers(dest="command", required=True)
+    plan = commands.add_parser("plan", help="write one manifest per shard")
+    plan.add_argument("tests", nargs="*", help="tests to shard (default: one per line on stdin)")
+    plan.add_argument("--shards", type=int, required=True)
+    plan.add_argument("--out", default="shards")
+    plan.add_argument("--no-history", action="store_true", help="ignore recorded durations")
+    run = commands.add_parser("run", help="run the tests in one manifest")
+    run.add_argument("--manifest", required=True)
+    run.add_argument("--out", required=True)
+    run.add_argument("--test-dir", default="sample_repo/tests")
+    run.add_argument("--src-dir", default="sample_repo/src")
+    run.add_argument("--workers", type=int, default=None)
+    merge = commands.add_parser("merge", help="merge shard results into one run")
+    merge.add_argument("results", nargs="+")
+    merge.add_argument("--store", action="store_true", help="record the run in the dashboard database")
+    args = parser.parse_args()
+
+    if args.command == "plan":
+        tests = _read_tests(args)
+        durations = None
+        if not args.no_history:
+            from dashboard.models import init_db, get_test_durations
+            init_db()
+            durations = get_test_durations(tests)
+        for path in write_manifests(plan_shards(tests, args.shards, durations), args.out):
+            print(path)
+    elif args.command == "run":
+        from ci_engine.coverage_mapper import load_test_map
+        from ci_engine.dependency_graph import build_dependency_graph
+
+        test_map = load_test_map(args.test_dir, args.src_dir)
+        result = run_shard(load_manifest(args.manifest), test_map, build_dependency_graph(args.src_dir),
+                           args.test_dir, args.workers)
+        with open(args.out, "w") as f:
+            json.dump(result, f)
+        sys.exit(0 if summarize_results(result["results"])["success"] else 1)
+    else:
+        shard_results = []
+        for path in args.results:
+            with open(path) as f:
+                shard_results.append(json.load(f))
+        result = merge_shard_results(shard_results)
+        if args.store:
+            from dashboard.models import init_db, store_run_result
+            init_db()
+            store_run_result(len(result["tests"]), result["time"], 0, mode=result["mode"],
+                             test_results=result["results"])
+        print(json.dumps({k: result[k] for k in ("tests", "time", "summary", "shard_times")}, indent=2))
+        sys.exit(0 if result["summary"]["success"] else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Single-flight coalescing of identical pipeline runs.
+Concurrent callers with the same key share one execution: threads in a
+process wait on the first caller, and processes serialize on a lock
+file so the later ones find the first one's result in the cache.
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# Seconds to wait for another process's run before running anyway
+LOCK_TIMEOUT = 3600
+
+# Bounds of the backoff while polling a lock held by another process
+LOCK_POLL_MIN = 0.01
+LOCK_POLL_MAX = 0.5
+
+class _Call:
+    """A run in progress in this process and the callers waiting on it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+_calls = {}
+_calls_lock = threading.Lock()
+
+def _lock_path(lock_dir, key):
+    # Keys may contain characters that are not valid in file names
+    return os.path.join(lock_dir, hashlib.sha256(key.encode()).hexdigest()[:32] + ".lock")
+
+def _try_lock(fd):
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        elif msvcrt is not None:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+def _unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    elif msvcrt is not None:
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+class FileLock:
+    """Exclusive lock on a file shared by every process on the host.
+
+    Uses flock, or msvcrt.locking on Windows. The lock file is removed
+    on release; acquirers check that the file they locked is still the
+    one at the path so a removed file is never mistaken for the lock.
+    """
+
+    def __init__(self, path, timeout=LOCK_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.fd = None
+
+    def acquire(self):
+        """Take the lock, polling with backoff; returns False on timeout."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        deadline = time.monotonic() + self.timeout
+        delay = LOCK_POLL_MIN
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if _try_lock(fd):
+                try:
+                    current = os.stat(self.path).st_ino
+                except FileNotFoundError:
+                    current = None
+                if msvcrt is not None or current == os.fstat(fd).st_ino:
+                    self.fd = fd
+                    return True
+                _unlock(fd)
+            os.close(fd)
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, LOCK_POLL_MAX)
+
+    def release(self):
+        if self.fd is None:
+            return
+        if msvcrt is None:
+            # Windows cannot remove a file that is still open
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+        _unlock(self.fd)
+        os.close(self.fd)
+        self.fd = None
+
+    def __enter__(self):
+        self.acquired = self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+def single_flight(key, func, lock_dir=None, timeout=LOCK_TIMEOUT):
+    """Run func() once for all concurrent callers with the same key.
+
+    Returns (value, shared): shared is True when this caller waited for
+    another thread's run and received its value (or its exception).
+    With lock_dir, runs for the same key are also serialized across
+    processes, so func should check the cache first: a process that
+    waited on the lock then finds the earlier run's result there. If
+    the lock cannot be taken within timeout, func runs anyway.
+    """
+    with _calls_lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.value, True
+
+    try:
+        if lock_dir is None:
+            call.value = func()
+        else:
+            with FileLock(_lock_path(lock_dir, key), timeout):
+                call.value = func()
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        with _calls_lock:
+            del _calls[key]
+        call.done.set()
+    return call.value, False
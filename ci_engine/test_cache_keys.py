@@ -0,0 +1,90 @@
+"""
+Unit tests for content-addressed cache keys.
+"""
+
+import os
+import sys
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ci_engine.cache_manager as cm
+from ci_engine.cache_manager import file_digest
+from ci_engine.change_detector import ChangeSet
+from ci_engine.pipeline_runner import generate_cache_key
+from ci_engine.test_mapper import IndexedTestMap, hash_test_map
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "auth.py").write_text("def login(): return True\n")
+    return tmp_path
+
+class TestCacheKeys:
+    """Test that keys track file contents, test map and lockfiles."""
+
+    def test_same_contents_same_key(self, workdir):
+        assert generate_cache_key(["src/auth.py"]) == generate_cache_key(["src\\auth.py"])
+
+    def test_content_change_changes_key(self, workdir):
+        before = generate_cache_key(["src/auth.py"])
+        (workdir / "src" / "auth.py").write_text("def login(): return False\n")
+        assert generate_cache_key(["src/auth.py"]) != before
+
+    def test_deleted_file_changes_key(self, workdir):
+        before = generate_cache_key(["src/auth.py"])
+        os.remove(workdir / "src" / "auth.py")
+        assert generate_cache_key(["src/auth.py"]) != before
+
+    def test_test_map_changes_key(self, workdir):
+        test_map = IndexedTestMap({"test_auth.py": ["auth.py"]})
+        before = generate_cache_key(["src/auth.py"], test_map)
+        test_map["test_login.py"] = ["auth.py"]
+        assert generate_cache_key(["src/auth.py"], test_map) != before
+
+    def test_lockfile_changes_key(self, workdir):
+        (workdir / "requirements.txt").write_text("flask==3.0\n")
+        before = generate_cache_key(["src/auth.py"])
+        (workdir / "requirements.txt").write_text("flask==3.1\n")
+        assert generate_cache_key(["src/auth.py"]) != before
+
+    def test_change_set_paths_resolve_against_its_root(self, workdir, monkeypatch):
+        changes = ChangeSet({"src/auth.py": file_digest("src/auth.py")}, root=str(workdir))
+        monkeypatch.chdir(workdir / "src")
+        before = generate_cache_key(changes)
+        assert before == generate_cache_key(["src/auth.py"], root=str(workdir))
+
+        (workdir / "src" / "auth.py").write_text("def login(): return False\n")
+        assert generate_cache_key(changes) != before
+
+    def test_unreadable_reported_file_skips_cache(self, workdir):
+        changes = ChangeSet({"src/auth.py": file_digest("src/auth.py")}, root=str(workdir))
+        os.remove(workdir / "src" / "auth.py")
+        assert generate_cache_key(changes) is None
+        # A deletion the diff reports still has a key
+        assert generate_cache_key(ChangeSet({"src/auth.py": None}, root=str(workdir))) is not None
+
+class TestFileDigest:
+    """Test memoized file digests."""
+
+    def test_digest_memoized_by_stat(self, workdir, monkeypatch):
+        path = str(workdir / "src" / "auth.py")
+        first = file_digest(path)
+
+        opened = []
+        monkeypatch.setattr(cm, "open", lambda *a, **k: opened.append(a) or open(*a, **k), raising=False)
+        assert file_digest(path) == first
+        assert opened == []
+
+    def test_missing_file(self, workdir):
+        assert file_digest("src/nope.py") == "missing"
+
+    def test_test_map_digest_is_order_independent(self):
+        a = hash_test_map({"t1": ["a.py", "b.py"], "t2": ["c.py"]})
+        b = hash_test_map({"t2": ["c.py"], "t1": ["b.py", "a.py"]})
+        assert a == b
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
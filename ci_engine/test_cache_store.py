@@ -0,0 +1,137 @@
+"""
+Unit tests for the SQLite-backed cache store.
+"""
+
+import os
+import sys
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ci_engine.cache_manager as cm
+from ci_engine.cache_store import CacheStore
+
+@pytest.fixture
+def store(tmp_path):
+    store = CacheStore(str(tmp_path / "cache.db"))
+    yield store
+    store.close()
+
+class TestCacheStore:
+    """Test batch operations and write-maintained counters."""
+
+    def test_put_and_get(self, store):
+        store.put("standard", "k1", {"tests": ["test_a.py"], "time": 1.5})
+        assert store.get("standard", "k1") == {"tests": ["test_a.py"], "time": 1.5}
+        assert store.get("standard", "missing") is None
+        assert store.get("other", "k1") is None
+
+    def test_batch_get_and_put(self, store):
+        store.put_many("tests", {f"k{i}": {"i": i} for i in range(1200)})
+        found = store.get_many("tests", [f"k{i}" for i in range(0, 1300, 2)])
+        assert len(found) == 600
+        assert found["k10"] == {"i": 10}
+
+    def test_counters_track_replace_and_delete(self, store):
+        store.put("language_aware", "a:python", {"x": 1}, tag="python")
+        store.put("language_aware", "b:python", {"x": 2}, tag="python")
+        store.put("language_aware", "a:python", {"x": "longer"}, tag="python")
+        store.put("language_aware", "a:go", {"x": 1}, tag="go")
+
+        counters = store.counters()["language_aware"]
+        assert counters[""]["entries"] == 3
+        assert counters["python"]["entries"] == 2
+        assert counters["go"]["entries"] == 1
+
+        store.delete("language_aware", "a:go")
+        counters = store.counters()["language_aware"]
+        assert counters[""]["entries"] == 2
+        assert counters["go"]["entries"] == 0
+
+    def test_counter_bytes_match_entries(self, store):
+        store.put_many("standard", {"a": [1, 2, 3], "b": "x" * 100})
+        store.put("standard", "a", [1])
+        total = store._connect().execute("SELECT SUM(size) FROM entries").fetchone()[0]
+        assert store.counters()["standard"][""]["bytes"] == total
+
+    def test_wal_mode(self, store):
+        mode = store._connect().execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode == "wal"
+
+class TestEviction:
+    """Test byte-budget and TTL eviction."""
+
+    def test_ttl_expires_old_entries(self, tmp_path):
+        store = CacheStore(str(tmp_path / "cache.db"), ttl_seconds=60)
+        store.put("standard", "old", {"x": 1})
+        store.put("standard", "new", {"x": 2})
+        store._connect().execute("UPDATE entries SET created = created - 120 WHERE key = 'old'")
+        store._connect().commit()
+
+        removed = store.evict()
+        assert removed["expired"] == 1
+        assert store.get("standard", "old") is None
+        assert store.get("standard", "new") == {"x": 2}
+        assert store.counters()["standard"][""]["entries"] == 1
+
+    def test_lru_evicts_least_recently_used(self, tmp_path):
+        store = CacheStore(str(tmp_path / "cache.db"))
+        payload = "x" * 1000
+        for i in range(5):
+            store.put("standard", f"k{i}", payload)
+            store._connect().execute("UPDATE entries SET accessed = ? WHERE key = ?", (i, f"k{i}"))
+            store._connect().commit()
+        store.get("standard", "k0")
+        store.flush_access()
+
+        store.max_bytes = 3500
+        store.evict()
+        remaining = set(store.get_many("standard", [f"k{i}" for i in range(5)]))
+        assert remaining == {"k0", "k3", "k4"}
+        assert store.total_bytes() <= 3500
+
+    def test_lfu_evicts_least_frequently_used(self, tmp_path):
+        store = CacheStore(str(tmp_path / "cache.db"), policy="lfu")
+        for i in range(4):
+            store.put("standard", f"k{i}", "x" * 1000)
+        for _ in range(3):
+            store.get_many("standard", ["k0", "k1"])
+        store.get("standard", "k2")
+
+        store.max_bytes = 2500
+        store.evict()
+        remaining = set(store.get_many("standard", [f"k{i}" for i in range(4)]))
+        assert remaining == {"k0", "k1"}
+
+    def test_eviction_runs_on_write(self, tmp_path):
+        store = CacheStore(str(tmp_path / "cache.db"), max_bytes=5000)
+        for i in range(20):
+            store.put("tests", f"k{i}", "x" * 1000)
+        assert store.total_bytes() <= 5000
+
+        stats = store.eviction_stats()
+        assert stats["evicted_entries"] >= 15
+        assert stats["evicted_bytes"] > 0
+        assert stats["last_eviction"] is not None
+
+    def test_unknown_policy_rejected(self, tmp_path):
+        with pytest.raises(ValueError):
+            CacheStore(str(tmp_path / "cache.db"), policy="fifo")
+
+def test_cache_stats_from_counters(tmp_path, monkeypatch):
+    monkeypatch.setattr(cm, "CACHE_DIR", str(tmp_path))
+    cm.save_cache("key1", {"tests": []})
+    cm.save_language_aware_cache("key1", {"tests": []}, "python")
+    cm.save_language_aware_cache("key1", {"tests": []}, "javascript")
+    cm.save_language_aware_cache("key2", {"tests": []}, "python")
+
+    stats = cm.get_cache_stats()
+    assert stats["total_caches"] == 1
+    assert stats["total_language_caches"] == 3
+    assert stats["languages"] == {"python": 2, "javascript": 1}
+    assert stats["eviction"]["policy"] == cm.CACHE_EVICTION_POLICY
+    assert stats["eviction"]["evicted_entries"] == 0
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,174 @@
+"""
+Unit tests for git-based change detection.
+"""
+
+import os
+import subprocess
+import sys
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ci_engine.cache_manager as cm
+import ci_engine.change_detector as cd
+
+def git(*args):
+    return subprocess.run(
+        ["git", "-c", "user.name=ci", "-c", "user.email=ci@example.com", *args],
+        capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+def commit(message):
+    git("add", "-A")
+    git("commit", "-q", "-m", message)
+    return git("rev-parse", "HEAD")
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cm, "CACHE_DIR", str(tmp_path / ".ci_cache"))
+    monkeypatch.setattr(cd, "BASE_REF", None)
+    git("init", "-q")
+    (tmp_path / ".gitignore").write_text(".ci_cache/\n")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "utils.py").write_text("def double(x):\n    return 2 * x\n")
+    (tmp_path / "src" / "calc.py").write_text("def add(a, b):\n    return a + b\n")
+    commit("initial")
+    return tmp_path
+
+class TestParseRawDiff:
+    """Test parsing of git diff --raw -z output."""
+
+    def test_parses_statuses_and_ids(self):
+        new = "c" * 40
+        output = (
+            f":100644 100644 {'a' * 40} {new} M\0src/a.py\0"
+            f":100644 000000 {'b' * 40} {cd.ZERO_OID} D\0gone.py\0"
+            f":000000 100644 {cd.ZERO_OID} {cd.ZERO_OID} A\0dirty file.py\0"
+        ).encode()
+        assert cd.parse_raw_diff(output) == {"src/a.py": new, "gone.py": None, "dirty file.py": None}
+
+    def test_empty_output(self):
+        assert cd.parse_raw_diff(b"") == {}
+
+class TestDetectChanges:
+    """Test change sets against base commits and the last green state."""
+
+    def test_diff_against_previous_commit(self, repo):
+        (repo / "src" / "calc.py").write_text("def add(a, b):\n    return b + a\n")
+        commit("change calc")
+
+        changes = cd.detect_changes()
+        assert list(changes) == ["src/calc.py"]
+        assert changes["src/calc.py"] == git("hash-object", "src/calc.py")
+
+    def test_blob_ids_are_file_digests(self, repo):
+        (repo / "src" / "utils.py").write_text("def double(x):\n    return x + x\n")
+        commit("change utils")
+        cm._DIGEST_MEMO.clear()
+
+        changes = cd.detect_changes()
+        path = os.path.abspath("src/utils.py")
+        assert cm._DIGEST_MEMO[path][1] == changes["src/utils.py"]
+        cm._DIGEST_MEMO.clear()
+        assert cm.file_digest("src/utils.py") == git("hash-object", "src/utils.py")
+
+    def test_configured_base(self, repo, monkeypatch):
+        first = git("rev-parse", "HEAD")
+        (repo / "src" / "calc.py").write_text("x = 1\n")
+        commit("two")
+        (repo / "src" / "utils.py").write_text("y = 2\n")
+        commit("three")
+
+        monkeypatch.setattr(cd, "BASE_REF", first)
+        assert sorted(cd.detect_changes()) == ["src/calc.py", "src/utils.py"]
+        assert list(cd.detect_changes(base="HEAD~1")) == ["src/utils.py"]
+
+    def test_uncommitted_changes_included(self, repo):
+        (repo / "src" / "utils.py").write_text("y = 3\n")
+        changes = cd.detect_changes(base="HEAD")
+        # Read in-process, dirty files get the id of their working-tree content
+        assert changes == {"src/utils.py": git("hash-object", "src/utils.py")}
+
+    def test_subprocess_backend(self, repo, monkeypatch):
+        monkeypatch.setattr(cd, "GIT_BACKEND", "subprocess")
+        (repo / "src" / "calc.py").write_text("x = 1\n")
+        commit("two")
+        (repo / "src" / "utils.py").write_text("y = 3\n")
+
+        changes = cd.get_change_set()
+        assert changes.repo is None
+        assert changes == {"src/calc.py": git("rev-parse", "HEAD:src/calc.py"), "src/utils.py": None}
+
+    def test_no_diff_without_record_is_full_run(self, repo):
+        # A single commit has no HEAD~1 and no green record
+        assert sorted(cd.detect_changes()) == [".gitignore", "src/calc.py", "src/utils.py"]
+
+    def test_no_diff_after_green_run_is_empty(self, repo):
+        cd.record_green_state()
+        assert cd.detect_changes() == {}
+        assert cd.get_changed_files() == []
+
+    def test_diffs_against_last_green_commit(self, repo):
+        cd.record_green_state()
+        (repo / "src" / "calc.py").write_text("x = 1\n")
+        commit("two")
+        (repo / "src" / "utils.py").write_text("y = 2\n")
+        commit("three")
+
+        # Both commits since the last green run, not just HEAD~1
+        assert sorted(cd.detect_changes()) == ["src/calc.py", "src/utils.py"]
+
+    def test_unknown_last_green_falls_back(self, repo):
+        cd.record_green_state()
+        index = cd.load_file_index()
+        index["last_green"] = "f" * 40
+        with open(os.path.join(cm.CACHE_DIR, cd.FILE_INDEX_NAME), "w") as f:
+            import json
+            json.dump(index, f)
+        (repo / "src" / "calc.py").write_text("x = 1\n")
+        commit("two")
+
+        assert list(cd.detect_changes()) == ["src/calc.py"]
+
+    def test_change_set_groups_by_language(self, repo):
+        (repo / "src" / "calc.py").write_text("x = 1\n")
+        (repo / "web.js").write_text("let y = 2;\n")
+        commit("two")
+
+        change_set = cd.get_change_set()
+        assert change_set.base == "HEAD~1"
+        assert change_set.by_language() == {"javascript": ["web.js"], "python": ["src/calc.py"]}
+        assert change_set.languages() == ["javascript", "python"]
+        assert cd.get_changed_files_by_language(change_set) == (change_set.by_language(), change_set.files)
+
+        change_set["main.go"] = None
+        assert change_set.languages() == ["go", "javascript", "python"]
+
+    def test_run_outputs_are_not_changes(self, repo):
+        # Tracked by mistake, as the dashboard's own database often is
+        (repo / "ci.db").write_bytes(b"runs")
+        (repo / ".ci_cache").mkdir(exist_ok=True)
+        (repo / ".ci_cache" / "entry").write_text("{}")
+        git("add", "-f", "ci.db", ".ci_cache/entry")
+        commit("outputs")
+        cd.record_green_state()
+
+        (repo / "ci.db").write_bytes(b"more runs")
+        (repo / ".ci_cache" / "entry").write_text("{\"hit\": 1}")
+        assert cd.get_change_set() == {}
+        (repo / "src" / "calc.py").write_text("x = 1\n")
+        commit("two")
+        assert list(cd.get_change_set()) == ["src/calc.py"]
+
+    def test_outside_repository(self, tmp_path, monkeypatch):
+        outside = tmp_path / "plain"
+        outside.mkdir()
+        monkeypatch.chdir(outside)
+        monkeypatch.setattr(cd, "find_repo_root", lambda path=".": None)
+        assert cd.detect_changes() is None
+        assert cd.get_changed_files() == []
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,116 @@
+"""
+Unit tests for the coverage-derived test map.
+"""
+
+import json
+import os
+import sys
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ci_engine.cache_manager as cm
+import ci_engine.coverage_mapper as cov
+from ci_engine.ibst import select_tests
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cm, "CACHE_DIR", str(tmp_path / ".ci_cache"))
+    write("proj/src/__init__.py", "")
+    write("proj/src/money.py", "def cents(x):\n    return round(x * 100)\n")
+    write("proj/src/tax.py", "from src.money import cents\n\ndef vat(x):\n    return cents(x * 0.2)\n")
+    write("proj/src/unused.py", "def never():\n    return 0\n")
+    write("proj/tests/test_tax.py", "from src.tax import vat\n\ndef test_vat():\n    assert vat(1) == 20\n")
+    write("proj/tests/test_money.py", "from src.money import cents\n\ndef test_cents():\n    assert cents(1) == 100\n")
+    return tmp_path / "proj"
+
+def count_traces(monkeypatch):
+    traced = []
+    original = cov.trace_test
+
+    def counting(test, *args, **kwargs):
+        traced.append(test)
+        return original(test, *args, **kwargs)
+
+    monkeypatch.setattr(cov, "trace_test", counting)
+    return traced
+
+class TestTracing:
+    """Test recording of executed source files."""
+
+    def test_start_tracing_records_called_files(self, tmp_path):
+        module_path = tmp_path / "traced_module.py"
+        module_path.write_text("def f():\n    return 1\n")
+        namespace = {}
+        exec(compile(module_path.read_text(), str(module_path), "exec"), namespace)
+
+        seen = set()
+        stop = cov.start_tracing(seen.add)
+        try:
+            namespace["f"]()
+        finally:
+            stop()
+        assert str(module_path) in seen
+
+    def test_source_files_filters_to_src_dir(self, tmp_path):
+        src = tmp_path / "src"
+        names = [str(src / "a.py"), str(src / "pkg" / "b.py"), str(tmp_path / "other.py"), "<string>"]
+        assert cov._source_files(names, str(src)) == ["a.py", "pkg/b.py"]
+
+class TestCoverageMap:
+    """Test building, storing and incrementally refreshing the map."""
+
+    def test_transitive_sources_are_covered(self, project):
+        test_map = cov.build_coverage_map(str(project / "tests"), str(project / "src"))
+        assert test_map["test_tax.py"] == ["__init__.py", "money.py", "tax.py"]
+        assert test_map["test_money.py"] == ["__init__.py", "money.py"]
+        # A change to money.py now selects test_tax.py, which names don't reveal
+        assert sorted(select_tests(["money.py"], {}, test_map)) == ["test_money.py", "test_tax.py"]
+
+    def test_stored_compactly(self, project):
+        cov.build_coverage_map(str(project / "tests"), str(project / "src"))
+        with open(cov.coverage_map_path(str(project / "tests"), str(project / "src"))) as f:
+            data = json.load(f)
+        assert data["files"] == ["__init__.py", "money.py", "tax.py"]
+        assert data["tests"]["test_tax.py"]["covers"] == [0, 1, 2]
+
+    def test_only_stale_tests_are_retraced(self, project, monkeypatch):
+        tests, src = str(project / "tests"), str(project / "src")
+        traced = count_traces(monkeypatch)
+        cov.build_coverage_map(tests, src)
+        assert sorted(traced) == ["test_money.py", "test_tax.py"]
+
+        traced.clear()
+        cov.build_coverage_map(tests, src)
+        assert traced == []
+
+        write(str(project / "src" / "tax.py"), "from src.money import cents\n\ndef vat(x):\n    return cents(x / 5)\n")
+        cov.build_coverage_map(tests, src)
+        assert traced == ["test_tax.py"]
+
+        # Sources no test covered do not invalidate anything
+        traced.clear()
+        write(str(project / "src" / "unused.py"), "def never():\n    return 1\n")
+        cov.build_coverage_map(tests, src)
+        assert traced == []
+
+    def test_failed_trace_falls_back_to_naming(self, project, monkeypatch):
+        monkeypatch.setattr(cov, "trace_test", lambda *args, **kwargs: None)
+        test_map = cov.build_coverage_map(str(project / "tests"), str(project / "src"))
+        assert test_map["test_tax.py"] == ["tax.py"]
+        assert cov.load_coverage_entries(str(project / "tests"), str(project / "src")) == {}
+
+    def test_load_test_map_modes(self, project):
+        tests, src = str(project / "tests"), str(project / "src")
+        assert cov.load_test_map(tests, src, mode="naming")["test_tax.py"] == ["tax.py"]
+        assert "money.py" in cov.load_test_map(tests, src, mode="coverage")["test_tax.py"]
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
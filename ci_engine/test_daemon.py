@@ -0,0 +1,201 @@
+"""
+Unit tests for the watch-mode daemon.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ci_engine.cache_manager as cm
+import ci_engine.change_detector as cd
+from ci_engine import daemon
+from ci_engine.daemon import Workspace, Daemon, InotifyWatcher, PollingWatcher, query, DaemonError
+
+def git(*args):
+    subprocess.run(
+        ["git", "-c", "user.name=ci", "-c", "user.email=ci@example.com", *args],
+        capture_output=True, check=True
+    )
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cm, "CACHE_DIR", str(tmp_path / ".ci_cache"))
+    monkeypatch.setattr(cd, "BASE_REF", None)
+    write(".gitignore", ".ci_cache/\n__pycache__/\n")
+    write("src/utils.py", "def double(x):\n    return 2 * x\n")
+    write("src/calc.py", "def add(a, b):\n    return a + b\n")
+    write("tests/test_utils.py", "def test_double():\n    pass\n")
+    write("tests/test_calc.py", "def test_add():\n    pass\n")
+    git("init", "-q")
+    git("add", "-A")
+    git("commit", "-q", "-m", "initial")
+    cd.record_green_state()
+    return tmp_path
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = predicate()
+        if result:
+            return result
+        time.sleep(0.02)
+    return predicate()
+
+def collect(watcher, expected):
+    """Paths the watcher reports until expected are all seen (or a timeout)."""
+    changed = set()
+
+    def seen():
+        if watcher.wait(0.1):
+            changed.update(watcher.read() or ())
+        return expected <= changed
+
+    wait_for(seen)
+    return changed
+
+def inotify_available():
+    return daemon._load_libc() is not None
+
+class TestWorkspace:
+    """Test incremental updates of the in-memory selection inputs."""
+
+    def test_selection_follows_changes(self, repo):
+        workspace = Workspace("tests", "src")
+        assert workspace.selection() == {"changed": [], "tests": [], "detected": True}
+
+        write("src/utils.py", "def double(x):\n    return x + x\n")
+        workspace.apply({str(repo / "src" / "utils.py")})
+        assert workspace.selection()["tests"] == ["test_utils.py"]
+
+    def test_new_import_propagates(self, repo):
+        workspace = Workspace("tests", "src")
+        assert workspace.selection(["src/utils.py"])["tests"] == ["test_utils.py"]
+
+        write("src/calc.py", "from utils import double\n")
+        workspace.apply({str(repo / "src" / "calc.py")})
+        assert workspace.dependency_graph["calc.py"] == ["utils", "utils.double"]
+        assert workspace.selection(["src/utils.py"])["tests"] == ["test_calc.py", "test_utils.py"]
+
+    def test_unchanged_imports_keep_impact_index(self, repo):
+        workspace = Workspace("tests", "src")
+        index = workspace.dependency_graph.impact_index()
+        write("src/utils.py", "def double(x):\n    return x * 2\n")
+        workspace.apply({str(repo / "src" / "utils.py")})
+        assert workspace.dependency_graph.impact_index() is index
+
+    def test_tests_added_and_removed(self, repo):
+        workspace = Workspace("tests", "src")
+        write("src/shapes.py", "AREA = 1\n")
+        write("tests/test_shapes.py", "def test_area():\n    pass\n")
+        os.remove("tests/test_calc.py")
+        workspace.apply({str(repo / "src" / "shapes.py"), str(repo / "tests" / "test_shapes.py"),
+                         str(repo / "tests" / "test_calc.py")})
+
+        assert sorted(workspace.test_map) == ["test_shapes.py", "test_utils.py"]
+        assert workspace.selection(["src/shapes.py"])["tests"] == ["test_shapes.py"]
+        assert workspace.selection(["src/calc.py"])["tests"] == []
+
+    def test_coverage_map_is_retraced(self, repo):
+        write("tests/test_calc.py", "from src.calc import add\n\ndef test_add():\n    assert add(1, 2) == 3\n")
+        workspace = Workspace("tests", "src", map_mode="coverage")
+        assert workspace.test_map["test_calc.py"] == ["calc.py"]
+
+        # Naming would still map test_calc.py to calc.py
+        write("tests/test_calc.py", "from src.utils import double\n\ndef test_add():\n    assert double(2) == 4\n")
+        workspace.apply({str(repo / "tests" / "test_calc.py")})
+        assert workspace.test_map["test_calc.py"] == ["utils.py"]
+        assert workspace.selection(["src/utils.py"])["tests"] == ["test_calc.py"]
+
+    def test_green_run_refreshes_change_set(self, repo):
+        workspace = Workspace("tests", "src")
+        write("src/calc.py", "def add(a, b):\n    return b + a\n")
+        git("commit", "-q", "-am", "swap")
+        workspace.apply({str(repo / "src" / "calc.py")})
+        assert workspace.change_set().files == ["src/calc.py"]
+
+        cd.record_green_state()
+        assert workspace.change_set().files == []
+
+class TestWatchers:
+    """Test that watchers report the files touched in the tree."""
+
+    @pytest.mark.skipif(not inotify_available(), reason="inotify not available")
+    def test_inotify_reports_changes(self, repo):
+        watcher = InotifyWatcher(str(repo))
+        try:
+            write("src/calc.py", "x = 1\n")
+            write("src/pkg/new.py", "y = 2\n")
+            expected = {str(repo / "src" / "calc.py"), str(repo / "src" / "pkg" / "new.py")}
+            assert expected <= collect(watcher, expected)
+
+            # The new directory is watched from now on
+            later = {str(repo / "src" / "pkg" / "later.py")}
+            write("src/pkg/later.py", "z = 3\n")
+            assert later <= collect(watcher, later)
+        finally:
+            watcher.close()
+
+    def test_polling_reports_changes(self, repo):
+        watcher = PollingWatcher(str(repo), interval=0)
+        write("src/calc.py", "x = 1\n" * 3)
+        os.remove("src/utils.py")
+        changed = watcher.read()
+        assert str(repo / "src" / "calc.py") in changed
+        assert str(repo / "src" / "utils.py") in changed
+        assert watcher.read() == set()
+
+class TestDaemonServer:
+    """Test the socket protocol end to end."""
+
+    @pytest.fixture
+    def server(self, repo):
+        # AF_UNIX paths are limited to about 100 bytes
+        socket_path = os.path.join("/tmp", f"ci-daemon-test-{os.getpid()}.sock")
+        instance = Daemon(Workspace("tests", "src"), daemon.make_watcher(".", polling=True), socket_path)
+        thread = threading.Thread(target=instance.serve_forever, daemon=True)
+        thread.start()
+        yield instance
+        instance.stop()
+        thread.join(5)
+
+    def test_queries(self, server):
+        path = server.socket_path
+        assert query("ping", socket_path=path)["pid"] == os.getpid()
+        assert query("status", socket_path=path)["tests"] == 2
+        assert query("select", socket_path=path, files=["src/calc.py"])["tests"] == ["test_calc.py"]
+        with pytest.raises(DaemonError):
+            query("frobnicate", socket_path=path)
+
+    def test_errors_are_reported(self, server, monkeypatch):
+        def broken():
+            raise OSError("file vanished")
+
+        monkeypatch.setattr(server.workspace, "change_set", broken)
+        with pytest.raises(DaemonError, match="file vanished"):
+            query("changes", socket_path=server.socket_path)
+        assert query("ping", socket_path=server.socket_path)["pid"] == os.getpid()
+
+    def test_second_daemon_refuses_live_socket(self, server):
+        with pytest.raises(OSError):
+            Daemon(server.workspace, PollingWatcher(".", interval=0), server.socket_path)
+
+    def test_shutdown_removes_socket(self, server):
+        query("shutdown", socket_path=server.socket_path)
+        assert wait_for(lambda: not os.path.exists(server.socket_path))
+        with pytest.raises(OSError):
+            query("ping", socket_path=server.socket_path)
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,97 @@
+"""
+Unit tests for the incremental dependency graph builder.
+"""
+
+import os
+import sys
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ci_engine.dependency_graph as dg
+from ci_engine.dependency_graph import build_dependency_graph
+
+def write(root, rel_path, source):
+    path = root / rel_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(source)
+    return path
+
+@pytest.fixture
+def src_tree(tmp_path):
+    src = tmp_path / "src"
+    write(src, "app.py", "import os, json\nfrom pkg import models\nfrom pkg.api import handler\n")
+    write(src, "pkg/__init__.py", "from .models import User\n")
+    write(src, "pkg/models.py", "from ..app import main\nfrom . import utils\n")
+    write(src, "pkg/utils.py", "")
+    write(src, "pkg/api/handler.py", "from ..utils import helper\n")
+    write(src, "pkg/api/utils.py", "")
+    return src
+
+class TestImportParsing:
+    """Test extraction of import names."""
+
+    def test_keys_are_relative_paths(self, src_tree):
+        graph = build_dependency_graph(src_tree, cache_dir=None)
+        assert "pkg/utils.py" in graph
+        assert "pkg/api/utils.py" in graph
+        assert graph.root == src_tree
+
+    def test_all_import_names_recorded(self, src_tree):
+        graph = build_dependency_graph(src_tree, cache_dir=None)
+        assert {"os", "json", "pkg", "pkg.models", "pkg.api", "pkg.api.handler"} <= set(graph["app.py"])
+
+    def test_relative_imports_resolved(self, src_tree):
+        graph = build_dependency_graph(src_tree, cache_dir=None)
+        assert "pkg.models" in graph["pkg/__init__.py"]
+        assert "app" in graph["pkg/models.py"]
+        assert "pkg.utils" in graph["pkg/models.py"]
+        assert "pkg.utils.helper" in graph["pkg/api/handler.py"]
+
+    def test_syntax_error_yields_no_imports(self, tmp_path):
+        write(tmp_path, "broken.py", "def (:\n")
+        graph = build_dependency_graph(tmp_path, cache_dir=None)
+        assert graph["broken.py"] == []
+
+    def test_same_basename_does_not_collide(self, src_tree):
+        graph = build_dependency_graph(src_tree, cache_dir=None)
+        impacted = graph.impact_index().impacted(["src/pkg/utils.py"])
+        assert "pkg/api/handler.py" in impacted
+        assert "pkg/models.py" in impacted
+
+class TestImportCache:
+    """Test that unchanged files are not parsed again."""
+
+    def test_only_changed_files_reparsed(self, src_tree, tmp_path, monkeypatch):
+        cache_dir = tmp_path / "cache"
+        build_dependency_graph(src_tree, cache_dir=cache_dir)
+
+        parsed = []
+        original = dg._parse_source
+        monkeypatch.setattr(dg, "_parse_source", lambda source, path, rel: parsed.append(rel) or original(source, path, rel))
+
+        graph = build_dependency_graph(src_tree, cache_dir=cache_dir)
+        assert parsed == []
+        assert "pkg.models" in graph["app.py"]
+
+        write(src_tree, "pkg/utils.py", "import sqlite3\n")
+        graph = build_dependency_graph(src_tree, cache_dir=cache_dir)
+        assert parsed == ["pkg/utils.py"]
+        assert graph["pkg/utils.py"] == ["sqlite3"]
+
+    def test_deleted_files_dropped(self, src_tree, tmp_path):
+        cache_dir = tmp_path / "cache"
+        build_dependency_graph(src_tree, cache_dir=cache_dir)
+        os.remove(src_tree / "pkg" / "api" / "utils.py")
+        graph = build_dependency_graph(src_tree, cache_dir=cache_dir)
+        assert "pkg/api/utils.py" not in graph
+
+    def test_parallel_parse_matches_serial(self, src_tree, monkeypatch):
+        serial = build_dependency_graph(src_tree, cache_dir=None)
+        monkeypatch.setattr(dg, "PARALLEL_PARSE_THRESHOLD", 1)
+        parallel = build_dependency_graph(src_tree, cache_dir=None, max_workers=2)
+        assert parallel == serial
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,118 @@
+"""
+Unit tests for the parallel test executor.
+"""
+
+import os
+import sys
+import time
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ci_engine.executor import run_tests, summarize_results, default_worker_count
+
+SAMPLE_TEST_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_repo", "tests"
+)
+
+class TestRunTests:
+    """Test real execution of selected tests."""
+
+    def test_runs_selected_tests(self):
+        results = run_tests(["test_auth.py", "test_utils.py"], SAMPLE_TEST_DIR)
+
+        assert set(results) == {"test_auth.py", "test_utils.py"}
+        for record in results.values():
+            assert record["status"] == "passed"
+            assert record["returncode"] == 0
+            assert record["duration"] > 0
+            assert "passed" in record["output"]
+
+    def test_missing_test_reports_failure(self):
+        results = run_tests(["test_missing.py"], SAMPLE_TEST_DIR)
+        assert results["test_missing.py"]["status"] == "failed"
+
+    def test_empty_selection(self):
+        assert run_tests([], SAMPLE_TEST_DIR) == {}
+
+    def test_reports_each_result(self):
+        seen = []
+        results = run_tests(["test_utils.py", "test_auth.py"], SAMPLE_TEST_DIR, on_result=seen.append)
+
+        assert sorted(r["test"] for r in seen) == ["test_auth.py", "test_utils.py"]
+        assert list(results) == ["test_utils.py", "test_auth.py"]
+
+    def test_worker_count_uses_cores(self):
+        assert default_worker_count() == (os.cpu_count() or 1)
+
+class TestFailFast:
+    """Test stopping a run at the first failure."""
+
+    @pytest.fixture
+    def test_dir(self, tmp_path):
+        tests = tmp_path / "tests"
+        tests.mkdir()
+        (tests / "test_fail.py").write_text("def test_fail():\n    assert False\n")
+        (tests / "test_ok.py").write_text("def test_ok():\n    assert True\n")
+        (tests / "test_slow.py").write_text("import time\n\ndef test_slow():\n    time.sleep(60)\n")
+        return str(tests)
+
+    def test_running_tests_are_killed(self, test_dir):
+        start = time.time()
+        results = run_tests(["test_fail.py", "test_slow.py"], test_dir, max_workers=2, fail_fast=True)
+
+        assert time.time() - start < 30
+        assert results["test_fail.py"]["status"] == "failed"
+        assert results["test_fail.py"]["stopped_run"] is True
+        assert results["test_slow.py"]["status"] == "skipped"
+
+    def test_queued_tests_are_skipped(self, test_dir):
+        results = run_tests(["test_fail.py", "test_ok.py"], test_dir, max_workers=1, fail_fast=True)
+        assert results["test_ok.py"]["status"] == "skipped"
+        assert summarize_results(results)["skipped"] == 1
+
+        results = run_tests(["test_fail.py", "test_ok.py"], test_dir, max_workers=1)
+        assert results["test_ok.py"]["status"] == "passed"
+        assert "stopped_run" not in results["test_fail.py"]
+
+class TestRetries:
+    """Test retrying failed tests."""
+
+    def test_flaky_test_passes_on_retry(self, tmp_path):
+        tests = tmp_path / "tests"
+        tests.mkdir()
+        # Fails the first time it runs, passes afterwards
+        (tests / "test_flaky.py").write_text(
+            "import os\n\ndef test_flaky():\n"
+            "    first = not os.path.exists('ran')\n"
+            "    open('ran', 'w').close()\n"
+            "    assert not first\n"
+        )
+        (tests / "test_broken.py").write_text("def test_broken():\n    assert False\n")
+
+        results = run_tests(["test_flaky.py", "test_broken.py"], str(tests), retries=2)
+        assert results["test_flaky.py"]["status"] == "passed"
+        assert results["test_flaky.py"]["retries"] == 1
+        assert results["test_broken.py"]["status"] == "failed"
+        assert results["test_broken.py"]["retries"] == 2
+
+    def test_no_retries_by_default(self):
+        results = run_tests(["test_missing.py"], SAMPLE_TEST_DIR, retries=0)
+        assert results["test_missing.py"]["retries"] == 0
+
+def test_summarize_results():
+    results = {
+        "a": {"status": "passed"},
+        "b": {"status": "failed"},
+        "c": {"status": "passed"}
+    }
+    summary = summarize_results(results)
+
+    assert summary["passed"] == 2
+    assert summary["failed"] == 1
+    assert summary["total"] == 3
+    assert summary["success"] is False
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
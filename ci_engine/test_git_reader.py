@@ -0,0 +1,137 @@
+"""
+Unit tests for the in-process git reader.
+"""
+
+import os
+import subprocess
+import sys
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ci_engine.change_detector as cd
+from ci_engine.git_reader import GitRepository, GitIndex, UnsupportedRepository, GitError, blob_id
+
+def git(*args):
+    return subprocess.run(
+        ["git", "-c", "user.name=ci", "-c", "user.email=ci@example.com", *args],
+        capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+def commit(message):
+    git("add", "-A")
+    git("commit", "-q", "-m", message)
+    return git("rev-parse", "HEAD")
+
+def git_diff(base):
+    return cd.parse_raw_diff(subprocess.run(
+        ["git", "diff", "--raw", "-z", "--no-renames", "--no-abbrev", base, "--"],
+        capture_output=True, check=True
+    ).stdout)
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    git("init", "-q", "-b", "main")
+    (tmp_path / "pkg").mkdir()
+    for i in range(20):
+        (tmp_path / "pkg" / f"mod{i}.py").write_text(f"VALUE = {i}\n" + "x = 1\n" * 50)
+    (tmp_path / "README").write_text("readme\n")
+    commit("initial")
+    return tmp_path
+
+def edit_history(root):
+    """Two more commits that modify, add and delete files."""
+    (root / "pkg" / "mod3.py").write_text("VALUE = 'three'\n" + "x = 1\n" * 50)
+    (root / "pkg" / "new.py").write_text("NEW = True\n")
+    commit("two")
+    os.remove(root / "pkg" / "mod7.py")
+    (root / "pkg" / "mod8.py").write_text("VALUE = 8\n" + "x = 2\n" * 50)
+    return commit("three")
+
+class TestObjects:
+    """Test object, ref and history access."""
+
+    def test_blob_id_matches_git(self, repo):
+        assert blob_id((repo / "README").read_bytes()) == git("hash-object", "README")
+
+    @pytest.mark.parametrize("packed", [False, True])
+    def test_resolve_and_read(self, repo, packed):
+        edit_history(repo)
+        if packed:
+            git("gc", "-q", "--aggressive")
+        reader = GitRepository(str(repo))
+
+        for rev in ("HEAD", "main", "HEAD~1", "HEAD~2", "HEAD^1", "refs/heads/main"):
+            assert reader.resolve(rev) == git("rev-parse", rev)
+        assert reader.head() == git("rev-parse", "HEAD")
+        assert reader.resolve("no-such-branch") is None
+
+        blob = git("rev-parse", "HEAD:pkg/mod8.py")
+        _, data = reader.read_object(blob)
+        assert data == (repo / "pkg" / "mod8.py").read_bytes()
+
+    def test_merge_base(self, repo):
+        git("checkout", "-q", "-b", "feature")
+        (repo / "feature.py").write_text("f = 1\n")
+        feature = commit("feature")
+        git("checkout", "-q", "main")
+        (repo / "main.py").write_text("m = 1\n")
+        main = commit("main")
+
+        reader = GitRepository(str(repo))
+        assert reader.merge_base(feature, main) == git("merge-base", feature, main)
+
+class TestDiffWorkdir:
+    """Test that working-tree diffs agree with git diff."""
+
+    @pytest.mark.parametrize("packed", [False, True])
+    def test_matches_git_diff(self, repo, packed):
+        first = git("rev-list", "--max-parents=0", "HEAD")
+        edit_history(repo)
+        if packed:
+            git("gc", "-q")
+        reader = GitRepository(str(repo))
+        for base in (first, "HEAD~1", "HEAD"):
+            assert reader.diff_workdir(base) == git_diff(base)
+
+    def test_dirty_files_get_worktree_ids(self, repo):
+        (repo / "pkg" / "mod1.py").write_text("dirty\n")
+        os.remove(repo / "README")
+        changes = GitRepository(str(repo)).diff_workdir("HEAD")
+        assert changes == {"pkg/mod1.py": git("hash-object", "pkg/mod1.py"), "README": None}
+
+    def test_mode_changes(self, repo):
+        # git leaves unhashed working-tree ids zero, so only paths are compared
+        os.chmod(repo / "pkg" / "mod2.py", 0o755)
+        reader = GitRepository(str(repo))
+        assert set(reader.diff_workdir("HEAD")) == set(git_diff("HEAD")) == {"pkg/mod2.py"}
+
+        os.remove(repo / "README")
+        os.symlink("readme\n", repo / "README")
+        assert set(reader.diff_workdir("HEAD")) == set(git_diff("HEAD")) == {"pkg/mod2.py", "README"}
+
+    def test_unknown_rev(self, repo):
+        reader = GitRepository(str(repo))
+        assert reader.diff_workdir("no-such-branch") is None
+        with pytest.raises(GitError):
+            reader.diff_workdir("f" * 40)
+        assert cd.diff_against("f" * 40, reader) is None
+
+    def test_index_v4(self, repo):
+        edit_history(repo)
+        git("update-index", "--index-version", "4")
+        with open(repo / ".git" / "index", "rb") as f:
+            assert f.read(8) == b"DIRC\0\0\0\x04"
+        index = GitRepository(str(repo)).read_index()
+        assert sorted(index.entries) == git("ls-files").splitlines()
+        assert GitRepository(str(repo)).diff_workdir("HEAD~2") == git_diff("HEAD~2")
+
+    def test_split_index_is_unsupported(self, repo):
+        git("update-index", "--split-index")
+        with pytest.raises(UnsupportedRepository):
+            GitIndex.read(os.path.join(str(repo), ".git", "index"))
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,148 @@
+"""
+Unit tests for test selection and the reverse test index.
+"""
+
+import os
+import sys
+import pickle
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ci_engine.ibst import select_tests, prioritize_tests
+from ci_engine.test_mapper import IndexedTestMap, build_reverse_index
+from ci_engine.dependency_graph import DependencyGraph, ImpactIndex, module_name_for
+
+class TestIndexedTestMap:
+    """Test incremental maintenance of the reverse index."""
+
+    def test_index_built_on_insert(self):
+        test_map = IndexedTestMap({"test_a.py": ["a.py", "shared.py"], "test_b.py": ["b.py", "shared.py"]})
+        assert test_map.tests_for("shared.py") == {"test_a.py", "test_b.py"}
+        assert test_map.tests_for("a.py") == {"test_a.py"}
+
+    def test_reassign_updates_index(self):
+        test_map = IndexedTestMap({"test_a.py": ["a.py"]})
+        test_map["test_a.py"] = ["b.py"]
+        assert test_map.tests_for("a.py") == set()
+        assert "a.py" not in test_map.reverse_index
+        assert test_map.tests_for("b.py") == {"test_a.py"}
+
+    def test_delete_updates_index(self):
+        test_map = IndexedTestMap({"test_a.py": ["a.py"], "test_b.py": ["a.py"]})
+        del test_map["test_a.py"]
+        assert test_map.tests_for("a.py") == {"test_b.py"}
+        test_map.pop("test_b.py")
+        assert test_map.reverse_index == {}
+
+    def test_pickle_round_trip_keeps_index(self):
+        test_map = IndexedTestMap({"test_a.py": ["a.py"]})
+        loaded = pickle.loads(pickle.dumps(test_map))
+        assert loaded.tests_for("a.py") == {"test_a.py"}
+
+    def test_plain_dict_index(self):
+        index = build_reverse_index({"test_a.py": ["a.py"], "test_b.py": ["a.py"]})
+        assert index == {"a.py": {"test_a.py", "test_b.py"}}
+
+class TestSelectTests:
+    """Test selection through the reverse index."""
+
+    def test_selects_tests_for_changed_files(self):
+        test_map = IndexedTestMap({"test_auth.py": ["auth.py"], "test_utils.py": ["utils.py"]})
+        selected = select_tests(["sample_repo/src/auth.py"], {}, test_map)
+        assert selected == ["test_auth.py"]
+
+    def test_plain_dict_test_map(self):
+        test_map = {"test_auth.py": ["auth.py"], "test_utils.py": ["utils.py"]}
+        selected = select_tests(["src/utils.py", "README.md"], {}, test_map)
+        assert selected == ["test_utils.py"]
+
+class TestTransitiveImpact:
+    """Test propagation of changes through the reverse import graph."""
+
+    def setup_method(self):
+        # utils <- auth <- api <- app, and a cycle between a.py and b.py
+        self.graph = DependencyGraph({
+            "utils.py": [],
+            "auth.py": ["src.utils"],
+            "api.py": ["auth"],
+            "app.py": ["api", "os"],
+            "a.py": ["b", "utils"],
+            "b.py": ["a"]
+        })
+        self.test_map = IndexedTestMap({
+            "test_utils.py": ["utils.py"],
+            "test_auth.py": ["auth.py"],
+            "test_app.py": ["app.py"],
+            "test_b.py": ["b.py"]
+        })
+
+    def test_full_closure(self):
+        selected = select_tests(["src/utils.py"], self.graph, self.test_map)
+        assert set(selected) == {"test_utils.py", "test_auth.py", "test_app.py", "test_b.py"}
+
+    def test_depth_limit(self):
+        selected = select_tests(["src/utils.py"], self.graph, self.test_map, max_depth=1)
+        assert set(selected) == {"test_utils.py", "test_auth.py"}
+
+    def test_depth_zero_disables_propagation(self):
+        selected = select_tests(["src/utils.py"], self.graph, self.test_map, max_depth=0)
+        assert selected == ["test_utils.py"]
+
+    def test_cycle_collapsed_into_one_component(self):
+        index = ImpactIndex(self.graph)
+        assert index.component_of[index._node_ids["a.py"]] == index.component_of[index._node_ids["b.py"]]
+        assert index.impacted(["a.py"]) == {"a.py", "b.py"}
+
+    def test_index_invalidated_on_change(self):
+        first = self.graph.impact_index()
+        assert self.graph.impact_index() is first
+        self.graph["api.py"] = []
+        assert self.graph.impact_index() is not first
+        assert "app.py" not in self.graph.impact_index().impacted(["utils.py"])
+
+    def test_module_names(self):
+        assert module_name_for("pkg/mod.py") == "pkg.mod"
+        assert module_name_for("pkg/__init__.py") == "pkg"
+
+class TestPrioritizeTests:
+    """Test ordering of selected tests."""
+
+    def setup_method(self):
+        self.test_map = IndexedTestMap({
+            "test_api.py": ["api.py"],
+            "test_auth.py": ["auth.py"],
+            "test_utils.py": ["utils.py"]
+        })
+        self.tests = ["test_api.py", "test_auth.py", "test_utils.py"]
+
+    def test_direct_before_transitive(self):
+        ordered = prioritize_tests(self.tests, ["src/auth.py"], self.test_map)
+        assert ordered[0] == "test_auth.py"
+        assert ordered[1:] == ["test_api.py", "test_utils.py"]
+
+    def test_recent_failures_first(self):
+        stats = {"test_utils.py": {"duration": 1.0, "failure_rate": 0.5}}
+        ordered = prioritize_tests(self.tests, ["src/auth.py", "src/utils.py"], self.test_map, stats)
+        assert ordered == ["test_utils.py", "test_auth.py", "test_api.py"]
+        # History does not lift a transitive test above a direct one
+        ordered = prioritize_tests(self.tests, ["src/auth.py"], self.test_map, stats)
+        assert ordered == ["test_auth.py", "test_utils.py", "test_api.py"]
+
+    def test_fast_tests_first(self):
+        stats = {
+            "test_api.py": {"duration": 30.0, "failure_rate": 0.0},
+            "test_auth.py": {"duration": 0.5, "failure_rate": 0.0},
+            "test_utils.py": {"duration": 2.0, "failure_rate": 0.0}
+        }
+        assert prioritize_tests(self.tests, [], self.test_map, stats) == ["test_auth.py", "test_utils.py", "test_api.py"]
+        # A slow direct test still runs before much faster transitive ones
+        ordered = prioritize_tests(self.tests, ["api.py"], self.test_map, stats)
+        assert ordered == ["test_api.py", "test_auth.py", "test_utils.py"]
+
+    def test_order_is_deterministic(self):
+        assert prioritize_tests(list(reversed(self.tests)), [], self.test_map) == self.tests
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -5,6 +5,7 @@ Unit tests for language-aware caching functionality.
 import os
 import sys
 import tempfile
+import threading
 import json
 import pytest
 from pathlib import Path
@@ -14,6 +15,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from ci_engine.cache_manager import (
     get_file_language,
+    classify_files,
+    group_by_language,
     LANGUAGE_EXTENSIONS,
     save_language_aware_cache,
     load_language_aware_cache,
@@ -24,8 +27,14 @@ from ci_engine.language_utils import (
     get_language_stats,
     analyze_file_impact,
     get_language_test_runners,
+    get_test_command,
+    get_lane_worker_count,
     format_language_report
 )
+import ci_engine.cache_manager as cm
+import ci_engine.pipeline_runner as pr
+from ci_engine.change_detector import ChangeSet
+from ci_engine.executor import build_test_command
 
 class TestLanguageDetection:
     """Test language detection from file extensions."""
@@ -62,6 +71,48 @@ class TestLanguageDetection:
         assert get_file_language("readme.txt") == "unknown"
         assert get_file_language("config.json") == "unknown"
 
+    def test_suffix_edge_cases(self):
+        assert get_file_language("src/Main.PY") == "python"
+        assert get_file_language("pkg.v2/Makefile") == "unknown"
+        assert get_file_language(".eslintrc.js") == "javascript"
+        assert get_file_language("archive.tar.gz") == "unknown"
+
+class TestBatchClassification:
+    """Test classifying many paths at once and detecting scripts by content."""
+
+    def test_matches_single_file_detection(self):
+        paths = ["a.py", "b/c.JS", "d.txt", "e", "f.tsx", "g.py"]
+        assert classify_files(paths) == [get_file_language(p) for p in paths]
+
+    def test_group_by_language_returns_indices(self):
+        paths = ["a.py", "b.go", "c.py", "d.md"]
+        assert group_by_language(paths) == {"python": [0, 2], "go": [1], "unknown": [3]}
+
+    def test_shebang_detection(self, tmp_path):
+        scripts = {
+            "deploy": "#!/usr/bin/env python3\nprint('hi')\n",
+            "serve": "#!/usr/bin/env -S node --no-warnings\n",
+            "build": "#!/bin/sh\nmake\n",
+            "index": "<?php echo 1;\n",
+            "empty": "",
+        }
+        for name, content in scripts.items():
+            (tmp_path / name).write_text(content)
+        paths = sorted(scripts)
+        assert classify_files(paths, detect_content=True, root=str(tmp_path)) == [
+            "unknown", "python", "unknown", "php", "javascript"
+        ]
+        # Extensionless files stay unknown unless content detection is asked for
+        assert classify_files(paths, root=str(tmp_path)) == ["unknown"] * 5
+
+    def test_content_detection_follows_mtime(self, tmp_path):
+        script = tmp_path / "tool"
+        script.write_text("#!/usr/bin/ruby\n")
+        assert get_file_language(str(script), detect_content=True) == "ruby"
+        script.write_text("#!/usr/bin/python3\n")
+        os.utime(script, ns=(0, 1))
+        assert get_file_language(str(script), detect_content=True) == "python"
+
 class TestLanguageExtensions:
     """Test LANGUAGE_EXTENSIONS mapping."""
     
@@ -121,6 +172,59 @@ class TestLanguageTestRunners:
         runners = get_language_test_runners("unknown")
         assert runners == []
 
+    def test_test_commands(self):
+        assert get_test_command("tests/test_a.py") == build_test_command("tests/test_a.py")
+        assert get_test_command("web/cart.test.js") == ["npx", "jest", "web/cart.test.js"]
+        assert get_test_command("src/CartTest.java") == ["mvn", "-q", "test", "-Dtest=CartTest"]
+        # The test file's own language wins over the lane's
+        assert get_test_command("tests/test_a.py", "java") == build_test_command("tests/test_a.py")
+        assert get_test_command("spec/cart_spec", "ruby") == ["bundle", "exec", "rspec", "spec/cart_spec"]
+        assert get_test_command("tests/check", "cobol") == build_test_command("tests/check")
+
+    def test_lane_worker_counts(self, monkeypatch):
+        monkeypatch.setattr("ci_engine.language_utils.default_worker_count", lambda: 8)
+        monkeypatch.delenv("CI_LANE_WORKERS", raising=False)
+        assert get_lane_worker_count("python") == 8
+        assert get_lane_worker_count("java") == 2
+        assert get_lane_worker_count("python", max_workers=3) == 3
+
+        monkeypatch.setenv("CI_LANE_WORKERS", "python=16, java=1, go=oops")
+        assert get_lane_worker_count("python") == 16
+        assert get_lane_worker_count("java") == 1
+        assert get_lane_worker_count("go") == 8
+
+class TestLanguageLanes:
+    """Test concurrent per-language execution lanes."""
+
+    @pytest.fixture
+    def lanes(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(cm, "CACHE_DIR", str(tmp_path / ".ci_cache"))
+        monkeypatch.setenv("CI_LANE_WORKERS", "python=3,javascript=1")
+        calls = {}
+        # Both lanes must be running at once for either to get past this
+        barrier = threading.Barrier(2, timeout=10)
+
+        def fake_run_tests(tests, test_dir=None, max_workers=None, command=None, **kwargs):
+            calls.update({t: (max_workers, command("t/" + t)) for t in tests})
+            barrier.wait()
+            return {t: {"test": t, "status": "passed", "duration": 0.1} for t in tests}
+
+        monkeypatch.setattr(pr, "run_tests", fake_run_tests)
+        return calls
+
+    def test_lanes_run_concurrently(self, lanes):
+        test_map = {"test_api.py": ["api.py"], "test_cart.js": ["cart.js"], "test_shared.py": ["api.py", "cart.js"]}
+        result = pr.run_pipeline(test_map, {}, change_set=ChangeSet.fromkeys(["src/api.py", "src/cart.js"]))
+
+        assert result["summary"]["success"]
+        assert result["language_breakdown"] == {"javascript": 2, "python": 2}
+        # test_shared.py is selected by both languages but runs once
+        assert sorted(lanes) == ["test_api.py", "test_cart.js", "test_shared.py"]
+        assert lanes["test_api.py"] == (3, build_test_command("t/test_api.py"))
+        assert lanes["test_cart.js"] == (1, ["npx", "jest", "t/test_cart.js"])
+        assert lanes["test_shared.py"][1] == build_test_command("t/test_shared.py")
+
 class TestLanguageReportFormatting:
     """Test report formatting."""
     
@@ -149,10 +253,10 @@ class TestLanguageReportFormatting:
 def test_language_aware_cache_operations():
     """Test language-aware cache save and load operations."""
     with tempfile.TemporaryDirectory() as tmpdir:
-        # Monkey-patch the cache directory
+        # Monkey-patch the cache directory (the store lives inside it)
         import ci_engine.cache_manager as cm
-        original_dir = cm.LANGUAGE_AWARE_CACHE_DIR
-        cm.LANGUAGE_AWARE_CACHE_DIR = tmpdir
+        original_dir = cm.CACHE_DIR
+        cm.CACHE_DIR = tmpdir
         
         try:
             cache_key = "test_cache_123"
@@ -168,14 +272,14 @@ def test_language_aware_cache_operations():
             assert loaded["time"] == data["time"]
         
         finally:
-            cm.LANGUAGE_AWARE_CACHE_DIR = original_dir
+            cm.CACHE_DIR = original_dir
 
 def test_language_map_operations():
     """Test language map save and load operations."""
     with tempfile.TemporaryDirectory() as tmpdir:
         import ci_engine.cache_manager as cm
-        original_dir = cm.LANGUAGE_AWARE_CACHE_DIR
-        cm.LANGUAGE_AWARE_CACHE_DIR = tmpdir
+        original_dir = cm.CACHE_DIR
+        cm.CACHE_DIR = tmpdir
         
         try:
             from ci_engine.cache_manager import save_language_map, load_language_aware_cache
@@ -194,7 +298,7 @@ def test_language_map_operations():
             assert loaded["javascript"] == lang_map["javascript"]
         
         finally:
-            cm.LANGUAGE_AWARE_CACHE_DIR = original_dir
+            cm.CACHE_DIR = original_dir
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
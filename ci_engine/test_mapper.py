@@ -1,11 +1,128 @@
 import os
+import json
+import hashlib
+
+class IndexedTestMap(dict):
+    """Test map (test -> covered source files) with a reverse index.
+
+    The reverse index maps each source file to the set of tests that
+    cover it and is updated incrementally whenever the map changes.
+    Assign a new list to change a test's coverage; mutating the stored
+    list in place bypasses the index.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.reverse_index = {}
+        self._digest = None
+        # Directories the map was generated from, when known
+        self.test_dir = None
+        self.src_dir = None
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, test, covered_files):
+        covered_files = list(covered_files)
+        self._digest = None
+        if test in self:
+            self._unindex(test, self[test])
+        super().__setitem__(test, covered_files)
+        for src_file in covered_files:
+            self.reverse_index.setdefault(src_file, set()).add(test)
+
+    def __delitem__(self, test):
+        self._digest = None
+        self._unindex(test, self[test])
+        super().__delitem__(test)
+
+    def _unindex(self, test, covered_files):
+        for src_file in covered_files:
+            tests = self.reverse_index.get(src_file)
+            if tests is None:
+                continue
+            tests.discard(test)
+            if not tests:
+                del self.reverse_index[src_file]
+
+    def update(self, *args, **kwargs):
+        for test, covered_files in dict(*args, **kwargs).items():
+            self[test] = covered_files
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def setdefault(self, test, default=None):
+        if test not in self:
+            self[test] = default or []
+        return self[test]
+
+    def pop(self, test, *default):
+        if test not in self:
+            if default:
+                return default[0]
+            raise KeyError(test)
+        covered_files = self[test]
+        del self[test]
+        return covered_files
+
+    def popitem(self):
+        test = next(reversed(self))
+        return test, self.pop(test)
+
+    def clear(self):
+        super().clear()
+        self.reverse_index.clear()
+        self._digest = None
+
+    def copy(self):
+        test_map = IndexedTestMap(self)
+        test_map.test_dir, test_map.src_dir = self.test_dir, self.src_dir
+        return test_map
+
+    def __reduce__(self):
+        return (IndexedTestMap, (dict(self),), {"test_dir": self.test_dir, "src_dir": self.src_dir})
+
+    def tests_for(self, src_file):
+        """Return the set of tests covering a source file."""
+        return self.reverse_index.get(src_file, set())
+
+def hash_test_map(test_map):
+    """Stable content digest of a test map; cached on IndexedTestMap."""
+    cached = getattr(test_map, "_digest", None)
+    if cached:
+        return cached
+    canonical = json.dumps(
+        sorted((test, sorted(covered)) for test, covered in test_map.items())
+    )
+    digest = hashlib.sha256(canonical.encode()).hexdigest()
+    if isinstance(test_map, IndexedTestMap):
+        test_map._digest = digest
+    return digest
+
+def build_reverse_index(test_map):
+    """Build a source file -> tests index for a plain test map dict."""
+    if isinstance(test_map, IndexedTestMap):
+        return test_map.reverse_index
+    reverse_index = {}
+    for test, covered_files in test_map.items():
+        for src_file in covered_files:
+            reverse_index.setdefault(src_file, set()).add(test)
+    return reverse_index
+
+def is_test_file(filename):
+    return filename.startswith("test_") and filename.endswith(".py")
+
+def covered_sources(test_file):
+    """Source files a test file covers, by naming convention."""
+    return [test_file.replace("test_", "")]
 
 def generate_test_map(test_dir, src_dir):
-    test_map = {}
+    test_map = IndexedTestMap()
 
     for test_file in os.listdir(test_dir):
-        if test_file.startswith("test_") and test_file.endswith(".py"):
-            src_file = test_file.replace("test_", "")
-            test_map[test_file] = [src_file]
+        if is_test_file(test_file):
+            test_map[test_file] = covered_sources(test_file)
 
+    test_map.test_dir = test_dir
+    test_map.src_dir = src_dir
     return test_map
@@ -0,0 +1,124 @@
+"""
+Unit tests for the shared HTTP cache backend and reference server.
+"""
+
+import os
+import socket
+import sys
+import threading
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ci_engine.cache_store import CacheStore
+from ci_engine.cache_server import serve_in_background
+from ci_engine.remote_cache import HttpCacheBackend, TieredCacheBackend
+
+@pytest.fixture
+def server(tmp_path):
+    store = CacheStore(str(tmp_path / "shared.db"))
+    server, url = serve_in_background(store)
+    yield store, url
+    server.shutdown()
+    server.server_close()
+
+class TestHttpCacheBackend:
+    """Test the client against the bundled server."""
+
+    def test_round_trip(self, server):
+        shared, url = server
+        remote = HttpCacheBackend(url)
+        remote.put("tests", "test_a.py\0abc", {"status": "passed", "duration": 0.1})
+
+        assert remote.get("tests", "test_a.py\0abc") == {"status": "passed", "duration": 0.1}
+        assert shared.get("tests", "test_a.py\0abc") is not None
+        assert remote.get("tests", "missing") is None
+
+    def test_batched_lookup(self, server):
+        _, url = server
+        remote = HttpCacheBackend(url)
+        remote.put_many("standard", {f"k{i}": i for i in range(1200)})
+        found = remote.get_many("standard", [f"k{i}" for i in range(0, 1300, 3)])
+        assert len(found) == 400
+
+    def test_unreachable_server_is_a_miss(self):
+        remote = HttpCacheBackend("http://127.0.0.1:9", timeout=0.5)
+        assert remote.get_many("standard", ["k"]) == {}
+        remote.put("standard", "k", 1)
+        assert remote.errors == 2
+
+    @pytest.mark.parametrize("reply", [
+        b"",
+        b"HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\n{\"found\"",
+        b"garbage\r\n\r\n"
+    ])
+    def test_broken_server_is_a_miss(self, reply):
+        # Answers each request with reply, then closes the connection
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+
+        def serve():
+            while True:
+                try:
+                    conn, _ = listener.accept()
+                except OSError:
+                    return
+                with conn:
+                    conn.recv(65536)
+                    conn.sendall(reply)
+
+        threading.Thread(target=serve, daemon=True).start()
+        try:
+            remote = HttpCacheBackend(f"http://127.0.0.1:{listener.getsockname()[1]}", timeout=2)
+            assert remote.get_many("standard", ["k"]) == {}
+            assert remote.errors == 1
+        finally:
+            listener.close()
+
+class TestTieredCacheBackend:
+    """Test read-through and background uploads."""
+
+    def test_read_through_fills_local(self, server, tmp_path):
+        shared, url = server
+        shared.put("standard", "key", {"tests": ["test_a.py"]})
+        local = CacheStore(str(tmp_path / "local.db"))
+        tiered = TieredCacheBackend(local, HttpCacheBackend(url))
+
+        assert tiered.get("standard", "key") == {"tests": ["test_a.py"]}
+        assert local.get("standard", "key") == {"tests": ["test_a.py"]}
+        assert tiered.remote_hits == 1
+
+    def test_read_through_keeps_tags(self, server, tmp_path):
+        shared, url = server
+        shared.put("language", "k:python", 1, tag="python")
+        shared.put("language", "k:go", 2, tag="go")
+        local = CacheStore(str(tmp_path / "local.db"))
+        tiered = TieredCacheBackend(local, HttpCacheBackend(url))
+
+        assert tiered.get_many("language", ["k:python", "k:go"]) == {"k:python": 1, "k:go": 2}
+        assert local.get_many_tagged("language", ["k:python", "k:go"]) == {"k:python": (1, "python"), "k:go": (2, "go")}
+        assert local.counters()["language"]["go"]["entries"] == 1
+
+    def test_uploads_are_async(self, server, tmp_path):
+        shared, url = server
+        local = CacheStore(str(tmp_path / "local.db"))
+        tiered = TieredCacheBackend(local, HttpCacheBackend(url))
+
+        tiered.put_many("tests", {"a": 1, "b": 2})
+        assert local.get_many("tests", ["a", "b"]) == {"a": 1, "b": 2}
+        assert tiered.flush(timeout=10)
+        assert shared.get_many("tests", ["a", "b"]) == {"a": 1, "b": 2}
+
+    def test_local_hits_skip_remote(self, tmp_path):
+        local = CacheStore(str(tmp_path / "local.db"))
+        local.put("standard", "key", 1)
+        remote = HttpCacheBackend("http://127.0.0.1:9", timeout=0.5)
+        tiered = TieredCacheBackend(local, remote)
+
+        assert tiered.get("standard", "key") == 1
+        assert remote.errors == 0
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,132 @@
+"""
+Unit tests for the ignore-aware repository scanner.
+"""
+
+import os
+import subprocess
+import sys
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ci_engine.language_utils as lu
+from ci_engine.repo_scanner import scan_files, parse_ignore_lines, is_ignored, tree_unchanged
+
+def write(root, rel, content=""):
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+@pytest.fixture
+def tree(tmp_path):
+    write(tmp_path, ".gitignore", "node_modules/\n*.log\n/build\n!keep.log\n")
+    write(tmp_path, "src/app.py")
+    write(tmp_path, "src/debug.log")
+    write(tmp_path, "src/keep.log")
+    write(tmp_path, "src/build/gen.py")
+    write(tmp_path, "build/out.js")
+    write(tmp_path, "node_modules/lib/index.js")
+    write(tmp_path, "web/.gitignore", "*.min.js\n")
+    write(tmp_path, "web/app.js")
+    write(tmp_path, "web/app.min.js")
+    write(tmp_path, ".venv/lib/site.py")
+    write(tmp_path, "bin/deploy", "#!/usr/bin/env python3\n")
+    return tmp_path
+
+EXPECTED = ["bin/deploy", "src/app.py", "src/build/gen.py", "src/keep.log", "web/.gitignore", "web/app.js"]
+
+class TestIgnorePatterns:
+    """Test .gitignore pattern semantics."""
+
+    def match(self, lines, path, is_dir=False):
+        return is_ignored((("", parse_ignore_lines(lines)),), path, is_dir)
+
+    def test_unanchored_matches_at_any_depth(self):
+        assert self.match(["*.pyc"], "a/b/c.pyc")
+        assert not self.match(["*.pyc"], "a/b/c.py")
+
+    def test_anchored_and_directory_patterns(self):
+        assert self.match(["/dist"], "dist", is_dir=True)
+        assert not self.match(["/dist"], "pkg/dist", is_dir=True)
+        assert self.match(["cache/"], "a/cache", is_dir=True)
+        assert not self.match(["cache/"], "a/cache")
+
+    def test_double_star_and_negation(self):
+        assert self.match(["docs/**/*.md"], "docs/a/b/x.md")
+        assert self.match(["docs/**/*.md"], "docs/x.md")
+        assert not self.match(["*.md", "!README.md"], "README.md")
+        assert self.match(["# comment", "", "[ab].txt"], "b.txt")
+
+    def test_matches_git_check_ignore(self, tree):
+        subprocess.run(["git", "init", "-q", str(tree)], check=True)
+        listed = subprocess.run(
+            ["git", "ls-files", "--others", "--exclude-standard"],
+            cwd=tree, capture_output=True, text=True, check=True
+        ).stdout.split()
+        assert sorted(p for p in listed if not p.startswith(".")) == EXPECTED
+
+class TestScanFiles:
+    """Test scanning, parallel scanning and change tracking."""
+
+    @pytest.mark.parametrize("workers", [1, 4])
+    def test_respects_gitignore(self, tree, workers):
+        assert sorted(scan_files(str(tree), workers=workers)) == EXPECTED
+
+    def test_without_ignore_files(self, tree):
+        files = set(scan_files(str(tree), use_ignore=False))
+        assert "node_modules/lib/index.js" in files
+        assert ".venv/lib/site.py" not in files
+
+    def test_tree_unchanged_tracks_directories(self, tree):
+        mtimes = {}
+        list(scan_files(str(tree), mtimes=mtimes))
+        assert tree_unchanged(mtimes)
+
+        # Editing a file leaves the listing valid; adding one does not
+        write(tree, "src/app.py", "x = 1\n")
+        assert tree_unchanged(mtimes)
+        write(tree, "src/new.py")
+        os.utime(tree / "src", ns=(0, 1))
+        assert not tree_unchanged(mtimes)
+
+class TestLanguageStats:
+    """Test cached language stats over a scanned tree."""
+
+    def test_stats_cached_until_tree_changes(self, tree, monkeypatch):
+        scans = []
+        original = lu._count_languages
+        monkeypatch.setattr(lu, "_count_languages", lambda *a, **k: scans.append(1) or original(*a, **k))
+        monkeypatch.setattr(lu, "_STATS_CACHE", {})
+
+        stats = lu.get_language_stats(str(tree))
+        assert stats["by_language"] == {
+            "python": ["bin/deploy", "src/app.py", "src/build/gen.py"], "javascript": ["web/app.js"]
+        }
+        assert stats["total_files"] == 4
+
+        stats["by_language"]["python"].clear()
+        assert lu.get_language_stats(str(tree))["total_files"] == 4
+        assert len(scans) == 1
+
+        write(tree, "web/util.ts")
+        os.utime(tree / "web", ns=(0, 1))
+        assert lu.get_language_stats(str(tree))["by_language"]["typescript"] == ["web/util.ts"]
+        assert len(scans) == 2
+
+    def test_shebang_edit_invalidates_stats(self, tree, monkeypatch):
+        monkeypatch.setattr(lu, "_STATS_CACHE", {})
+        assert lu.get_language_stats(str(tree))["by_language"]["python"][0] == "bin/deploy"
+
+        write(tree, "bin/deploy", "#!/usr/bin/env ruby\n")
+        os.utime(tree / "bin" / "deploy", ns=(0, 1))
+        stats = lu.get_language_stats(str(tree))
+        assert stats["by_language"]["ruby"] == ["bin/deploy"]
+        assert "bin/deploy" not in stats["by_language"]["python"]
+
+    def test_file_count(self, tree):
+        assert lu.get_language_file_count(str(tree)) == len(EXPECTED)
+        assert lu.get_language_file_count(str(tree), "python") == 3
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
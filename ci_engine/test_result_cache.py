@@ -0,0 +1,151 @@
+"""
+Unit tests for the per-test result cache.
+"""
+
+import os
+import sys
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ci_engine.cache_manager as cm
+import ci_engine.pipeline_runner as pr
+from ci_engine.change_detector import ChangeSet
+from ci_engine.dependency_graph import build_dependency_graph
+from ci_engine.input_digests import compute_test_digests
+from ci_engine.test_mapper import generate_test_map
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cm, "CACHE_DIR", str(tmp_path / "cache"))
+    (tmp_path / "src").mkdir()
+    (tmp_path / "tests").mkdir()
+    (tmp_path / "src" / "utils.py").write_text("def double(x):\n    return 2 * x\n")
+    (tmp_path / "src" / "auth.py").write_text("from src.utils import double\n")
+    (tmp_path / "src" / "calc.py").write_text("def add(a, b):\n    return a + b\n")
+    (tmp_path / "tests" / "test_auth.py").write_text("from src.auth import double\n\ndef test_double():\n    assert double(2) == 4\n")
+    (tmp_path / "tests" / "test_calc.py").write_text("from src.calc import add\n\ndef test_add():\n    assert add(1, 2) == 3\n")
+    test_map = generate_test_map("tests", "src")
+    graph = build_dependency_graph("src", cache_dir=None)
+    return tmp_path, test_map, graph
+
+@pytest.fixture
+def executed(monkeypatch):
+    calls = []
+    original = pr.run_tests
+
+    def recording_run_tests(tests, *args, **kwargs):
+        calls.append(sorted(tests))
+        return original(tests, *args, **kwargs)
+
+    monkeypatch.setattr(pr, "run_tests", recording_run_tests)
+    return calls
+
+class TestInputDigests:
+    """Test that digests follow transitive inputs."""
+
+    def test_transitive_change_changes_digest(self, project):
+        root, test_map, graph = project
+        before = compute_test_digests(["test_auth.py", "test_calc.py"], test_map, graph, "tests")
+        (root / "src" / "utils.py").write_text("def double(x):\n    return x + x\n")
+        graph = build_dependency_graph("src", cache_dir=None)
+        after = compute_test_digests(["test_auth.py", "test_calc.py"], test_map, graph, "tests")
+
+        assert before["test_auth.py"] != after["test_auth.py"]
+        assert before["test_calc.py"] == after["test_calc.py"]
+
+    def test_pytest_support_files_and_command_change_digest(self, project):
+        root, test_map, graph = project
+        before = compute_test_digests(["test_calc.py"], test_map, graph, "tests")
+        (root / "pytest.ini").write_text("[pytest]\naddopts = -x\n")
+        after_config = compute_test_digests(["test_calc.py"], test_map, graph, "tests")
+        other_runner = compute_test_digests(["test_calc.py"], test_map, graph, "tests",
+                                            command=lambda path: ["python", "-m", "unittest", path])
+
+        assert before != after_config
+        assert other_runner != after_config
+
+    def test_unlocatable_inputs_are_not_cached(self):
+        digests = compute_test_digests(["test_auth.py"], {"test_auth.py": ["auth.py"]}, {})
+        assert digests == {"test_auth.py": None}
+
+class TestPartialReuse:
+    """Test that only tests with changed inputs execute again."""
+
+    def test_only_changed_tests_rerun(self, project, executed):
+        root, test_map, graph = project
+        tests = ["test_auth.py", "test_calc.py"]
+
+        results, cached = pr.execute_tests(tests, test_map, graph, "tests")
+        assert cached == []
+        assert all(r["status"] == "passed" for r in results.values())
+
+        results, cached = pr.execute_tests(tests, test_map, graph, "tests")
+        assert cached == tests
+        assert results["test_auth.py"]["cached"] is True
+
+        (root / "src" / "calc.py").write_text("def add(a, b):\n    return b + a\n")
+        graph = build_dependency_graph("src", cache_dir=None)
+        results, cached = pr.execute_tests(tests, test_map, graph, "tests")
+        assert cached == ["test_auth.py"]
+        assert executed[-1] == ["test_calc.py"]
+
+    def test_conftest_edit_reruns(self, project, executed):
+        root, test_map, graph = project
+        (root / "tests" / "conftest.py").write_text(
+            "import pytest\n\n@pytest.fixture(autouse=True)\ndef setup():\n    yield\n"
+        )
+        pr.execute_tests(["test_calc.py"], test_map, graph, "tests")
+        results, cached = pr.execute_tests(["test_calc.py"], test_map, graph, "tests")
+        assert cached == ["test_calc.py"]
+
+        (root / "tests" / "conftest.py").write_text(
+            "import pytest\n\n@pytest.fixture(autouse=True)\ndef setup():\n    assert False\n"
+        )
+        results, cached = pr.execute_tests(["test_calc.py"], test_map, graph, "tests")
+        assert cached == []
+        assert executed[-1] == ["test_calc.py"]
+        assert results["test_calc.py"]["status"] == "failed"
+
+    def test_failures_not_cached(self, project, executed):
+        root, test_map, graph = project
+        (root / "tests" / "test_calc.py").write_text("def test_add():\n    assert False\n")
+
+        pr.execute_tests(["test_calc.py"], test_map, graph, "tests")
+        results, cached = pr.execute_tests(["test_calc.py"], test_map, graph, "tests")
+        assert cached == []
+        assert results["test_calc.py"]["status"] == "failed"
+
+    def test_progress_reports_cached_and_executed(self, project):
+        root, test_map, graph = project
+        tests = ["test_auth.py", "test_calc.py"]
+        pr.execute_tests(["test_auth.py"], test_map, graph, "tests")
+
+        events = []
+        pr.execute_tests(tests, test_map, graph, "tests", progress=events.append)
+        by_test = {e["test"]: e for e in events}
+        assert all(e["event"] == "test" for e in events)
+        assert by_test["test_auth.py"]["cached"] is True
+        assert by_test["test_calc.py"]["cached"] is False
+        assert by_test["test_calc.py"]["status"] == "passed"
+
+class TestFailFast:
+    """Test prioritized, fail-fast pipeline runs."""
+
+    @pytest.mark.parametrize("language_aware", [False, True])
+    def test_stops_at_first_failure(self, project, language_aware):
+        root, test_map, graph = project
+        (root / "tests" / "test_calc.py").write_text("def test_add():\n    assert False\n")
+        stats = {"test_calc.py": {"duration": 0.5, "failure_rate": 0.5}}
+
+        result = pr.run_pipeline(test_map, graph, language_aware=language_aware, test_dir="tests", max_workers=1,
+                                 change_set=ChangeSet.fromkeys(["src/auth.py", "src/calc.py"]),
+                                 test_stats=stats, fail_fast=True)
+        assert result["first_failure"] == "test_calc.py"
+        assert result["results"]["test_auth.py"]["status"] == "skipped"
+        assert not result["summary"]["success"]
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,132 @@
+"""
+Unit tests for duration-aware test sharding.
+"""
+
+import json
+import os
+import sys
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ci_engine.cache_manager as cm
+import ci_engine.sharding as sharding
+from ci_engine.executor import DEFAULT_TEST_DURATION
+from ci_engine.sharding import plan_shards, build_manifest, write_manifests, load_manifest, merge_shard_results
+from ci_engine.test_mapper import generate_test_map
+
+# A few slow integration tests among many fast unit tests
+DURATIONS = dict(
+    {f"test_unit_{i:02d}.py": 1.0 + (i % 3) for i in range(30)},
+    **{"test_e2e_checkout.py": 40.0, "test_e2e_signup.py": 35.0, "test_e2e_search.py": 30.0}
+)
+
+def shard_times(shards, durations):
+    return [sum(durations[t] for t in shard) for shard in shards]
+
+class TestPlanner:
+    """Test balancing and determinism of shard plans."""
+
+    def test_balances_better_than_round_robin(self):
+        tests = sorted(DURATIONS)
+        round_robin = shard_times([tests[i::4] for i in range(4)], DURATIONS)
+        planned = shard_times(plan_shards(tests, 4, DURATIONS)["shards"], DURATIONS)
+
+        assert sum(planned) == sum(round_robin)
+        assert max(planned) < max(round_robin)
+        # LPT stays within 4/3 of the ideal makespan
+        assert max(planned) <= max(sum(planned) / 4, max(DURATIONS.values())) * 4 / 3
+
+    def test_every_test_in_exactly_one_shard(self):
+        shards = plan_shards(list(DURATIONS) * 2, 5, DURATIONS)["shards"]
+        assert sorted(t for shard in shards for t in shard) == sorted(DURATIONS)
+
+    def test_plan_is_deterministic(self):
+        tests = sorted(DURATIONS)
+        first = plan_shards(tests, 3, DURATIONS)
+        second = plan_shards(list(reversed(tests)), 3, dict(reversed(list(DURATIONS.items()))))
+        assert first == second
+
+    def test_unknown_tests_get_median_estimate(self):
+        plan = plan_shards(["test_a.py", "test_b.py", "test_c.py", "test_new.py"], 2,
+                           {"test_a.py": 1.0, "test_b.py": 3.0, "test_c.py": 8.0})
+        assert plan["durations"]["test_new.py"] == 3.0
+        assert plan_shards(["test_x.py"], 1)["durations"] == {"test_x.py": DEFAULT_TEST_DURATION}
+
+    def test_more_shards_than_tests(self):
+        assert plan_shards(["test_a.py"], 3)["shards"] == [["test_a.py"], [], []]
+        with pytest.raises(ValueError):
+            plan_shards(["test_a.py"], 0)
+
+class TestManifests:
+    """Test manifest files and merging shard results."""
+
+    def test_manifests_round_trip(self, tmp_path):
+        plan = plan_shards(sorted(DURATIONS), 3, DURATIONS)
+        paths = write_manifests(plan, str(tmp_path))
+        assert [os.path.basename(p) for p in paths] == ["shard-0.json", "shard-1.json", "shard-2.json"]
+
+        manifest = load_manifest(paths[1])
+        assert manifest == build_manifest(plan, 1)
+        assert manifest["tests"] == plan["shards"][1]
+        assert manifest["estimated_duration"] == shard_times(plan["shards"], DURATIONS)[1]
+
+    def test_manifest_version_checked(self, tmp_path):
+        path = tmp_path / "shard-0.json"
+        path.write_text(json.dumps({"version": 0, "tests": []}))
+        with pytest.raises(ValueError):
+            load_manifest(str(path))
+
+    def shard_result(self, plan, index, status="passed", time_taken=1.0):
+        manifest = build_manifest(plan, index)
+        return {
+            "index": index, "shard_count": manifest["shard_count"], "plan_digest": manifest["plan_digest"],
+            "tests": manifest["tests"], "time": time_taken, "tests_cached": [],
+            "results": {t: {"test": t, "status": status, "duration": 0.1} for t in manifest["tests"]}
+        }
+
+    def test_merge_into_one_run(self):
+        plan = plan_shards(sorted(DURATIONS), 2, DURATIONS)
+        result = merge_shard_results([self.shard_result(plan, 1, time_taken=5.0),
+                                      self.shard_result(plan, 0, status="failed", time_taken=3.0)])
+        assert result["tests"] == sorted(DURATIONS)
+        assert result["mode"] == "sharded"
+        assert result["time"] == 5.0
+        assert result["shard_times"] == [3.0, 5.0]
+        assert result["summary"]["failed"] == len(plan["shards"][0])
+        assert not result["summary"]["success"]
+
+    def test_merge_rejects_incomplete_or_mixed_plans(self):
+        plan = plan_shards(sorted(DURATIONS), 2, DURATIONS)
+        other = plan_shards(sorted(DURATIONS), 2)
+        with pytest.raises(ValueError):
+            merge_shard_results([self.shard_result(plan, 0)])
+        with pytest.raises(ValueError):
+            merge_shard_results([self.shard_result(plan, 0), self.shard_result(other, 1)])
+        with pytest.raises(ValueError):
+            merge_shard_results([self.shard_result(plan, 0), self.shard_result(plan, 0)])
+
+class TestRunShard:
+    """Test running a manifest against real test files."""
+
+    def test_runs_only_its_shard(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(cm, "CACHE_DIR", str(tmp_path / ".ci_cache"))
+        src, tests = tmp_path / "src", tmp_path / "tests"
+        src.mkdir()
+        tests.mkdir()
+        for name in ("alpha", "beta", "gamma"):
+            (src / f"{name}.py").write_text("VALUE = 1\n")
+            (tests / f"test_{name}.py").write_text("def test_value():\n    assert True\n")
+
+        test_map = generate_test_map(str(tests), str(src))
+        plan = plan_shards(sorted(test_map), 2, {"test_alpha.py": 5.0, "test_beta.py": 1.0, "test_gamma.py": 1.0})
+        results = [sharding.run_shard(build_manifest(plan, i), test_map, {}, str(tests)) for i in range(2)]
+
+        assert results[0]["tests"] == ["test_alpha.py"]
+        merged = merge_shard_results(results)
+        assert merged["summary"]["passed"] == 3
+        assert merged["summary"]["success"]
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
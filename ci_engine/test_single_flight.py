@@ -0,0 +1,170 @@
+"""
+Unit tests for single-flight coalescing of identical runs.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ci_engine.cache_manager as cm
+import ci_engine.pipeline_runner as pr
+from ci_engine.change_detector import ChangeSet
+from ci_engine.single_flight import single_flight, FileLock, _lock_path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class TestInProcess:
+    """Test that concurrent callers in one process share a run."""
+
+    def test_concurrent_callers_share_one_run(self):
+        calls = []
+        release = threading.Event()
+
+        def work():
+            calls.append(1)
+            release.wait(5)
+            return {"value": 42}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(single_flight("key", work)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        assert len(calls) == 1
+        assert [value for value, _ in results] == [{"value": 42}] * 4
+        assert sorted(shared for _, shared in results) == [False, True, True, True]
+
+    def test_errors_are_shared(self):
+        release = threading.Event()
+
+        def broken():
+            release.wait(5)
+            raise RuntimeError("boom")
+
+        errors = []
+
+        def call():
+            try:
+                single_flight("broken", broken)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        assert errors == ["boom"] * 3
+
+    def test_later_calls_run_again(self):
+        calls = []
+        single_flight("again", lambda: calls.append(1))
+        single_flight("again", lambda: calls.append(1))
+        assert len(calls) == 2
+
+class TestFileLock:
+    """Test the cross-process lock."""
+
+    def test_lock_excludes_other_processes(self, tmp_path):
+        path = _lock_path(str(tmp_path), "shared")
+        holder = subprocess.Popen(
+            [sys.executable, "-c",
+             "import sys, time; sys.path.insert(0, sys.argv[1]);"
+             "from ci_engine.single_flight import FileLock;"
+             "lock = FileLock(sys.argv[2]); lock.acquire(); print('locked', flush=True);"
+             "time.sleep(0.5); lock.release()",
+             ROOT, path],
+            stdout=subprocess.PIPE, text=True
+        )
+        try:
+            assert holder.stdout.readline().strip() == "locked"
+            assert FileLock(path, timeout=0.05).acquire() is False
+
+            waiter = FileLock(path, timeout=10)
+            assert waiter.acquire() is True
+            waiter.release()
+        finally:
+            holder.wait(10)
+        assert not os.path.exists(path)
+
+class TestPipelineCoalescing:
+    """Test that identical concurrent pipeline runs execute once."""
+
+    @pytest.fixture
+    def executed(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(cm, "CACHE_DIR", str(tmp_path / "cache"))
+        (tmp_path / "calc.py").write_text("def add(a, b):\n    return a + b\n")
+        monkeypatch.setattr(pr, "get_change_set", lambda: ChangeSet({"calc.py": None}))
+
+        executed = []
+
+        def slow_run_tests(tests, *args, fail_fast=False, **kwargs):
+            executed.append(list(tests))
+            time.sleep(0.2)
+            if fail_fast:
+                # Stops at the first test and reports the rest as skipped
+                return {t: {"test": t, "status": "skipped" if i else "failed", "duration": 0.1}
+                        for i, t in enumerate(tests)}
+            return {t: {"test": t, "status": "passed", "duration": 0.1} for t in tests}
+
+        monkeypatch.setattr(pr, "run_tests", slow_run_tests)
+        return executed
+
+    def test_identical_runs_execute_once(self, executed):
+        test_map = {"test_calc.py": ["calc.py"]}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(pr.run_pipeline(test_map, {}, language_aware=False)))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        assert executed == [["test_calc.py"]]
+        assert len(results) == 3
+        assert all(r["tests"] == ["test_calc.py"] for r in results)
+        assert sum(1 for r in results if r.get("coalesced")) == 2
+
+        # A later run is served from the cache the first run saved
+        assert pr.run_pipeline(test_map, {}, language_aware=False)["cache_hit"] is True
+        assert len(executed) == 1
+
+    def test_fail_fast_runs_are_not_shared_with_full_runs(self, executed):
+        test_map = {"test_calc.py": ["calc.py"], "test_calc_edge.py": ["calc.py"]}
+        results = {}
+        threads = [
+            threading.Thread(target=lambda f=fail_fast: results.__setitem__(
+                f, pr.run_pipeline(test_map, {}, language_aware=False, fail_fast=f)))
+            for fail_fast in (True, False)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        assert len(executed) == 2
+        assert not any(r.get("coalesced") for r in results.values())
+        assert results[False]["summary"]["success"]
+        assert "skipped" not in {r["status"] for r in results[False]["results"].values()}
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,112 @@
+"""
+Unit tests for the warm worker pool.
+"""
+
+import os
+import sys
+import time
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ci_engine import warm_pool
+from ci_engine.executor import run_tests, RunControl
+from ci_engine.warm_pool import WarmPool, preload_modules
+
+pytestmark = pytest.mark.skipif(not warm_pool.available(), reason="warm workers need fork")
+
+@pytest.fixture
+def project(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "tests").mkdir()
+    (tmp_path / "src" / "__init__.py").write_text("")
+    (tmp_path / "src" / "registry.py").write_text("ENTRIES = []\n")
+    # Each test mutates the shared module; forks keep that from leaking
+    for name in ("first", "second"):
+        (tmp_path / "tests" / f"test_{name}.py").write_text(
+            "from src.registry import ENTRIES\n\n"
+            "def test_starts_empty():\n"
+            "    ENTRIES.append(1)\n"
+            "    assert ENTRIES == [1]\n"
+        )
+    (tmp_path / "tests" / "test_broken.py").write_text("def test_broken():\n    assert False\n")
+    (tmp_path / "tests" / "test_slow.py").write_text("import time\n\ndef test_slow():\n    time.sleep(60)\n")
+    (tmp_path / "tests" / "test_no_alarm.py").write_text(
+        "import signal, time\n\ndef test_no_alarm():\n"
+        "    signal.signal(signal.SIGALRM, signal.SIG_IGN)\n    time.sleep(60)\n"
+    )
+    (tmp_path / "tests" / "test_large.py").write_text(
+        "def test_large():\n    data = bytearray(300 * 1024 * 1024)\n    assert len(data)\n"
+    )
+    return tmp_path
+
+class TestWarmExecution:
+    """Test running tests through warm workers."""
+
+    def test_matches_cold_results(self, project):
+        tests = ["test_first.py", "test_second.py", "test_broken.py"]
+        test_dir = str(project / "tests")
+        warm = run_tests(tests, test_dir, max_workers=1, mode="warm")
+        cold = run_tests(tests, test_dir, max_workers=1, mode="process")
+
+        assert {t: r["status"] for t, r in warm.items()} == {t: r["status"] for t, r in cold.items()}
+        assert warm["test_first.py"]["status"] == "passed"
+        assert warm["test_broken.py"]["returncode"] == 1
+        assert "1 passed" in warm["test_second.py"]["output"]
+
+    def test_timeout(self, project):
+        results = run_tests(["test_slow.py"], str(project / "tests"), timeout=0.5, mode="warm")
+        assert results["test_slow.py"]["status"] == "timeout"
+
+    def test_timeout_without_alarm(self, project, monkeypatch):
+        monkeypatch.setattr(warm_pool, "WARM_TIMEOUT_GRACE", 0.5)
+        start = time.time()
+        results = run_tests(["test_no_alarm.py"], str(project / "tests"), timeout=0.5, mode="warm")
+        assert results["test_no_alarm.py"]["status"] == "timeout"
+        assert time.time() - start < 30
+
+    def test_fail_fast_kills_workers(self, project):
+        start = time.time()
+        results = run_tests(["test_broken.py", "test_slow.py"], str(project / "tests"),
+                            max_workers=2, fail_fast=True, mode="warm")
+        assert time.time() - start < 30
+        assert results["test_slow.py"]["status"] == "skipped"
+
+class TestWarmPool:
+    """Test worker reuse and recycling."""
+
+    def run_all(self, pool, project, tests):
+        control = RunControl()
+        return [pool.run(t, os.path.join("tests", t), 30, control) for t in tests]
+
+    def test_workers_are_reused(self, project):
+        with WarmPool(str(project), ["src.registry"]) as pool:
+            records = self.run_all(pool, project, ["test_first.py", "test_second.py", "test_first.py"])
+            assert [r["status"] for r in records] == ["passed"] * 3
+            assert pool.started == 1
+
+    def test_workers_recycle_after_max_tests(self, project):
+        with WarmPool(str(project), [], max_tests=2) as pool:
+            records = self.run_all(pool, project, ["test_first.py"] * 5)
+            assert [r["status"] for r in records] == ["passed"] * 5
+            assert pool.started == 3
+
+    def test_workers_recycle_over_memory_limit(self, project):
+        with WarmPool(str(project), [], max_rss_mb=1) as pool:
+            self.run_all(pool, project, ["test_first.py", "test_second.py"])
+            assert pool.started == 2
+
+    def test_workers_recycle_after_large_test(self, project):
+        # Forked tests' memory counts, not only the worker's own
+        with WarmPool(str(project), [], max_rss_mb=200) as pool:
+            records = self.run_all(pool, project, ["test_first.py", "test_large.py", "test_first.py"])
+            assert [r["status"] for r in records] == ["passed"] * 3
+            assert pool.started == 2
+
+    def test_preload_modules(self, project):
+        paths = [str(project / "tests" / "test_first.py"), str(project / "tests" / "test_missing.py")]
+        assert preload_modules(paths) == ["src.registry", "src.registry.ENTRIES"]
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,282 @@
+"""
+Warm worker pool for Python test files.
+Each worker imports pytest and the modules the tests import once, then
+forks a fresh child per test file, so every test starts from the same
+warm, unmodified interpreter state without paying for imports again.
+Workers are replaced after a number of tests or once a test's process
+grows past a memory limit.
+
+Used by run_tests when CI_EXECUTOR=warm; POSIX only.
+"""
+
+import argparse
+import json
+import os
+import queue
+import resource
+import select
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ci_engine.dependency_graph import parse_file_imports
+from ci_engine.executor import MAX_OUTPUT_CHARS, skipped_result
+
+# A worker is replaced after running this many test files...
+WARM_MAX_TESTS = int(os.environ.get("CI_WARM_MAX_TESTS", "200"))
+# ...or once it, or a test forked from it, peaks above this many megabytes
+WARM_MAX_RSS_MB = int(os.environ.get("CI_WARM_MAX_RSS_MB", "1024"))
+
+# Seconds past a test's timeout before an unanswering worker is killed;
+# covers tests that block or ignore the SIGALRM the forked child sets
+WARM_TIMEOUT_GRACE = 5
+
+_PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def available():
+    """Whether warm workers can run here; they rely on fork."""
+    return hasattr(os, "fork") and sys.platform != "win32"
+
+def preload_modules(test_paths):
+    """Modules imported by the given test files, in first-seen order."""
+    modules = {}
+    for path in test_paths:
+        try:
+            _, imports = parse_file_imports(path, os.path.basename(path))
+        except OSError:
+            continue
+        modules.update(dict.fromkeys(imports))
+    return list(modules)
+
+def _rss_bytes(usage):
+    # Peak RSS: kilobytes on Linux, bytes on macOS
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+def _preload(modules):
+    import importlib
+    import pytest  # noqa: F401
+
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            # "from pkg import name" also lists pkg.name, which may not be a module
+            pass
+
+def _run_forked(test_path, timeout):
+    """Run one test file in a forked child.
+
+    Returns (status, returncode, output, duration, peak RSS in bytes).
+    """
+    with tempfile.TemporaryFile() as capture:
+        start = time.time()
+        pid = os.fork()
+        if pid == 0:
+            returncode = 3
+            try:
+                os.dup2(capture.fileno(), 1)
+                os.dup2(capture.fileno(), 2)
+                signal.setitimer(signal.ITIMER_REAL, timeout)
+                import pytest
+                returncode = int(pytest.main(["-q", "-p", "no:cacheprovider", test_path]))
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(returncode)
+
+        _, wait_status, usage = os.wait4(pid, 0)
+        duration = time.time() - start
+        capture.seek(0)
+        output = capture.read().decode(errors="replace")[-MAX_OUTPUT_CHARS:]
+
+    if os.WIFSIGNALED(wait_status) and os.WTERMSIG(wait_status) == signal.SIGALRM:
+        return "timeout", None, output, duration, _rss_bytes(usage)
+    returncode = os.waitstatus_to_exitcode(wait_status)
+    return ("passed" if returncode == 0 else "failed"), returncode, output, duration, _rss_bytes(usage)
+
+def _worker_main(args):
+    """Worker process: preload, then answer one JSON request per line."""
+    replies = os.fdopen(os.dup(1), "w", buffering=1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    # Keep import-time prints out of the protocol stream
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+
+    config = json.loads(sys.stdin.readline() or "{}")
+    _preload(config.get("preload", ()))
+    replies.write(json.dumps({"ready": True}) + "\n")
+
+    max_rss = args.max_rss_mb * 1024 * 1024
+    ran = 0
+    for line in sys.stdin:
+        request = json.loads(line)
+        status, returncode, output, duration, peak = _run_forked(request["test"], request["timeout"])
+        ran += 1
+        # Tests run in forked children, so their memory never shows in
+        # the worker's own usage
+        peak = max(peak, _rss_bytes(resource.getrusage(resource.RUSAGE_SELF)))
+        recycle = ran >= args.max_tests or peak > max_rss
+        replies.write(json.dumps({
+            "status": status, "returncode": returncode, "output": output, "duration": duration, "recycle": recycle
+        }) + "\n")
+        if recycle:
+            break
+    return 0
+
+class WarmWorker:
+    """One worker process, driven over its stdin and stdout."""
+
+    def __init__(self, cwd, preload, max_tests=WARM_MAX_TESTS, max_rss_mb=WARM_MAX_RSS_MB):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [_PACKAGE_ROOT, os.environ.get("PYTHONPATH")])))
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "ci_engine.warm_pool", "worker",
+             "--max-tests", str(max_tests), "--max-rss-mb", str(max_rss_mb)],
+            cwd=cwd, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+            # Its own process group, so a kill also reaches the forked test
+            start_new_session=True
+        )
+        self.alive = self._send({"preload": preload}) and self._receive() is not None
+
+    def _send(self, message):
+        try:
+            self.proc.stdin.write(json.dumps(message) + "\n")
+            self.proc.stdin.flush()
+            return True
+        except (BrokenPipeError, OSError):
+            return False
+
+    def _receive(self, timeout=None):
+        # Replies are single lines sent only on request, so nothing is
+        # left buffered between them and select sees every one
+        if timeout is not None and not select.select([self.proc.stdout], [], [], timeout)[0]:
+            raise TimeoutError
+        line = self.proc.stdout.readline()
+        return json.loads(line) if line else None
+
+    def run(self, test_path, timeout):
+        """Run a test file; returns the reply, or None if the worker died.
+
+        A worker that does not answer within the timeout and
+        WARM_TIMEOUT_GRACE is killed and the test reported as a timeout.
+        """
+        start = time.time()
+        try:
+            reply = self._send({"test": test_path, "timeout": timeout}) and self._receive(timeout + WARM_TIMEOUT_GRACE)
+        except TimeoutError:
+            self.kill()
+            reply = {"status": "timeout", "returncode": None, "duration": time.time() - start, "recycle": True,
+                     "output": f"no result from warm worker after {timeout + WARM_TIMEOUT_GRACE}s"}
+        if not reply or reply.get("recycle"):
+            self.alive = False
+        return reply or None
+
+    def kill(self):
+        # A reaped pid may already belong to another process
+        if self.proc.poll() is None:
+            try:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.kill()
+            self.proc.wait()
+        self.proc.stdout.close()
+
+class WarmPool:
+    """Warm workers for one run, checked out by the executor's threads.
+
+    Workers start on demand, so a run starts at most as many as it has
+    threads, and are closed with the pool. Sources are imported when a
+    worker starts, so a pool must not outlive the run it was made for.
+    """
+
+    def __init__(self, cwd, preload, max_tests=WARM_MAX_TESTS, max_rss_mb=WARM_MAX_RSS_MB):
+        self.cwd = cwd
+        self.preload = preload
+        self.max_tests = max_tests
+        self.max_rss_mb = max_rss_mb
+        self.started = 0
+        self._idle = queue.SimpleQueue()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        worker = WarmWorker(self.cwd, self.preload, self.max_tests, self.max_rss_mb)
+        with self._lock:
+            self.started += 1
+            self._all.append(worker)
+        return worker
+
+    def run(self, test, test_path, timeout, control):
+        """Run one test file on a warm worker; same record as a cold run."""
+        start = time.time()
+        worker = self._checkout()
+        if not worker.alive:
+            worker.close()
+            return {"test": test, "status": "error", "duration": time.time() - start,
+                    "returncode": None, "output": "warm worker failed to start"}
+        if not control.track(worker.proc, worker.kill):
+            self._idle.put(worker)
+            return skipped_result(test)
+
+        reply = worker.run(test_path, timeout)
+        killed = control.release(worker.proc)
+        if worker.alive:
+            self._idle.put(worker)
+        else:
+            worker.close()
+        if killed:
+            return skipped_result(test)
+        if reply is None:
+            return {"test": test, "status": "error", "duration": time.time() - start,
+                    "returncode": None, "output": "warm worker exited unexpectedly"}
+        return {
+            "test": test,
+            "status": reply["status"],
+            # The test's own time; worker start-up is not counted
+            "duration": reply["duration"],
+            "returncode": reply["returncode"],
+            "output": reply["output"]
+        }
+
+    def close(self):
+        with self._lock:
+            workers, self._all = self._all, []
+        for worker in workers:
+            worker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="HybridCI warm test worker")
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker = commands.add_parser("worker", help="run test files sent on stdin")
+    worker.add_argument("--max-tests", type=int, default=WARM_MAX_TESTS)
+    worker.add_argument("--max-rss-mb", type=int, default=WARM_MAX_RSS_MB)
+    args = parser.parse_args()
+    sys.exit(_worker_main(args))
+
+if __name__ == "__main__":
+    main()
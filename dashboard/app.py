@@ -5,90 +5,215 @@ from pathlib import Path
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, render_template, jsonify, request, stream_with_context
 from ci_engine.pipeline_runner import run_pipeline
 from ci_engine.cache_manager import get_cache_stats
 from ci_engine.language_utils import get_language_stats, get_changed_languages
-from dashboard.models import init_db, store_run_result, get_runs, get_cache_statistics
-import sqlite3
+from ci_engine import daemon
+from ci_engine.change_detector import get_change_set
+from ci_engine.ibst import select_tests
+from dashboard.jobs import JobQueue, QueueFull
+from dashboard.models import (
+    init_db, store_run_result, get_test_stats, iter_runs, get_runs_page, get_cache_statistics,
+    get_run_series, get_run_averages, ROLLUP_PERIODS, RUNS_PAGE_SIZE
+)
 import json
 
 app = Flask(__name__)
 init_db()
 # -------- IBST INPUT DATA --------
 
-from ci_engine.test_mapper import generate_test_map
+from ci_engine.coverage_mapper import load_test_map
+from ci_engine.dependency_graph import build_dependency_graph
 
-TEST_MAP = generate_test_map(
-    "sample_repo/tests",
-    "sample_repo/src"
-)
+TEST_DIR = "sample_repo/tests"
+SRC_DIR = "sample_repo/src"
+
+# Naming convention by default; CI_TEST_MAP=coverage traces the suite
+TEST_MAP = load_test_map(TEST_DIR, SRC_DIR)
+DEP_GRAPH = build_dependency_graph(SRC_DIR)
+
+# Largest page the runs endpoints will return
+MAX_RUNS_PAGE = 1000
+
+# Seconds between keepalive comments on idle event streams
+SSE_KEEPALIVE_SECONDS = 15
 
+JOBS = JobQueue()
 
-DEP_GRAPH = {
-    "main.py": []
-}
+def run_and_store(progress=None, fail_fast=False):
+    """Run the pipeline, record it in the run history and return the /run payload."""
+    result = run_pipeline(TEST_MAP, DEP_GRAPH, language_aware=True, test_dir=TEST_DIR, progress=progress,
+                          test_stats=get_test_stats(), fail_fast=fail_fast)
+
+    # Store result with language information
+    store_run_result(
+        len(result["tests"]),
+        float(result["time"]),
+        int(result["cache_hit"]),
+        mode=result.get("mode", "hybrid"),
+        languages=result.get("languages"),
+        language_breakdown=result.get("language_breakdown"),
+        test_results=result.get("results")
+    )
+
+    return {
+        "status": "success",
+        "tests": result["tests"],
+        "time": result["time"],
+        "cache_hit": result["cache_hit"],
+        "mode": result.get("mode"),
+        "languages": result.get("languages"),
+        "language_breakdown": result.get("language_breakdown"),
+        "summary": result.get("summary"),
+        "results": result.get("results"),
+        "first_failure": result.get("first_failure")
+    }
 
 @app.route("/run")
 def run_ci():
-    print("TEST_MAP:", TEST_MAP)
+    """Queue a pipeline run and return its job id.
 
+    With ?wait=1 the request blocks until the run finishes and returns
+    its result directly. With ?fail_fast=1 the run stops at the first
+    failing test.
+    """
     try:
-        result = run_pipeline(TEST_MAP, DEP_GRAPH, language_aware=True)
-
-        # Store result with language information
-        languages = result.get("languages")
-        language_breakdown = result.get("language_breakdown")
-        store_run_result(
-            len(result["tests"]),
-            float(result["time"]),
-            int(result["cache_hit"]),
-            mode=result.get("mode", "hybrid"),
-            languages=json.dumps(languages) if languages else None,
-            language_breakdown=json.dumps(language_breakdown) if language_breakdown else None
-        )
-
-        return jsonify({
-            "status": "success",
-            "tests": result["tests"],
-            "time": result["time"],
-            "cache_hit": result["cache_hit"],
-            "mode": result.get("mode"),
-            "languages": result.get("languages"),
-            "language_breakdown": result.get("language_breakdown")
-        })
-
-    except Exception as e:
-        print("ERROR IN /run:", e)
-        return jsonify({
-            "status": "error",
-            "message": str(e)
-        }), 500
+        job = JOBS.submit(run_and_store, fail_fast=bool(request.args.get("fail_fast")))
+    except QueueFull as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
+
+    if request.args.get("wait"):
+        job.wait()
+        if job.state == "failed":
+            return jsonify({"status": "error", "message": job.error}), 500
+        return jsonify(job.result)
+
+    return jsonify({
+        "status": "queued",
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events"
+    }), 202
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    """Status, progress counts and, once finished, the result of a run."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "unknown job"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    """Stream a job's progress events as Server-Sent Events.
+
+    The stream ends after the job's final event. Reconnecting clients
+    resume after the Last-Event-ID header (or ?last_id=).
+    """
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "unknown job"}), 404
+    try:
+        last_id = int(request.headers.get("Last-Event-ID") or request.args.get("last_id", 0))
+    except ValueError:
+        return jsonify({"status": "error", "message": "invalid last event id"}), 400
+
+    def generate():
+        seen = last_id
+        while True:
+            events = job.events_after(seen, timeout=SSE_KEEPALIVE_SECONDS)
+            if not events:
+                if job.done:
+                    return
+                yield ": keepalive\n\n"
+                continue
+            for event in events:
+                seen = event["id"]
+                yield f"id: {seen}\nevent: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _run_filters(args):
+    """Parse limit, cursor and filters for the runs endpoints.
 
+    Raises ValueError on malformed values.
+    """
+    limit = min(max(int(args.get("limit", RUNS_PAGE_SIZE)), 1), MAX_RUNS_PAGE)
+    filters = {
+        "before": int(args["before"]) if args.get("before") else None,
+        "mode": args.get("mode") or None,
+        "language": args.get("language") or None,
+        "since": float(args["since"]) if args.get("since") else None,
+        "until": float(args["until"]) if args.get("until") else None,
+        "cache_hit": None
+    }
+    cache_hit = args.get("cache_hit", "").lower()
+    if cache_hit in ("1", "true", "yes"):
+        filters["cache_hit"] = 1
+    elif cache_hit in ("0", "false", "no"):
+        filters["cache_hit"] = 0
+    elif cache_hit:
+        raise ValueError(f"invalid cache_hit: {cache_hit}")
+    return limit, filters
 
 @app.route("/runs")
 def runs():
-    rows = get_runs()
-    
-    # Parse language data for display
-    runs_formatted = []
-    for r in rows:
-        run_data = {
-            "id": r[0],
-            "tests_run": r[1],
-            "time_taken": r[2],
-            "cache_hit": r[3],
-            "mode": r[4],
-            "languages": r[5],
-            "language_breakdown": r[6]
-        }
-        runs_formatted.append(run_data)
-
-    return render_template("runs.html", runs=runs_formatted)
+    try:
+        limit, filters = _run_filters(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    page = get_runs_page(limit, **filters)
+    # Page links keep the current filters
+    first_args = {k: v for k, v in request.args.items() if k != "before"}
+    next_args = None
+    if page["next_cursor"] is not None:
+        next_args = dict(first_args, before=page["next_cursor"])
+
+    return render_template(
+        "runs.html",
+        runs=page["runs"],
+        first_args=first_args,
+        next_args=next_args,
+        filters=request.args
+    )
+
+@app.route("/api/runs")
+def runs_api():
+    """Keyset-paginated run history as streamed JSON.
+
+    Query parameters: limit, before (cursor from next_cursor), mode,
+    cache_hit, language, since and until (Unix timestamps).
+    """
+    try:
+        limit, filters = _run_filters(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    def generate():
+        yield '{"runs": ['
+        count = 0
+        next_cursor = None
+        # One extra row tells whether another page exists
+        for run in iter_runs(limit=limit + 1, **filters):
+            if count == limit:
+                next_cursor = last_id
+                break
+            yield ("," if count else "") + json.dumps(run)
+            last_id = run["id"]
+            count += 1
+        yield '], "next_cursor": ' + json.dumps(next_cursor) + '}'
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
 
 @app.route("/baseline")
 def run_baseline():
-    result = run_pipeline(TEST_MAP, DEP_GRAPH, baseline=True)
+    result = run_pipeline(TEST_MAP, DEP_GRAPH, baseline=True, test_dir=TEST_DIR)
     return jsonify(result)
 
 @app.route("/cache-stats")
@@ -113,31 +238,47 @@ def cache_stats():
 
 @app.route("/")
 def index():
-    conn = sqlite3.connect("ci.db")
-    c = conn.cursor()
-    c.execute("SELECT time_taken, tests_run FROM runs")
-    data = c.fetchall()
-
-    times = [r[0] for r in data]
-    tests = [r[1] for r in data]
+    period = request.args.get("period", "hour")
+    # The page falls back to hourly points; /api/run-series rejects unknown periods
+    series = get_run_series(period=period if period in ROLLUP_PERIODS else "hour")
 
-    c.execute("SELECT AVG(time_taken), AVG(tests_run) FROM runs")
-    avg_time, avg_tests = c.fetchone()
+    avg_time, avg_tests = get_run_averages()
     
     # Get cache statistics
     cache_stats = get_cache_statistics()
     
-    conn.close()
-    
     return render_template(
         "index.html",
         avg_time=avg_time,
         avg_tests=avg_tests,
-        times=times,
-        tests=tests,
+        series=series,
         cache_stats=cache_stats
     )
 
+@app.route("/api/run-series")
+def run_series():
+    """Downsampled run time series for charts (period=hour|day, optional mode)."""
+    period = request.args.get("period", "hour")
+    if period not in ROLLUP_PERIODS:
+        return jsonify({"status": "error", "message": f"unknown period: {period}"}), 400
+    return jsonify(get_run_series(period=period, mode=request.args.get("mode")))
+
+@app.route("/api/selection")
+def selection():
+    """Tests the next run would select, from the watch daemon when it is running."""
+    try:
+        return jsonify(dict(daemon.query("select"), source="daemon"))
+    except (OSError, daemon.DaemonError):
+        pass
+    change_set = get_change_set()
+    files = change_set.files if change_set is not None else sorted(TEST_MAP.reverse_index)
+    return jsonify({
+        "changed": files,
+        "tests": sorted(select_tests(files, DEP_GRAPH, TEST_MAP)),
+        "detected": change_set is not None,
+        "source": "direct"
+    })
+
 if __name__ == "__main__":
     app.run(debug=True)
 
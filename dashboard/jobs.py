@@ -0,0 +1,160 @@
+"""
+Background job queue for dashboard pipeline runs.
+Jobs run on a bounded worker pool; each keeps a log of progress events
+that clients can poll or stream while it runs.
+"""
+
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Pipelines run concurrently by one dashboard process
+JOB_WORKERS = int(os.environ.get("CI_JOB_WORKERS", "2"))
+
+# Jobs waiting for a worker before new submissions are rejected
+MAX_QUEUED_JOBS = int(os.environ.get("CI_MAX_QUEUED_JOBS", "32"))
+
+# Finished jobs kept for status queries; the oldest are dropped first
+MAX_FINISHED_JOBS = 200
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while MAX_QUEUED_JOBS are waiting."""
+
+class Job:
+    """One queued pipeline run and its progress events.
+
+    Events are numbered from 1 so a client can resume a stream with the
+    last id it saw.
+    """
+
+    def __init__(self, job_id, name):
+        self.id = job_id
+        self.name = name
+        self.state = "queued"
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.events = []
+        # Reentrant, as state changes publish while holding it
+        self._cond = threading.Condition(threading.RLock())
+
+    @property
+    def done(self):
+        return self.state in ("succeeded", "failed")
+
+    def publish(self, event):
+        """Append a progress event and wake any waiting readers."""
+        with self._cond:
+            event = dict(event, id=len(self.events) + 1, time=time.time())
+            self.events.append(event)
+            self._cond.notify_all()
+
+    def _set_state(self, state, **fields):
+        with self._cond:
+            self.state = state
+            for name, value in fields.items():
+                setattr(self, name, value)
+            # Published under the same lock so readers never see a
+            # finished job without its final event
+            self.publish({"event": state})
+
+    def events_after(self, last_id=0, timeout=None):
+        """Events with an id above last_id, waiting up to timeout for new ones.
+
+        Returns an empty list on timeout or when the job is done and no
+        events remain.
+        """
+        with self._cond:
+            if len(self.events) <= last_id and not self.done:
+                self._cond.wait(timeout)
+            return self.events[last_id:]
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; returns whether it did."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while not self.done:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def to_dict(self, include_result=True):
+        with self._cond:
+            events = list(self.events)
+        tests = [e for e in events if e["event"] == "test"]
+        selected = sum(len(e["tests"]) for e in events if e["event"] == "selected")
+        data = {
+            "id": self.id,
+            "name": self.name,
+            "status": self.state,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "progress": {"completed": len(tests), "selected": selected},
+            "error": self.error
+        }
+        if include_result and self.done:
+            data["result"] = self.result
+        return data
+
+class JobQueue:
+    """Runs jobs on a fixed pool of worker threads and tracks them by id."""
+
+    def __init__(self, workers=JOB_WORKERS, max_queued=MAX_QUEUED_JOBS):
+        self.max_queued = max_queued
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ci-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._queued = 0
+
+    def submit(self, func, name="pipeline", **kwargs):
+        """Queue func(progress=job.publish, **kwargs) and return its Job.
+
+        The function's return value becomes job.result. Raises QueueFull
+        if too many jobs are already waiting for a worker.
+        """
+        with self._lock:
+            if self._queued >= self.max_queued:
+                raise QueueFull(f"{self._queued} jobs already queued")
+            self._queued += 1
+            job = Job(uuid.uuid4().hex, name)
+            self._jobs[job.id] = job
+            self._prune()
+        job.publish({"event": "queued"})
+        self._pool.submit(self._execute, job, func, kwargs)
+        return job
+
+    def _execute(self, job, func, kwargs):
+        with self._lock:
+            self._queued -= 1
+        job._set_state("running", started=time.time())
+        try:
+            result = func(progress=job.publish, **kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            job._set_state("failed", finished=time.time(), error=str(e))
+        else:
+            job._set_state("succeeded", finished=time.time(), result=result)
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.done]
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
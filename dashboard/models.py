@@ -1,56 +1,560 @@
+import atexit
+import json
+import logging
 import sqlite3
+import threading
+import time
+
+DB_PATH = "ci.db"
+
+# Buffered run results are committed once this many are queued...
+RUN_BATCH_SIZE = 50
+# ...or after this many seconds, whichever comes first
+RUN_FLUSH_INTERVAL = 1.0
+
+# Most points sent to a chart; older buckets are dropped
+MAX_CHART_POINTS = 200
+
+# Rollup periods and their bucket width in seconds
+ROLLUP_PERIODS = {"hour": 3600, "day": 86400}
+
+# Default number of runs per history page
+RUNS_PAGE_SIZE = 50
+
+# Runs are read from the database this many at a time when streaming
+RUNS_FETCH_SIZE = 200
+
+# Weight of the newest result in each test's moving averages
+STATS_SMOOTHING = 0.2
+
+# Most bound parameters per IN (...) list
+SQL_IN_CHUNK = 500
+
+INSERT_RUN_SQL = (
+    "INSERT INTO runs (tests_run, time_taken, cache_hit, mode, created_at) "
+    "VALUES (?, ?, ?, ?, ?)"
+)
+INSERT_RUN_LANGUAGE_SQL = "INSERT OR REPLACE INTO run_languages (run_id, language, tests) VALUES (?, ?, ?)"
+INSERT_TEST_RESULT_SQL = (
+    "INSERT OR IGNORE INTO test_results (run_id, test, status, duration, retries) VALUES (?, ?, ?, ?, ?)"
+)
+RUN_COLUMNS = ("id", "tests_run", "time_taken", "cache_hit", "mode", "created_at")
+SELECT_TOTALS_SQL = "SELECT SUM(runs), SUM(cache_hits), SUM(total_time), SUM(total_tests) FROM run_totals"
+SELECT_TOTALS_BY_MODE_SQL = "SELECT mode, runs, cache_hits, total_time, total_tests FROM run_totals"
+SELECT_RUN_SERIES_SQL = (
+    "SELECT bucket, SUM(runs), SUM(cache_hits), SUM(total_time), SUM(total_tests), MIN(min_time), MAX(max_time) "
+    "FROM run_rollups WHERE period = ? GROUP BY bucket ORDER BY bucket DESC LIMIT ?"
+)
+SELECT_RUN_SERIES_MODE_SQL = (
+    "SELECT bucket, runs, cache_hits, total_time, total_tests, min_time, max_time "
+    "FROM run_rollups WHERE period = ? AND mode = ? ORDER BY bucket DESC LIMIT ?"
+)
+
+# Aggregates maintained by triggers on every insert into runs
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS run_rollups (
+    period TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    mode TEXT NOT NULL,
+    runs INTEGER NOT NULL,
+    cache_hits INTEGER NOT NULL,
+    total_time REAL NOT NULL,
+    total_tests INTEGER NOT NULL,
+    min_time REAL,
+    max_time REAL,
+    PRIMARY KEY (period, bucket, mode)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS run_totals (
+    mode TEXT PRIMARY KEY,
+    runs INTEGER NOT NULL,
+    cache_hits INTEGER NOT NULL,
+    total_time REAL NOT NULL,
+    total_tests INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS runs_rollup AFTER INSERT ON runs BEGIN
+    INSERT INTO run_rollups VALUES (
+        'hour', CAST(NEW.created_at / 3600 AS INTEGER) * 3600, COALESCE(NEW.mode, 'hybrid'),
+        1, COALESCE(NEW.cache_hit, 0), COALESCE(NEW.time_taken, 0), COALESCE(NEW.tests_run, 0),
+        NEW.time_taken, NEW.time_taken
+    ) ON CONFLICT (period, bucket, mode) DO UPDATE SET
+        runs = runs + 1, cache_hits = cache_hits + excluded.cache_hits,
+        total_time = total_time + excluded.total_time, total_tests = total_tests + excluded.total_tests,
+        min_time = MIN(COALESCE(min_time, excluded.min_time), excluded.min_time),
+        max_time = MAX(COALESCE(max_time, excluded.max_time), excluded.max_time);
+    INSERT INTO run_rollups VALUES (
+        'day', CAST(NEW.created_at / 86400 AS INTEGER) * 86400, COALESCE(NEW.mode, 'hybrid'),
+        1, COALESCE(NEW.cache_hit, 0), COALESCE(NEW.time_taken, 0), COALESCE(NEW.tests_run, 0),
+        NEW.time_taken, NEW.time_taken
+    ) ON CONFLICT (period, bucket, mode) DO UPDATE SET
+        runs = runs + 1, cache_hits = cache_hits + excluded.cache_hits,
+        total_time = total_time + excluded.total_time, total_tests = total_tests + excluded.total_tests,
+        min_time = MIN(COALESCE(min_time, excluded.min_time), excluded.min_time),
+        max_time = MAX(COALESCE(max_time, excluded.max_time), excluded.max_time);
+    INSERT INTO run_totals VALUES (
+        COALESCE(NEW.mode, 'hybrid'), 1, COALESCE(NEW.cache_hit, 0),
+        COALESCE(NEW.time_taken, 0), COALESCE(NEW.tests_run, 0)
+    ) ON CONFLICT (mode) DO UPDATE SET
+        runs = runs + 1, cache_hits = cache_hits + excluded.cache_hits,
+        total_time = total_time + excluded.total_time, total_tests = total_tests + excluded.total_tests;
+END;
+"""
+
+# Per-run languages, normalized out of the runs table so history can be
+# filtered by language through an index
+RUN_LANGUAGES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS run_languages (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    language TEXT NOT NULL,
+    tests INTEGER,
+    PRIMARY KEY (run_id, language)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS run_languages_language ON run_languages (language, run_id);
+"""
+
+# Per-test outcomes of executed (not cached) tests
+TEST_RESULTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS test_results (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    test TEXT NOT NULL,
+    status TEXT NOT NULL,
+    duration REAL,
+    retries INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (run_id, test)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS test_results_test ON test_results (test, run_id);
+"""
+
+# Exponentially weighted averages per test, folded in by a trigger on
+# every insert into test_results so readers never scan the history.
+# failure_rate tracks results that failed after any retries; flakiness
+# tracks results that only passed on a retry
+TEST_STATS_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS test_stats (
+    test TEXT PRIMARY KEY,
+    runs INTEGER NOT NULL,
+    duration REAL,
+    failure_rate REAL NOT NULL,
+    flakiness REAL NOT NULL,
+    last_run_id INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS test_results_stats AFTER INSERT ON test_results BEGIN
+    INSERT INTO test_stats VALUES (
+        NEW.test, 1, NEW.duration, NEW.status != 'passed', NEW.status = 'passed' AND NEW.retries > 0, NEW.run_id
+    ) ON CONFLICT (test) DO UPDATE SET
+        runs = runs + 1,
+        duration = COALESCE(duration + {STATS_SMOOTHING} * (excluded.duration - duration), duration, excluded.duration),
+        failure_rate = failure_rate + {STATS_SMOOTHING} * (excluded.failure_rate - failure_rate),
+        flakiness = flakiness + {STATS_SMOOTHING} * (excluded.flakiness - flakiness),
+        last_run_id = excluded.last_run_id;
+END;
+"""
+
+# One-time build of test_stats: re-inserting the history in run order
+# replays it through the trigger
+BACKFILL_TEST_STATS_SQL = """
+CREATE TEMP TABLE test_results_backfill AS SELECT * FROM test_results;
+DELETE FROM test_results;
+INSERT INTO test_results SELECT * FROM test_results_backfill ORDER BY run_id;
+DROP TABLE test_results_backfill;
+"""
+
+# Keyset pagination walks runs by descending id; every index also
+# carries the rowid, so each filter below is served in id order
+RUNS_INDEXES = """
+CREATE INDEX IF NOT EXISTS runs_mode ON runs (mode);
+CREATE INDEX IF NOT EXISTS runs_cache_hit ON runs (cache_hit);
+CREATE INDEX IF NOT EXISTS runs_created_at ON runs (created_at);
+"""
+
+# One-time rebuild of the aggregates from existing runs
+BACKFILL_ROLLUPS_SQL = """
+DELETE FROM run_rollups;
+DELETE FROM run_totals;
+INSERT INTO run_rollups
+    SELECT 'hour', CAST(created_at / 3600 AS INTEGER) * 3600, COALESCE(mode, 'hybrid'),
+           COUNT(*), COALESCE(SUM(cache_hit), 0), COALESCE(SUM(time_taken), 0), COALESCE(SUM(tests_run), 0),
+           MIN(time_taken), MAX(time_taken)
+    FROM runs GROUP BY 2, 3;
+INSERT INTO run_rollups
+    SELECT 'day', CAST(created_at / 86400 AS INTEGER) * 86400, COALESCE(mode, 'hybrid'),
+           COUNT(*), COALESCE(SUM(cache_hit), 0), COALESCE(SUM(time_taken), 0), COALESCE(SUM(tests_run), 0),
+           MIN(time_taken), MAX(time_taken)
+    FROM runs GROUP BY 2, 3;
+INSERT INTO run_totals
+    SELECT COALESCE(mode, 'hybrid'), COUNT(*), COALESCE(SUM(cache_hit), 0),
+           COALESCE(SUM(time_taken), 0), COALESCE(SUM(tests_run), 0)
+    FROM runs GROUP BY 1;
+"""
+
+_local = threading.local()
+
+def get_connection():
+    """Return this thread's connection to DB_PATH, opening it on first use.
+
+    Connections are reused across calls (sqlite3 keeps prepared
+    statements cached per connection) and run in WAL mode so readers do
+    not block the writer.
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(DB_PATH)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=30, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conns[DB_PATH] = conn
+    return conn
+
+def close_connection():
+    """Close this thread's connections."""
+    for conn in getattr(_local, "conns", {}).values():
+        conn.close()
+    _local.conns = {}
+
+logger = logging.getLogger(__name__)
+
+class RunWriter:
+    """Buffers run results and commits them in batches.
+
+    A batch is written when RUN_BATCH_SIZE results are queued or
+    RUN_FLUSH_INTERVAL seconds after the first queued result, in one
+    transaction, by a background thread that keeps its own connection.
+    A batch whose transaction fails stays queued for the next flush.
+    """
+
+    def __init__(self):
+        self._pending = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def add(self, row):
+        with self._cond:
+            self._pending.append(row)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="run-writer", daemon=True)
+                self._thread.start()
+            if len(self._pending) >= RUN_BATCH_SIZE:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                if len(self._pending) < RUN_BATCH_SIZE:
+                    self._cond.wait(RUN_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Writing run results failed; retrying in %ss", RUN_FLUSH_INTERVAL)
+                time.sleep(RUN_FLUSH_INTERVAL)
+
+    def flush(self):
+        """Write all queued results now."""
+        with self._flush_lock:
+            with self._cond:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return
+            try:
+                conn = get_connection()
+                with conn:
+                    language_rows = []
+                    test_rows = []
+                    for run, languages, tests in rows:
+                        run_id = conn.execute(INSERT_RUN_SQL, run).lastrowid
+                        language_rows.extend((run_id, lang, count) for lang, count in languages.items())
+                        test_rows.extend((run_id,) + test for test in tests)
+                    conn.executemany(INSERT_RUN_LANGUAGE_SQL, language_rows)
+                    conn.executemany(INSERT_TEST_RESULT_SQL, test_rows)
+            except Exception:
+                # The transaction rolled back; keep the batch ahead of newer results
+                with self._cond:
+                    self._pending[:0] = rows
+                raise
+
+_writer = RunWriter()
+atexit.register(_writer.flush)
+
+def flush_runs():
+    """Commit buffered run results so subsequent reads see them."""
+    _writer.flush()
 
 def init_db():
-    conn = sqlite3.connect("ci.db")
-    c = conn.cursor()
-    c.execute("""
+    conn = get_connection()
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS runs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             tests_run INTEGER,
             time_taken REAL,
             cache_hit INTEGER,
             mode TEXT DEFAULT 'hybrid',
-            languages TEXT,
-            language_breakdown TEXT
+            created_at REAL
         )
     """)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(runs)")}
+    if "created_at" not in columns:
+        # Runs recorded before timestamps existed are dated to the migration
+        conn.execute("ALTER TABLE runs ADD COLUMN created_at REAL")
+        conn.execute("UPDATE runs SET created_at = ?", (time.time(),))
     conn.commit()
-    conn.close()
-
-def store_run_result(tests_run, time_taken, cache_hit, mode='hybrid', languages=None, language_breakdown=None):
-    """Store a CI run result with language information."""
-    conn = sqlite3.connect("ci.db")
-    c = conn.cursor()
-    c.execute(
-        "INSERT INTO runs (tests_run, time_taken, cache_hit, mode, languages, language_breakdown) VALUES (?, ?, ?, ?, ?, ?)",
-        (tests_run, time_taken, cache_hit, mode, languages, language_breakdown)
-    )
-    conn.commit()
-    conn.close()
+
+    conn.executescript(RUN_LANGUAGES_SCHEMA + TEST_RESULTS_SCHEMA + RUNS_INDEXES)
+    if "languages" in columns:
+        _migrate_language_columns(conn)
+    if "retries" not in {row[1] for row in conn.execute("PRAGMA table_info(test_results)")}:
+        conn.execute("ALTER TABLE test_results ADD COLUMN retries INTEGER NOT NULL DEFAULT 0")
+        conn.commit()
+
+    has_test_stats = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'test_stats'"
+    ).fetchone()
+    conn.executescript(TEST_STATS_SCHEMA)
+    if not has_test_stats:
+        conn.executescript("BEGIN;" + BACKFILL_TEST_STATS_SQL + "COMMIT;")
+
+    has_rollups = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'run_totals'"
+    ).fetchone()
+    conn.executescript(ROLLUP_SCHEMA)
+    if not has_rollups:
+        conn.executescript("BEGIN;" + BACKFILL_ROLLUPS_SQL + "COMMIT;")
+
+def _migrate_language_columns(conn):
+    """Move the legacy JSON languages/language_breakdown columns into run_languages."""
+    rows = conn.execute(
+        "SELECT id, languages, language_breakdown FROM runs "
+        "WHERE languages IS NOT NULL OR language_breakdown IS NOT NULL"
+    ).fetchall()
+    if not rows:
+        return
+    language_rows = []
+    for run_id, languages, breakdown in rows:
+        try:
+            merged = _merge_languages(languages, breakdown)
+        except ValueError:
+            continue
+        language_rows.extend((run_id, lang, tests) for lang, tests in merged.items())
+    with conn:
+        conn.executemany(INSERT_RUN_LANGUAGE_SQL, language_rows)
+        conn.execute("UPDATE runs SET languages = NULL, language_breakdown = NULL")
+
+def _merge_languages(languages, language_breakdown):
+    """Return {language: tests or None} from a language list and per-language counts.
+
+    Either argument may be a JSON string, as stored by older versions.
+    """
+    if isinstance(languages, str):
+        languages = json.loads(languages)
+    if isinstance(language_breakdown, str):
+        language_breakdown = json.loads(language_breakdown)
+    merged = dict.fromkeys(languages or [])
+    merged.update(language_breakdown or {})
+    return merged
+
+def store_run_result(tests_run, time_taken, cache_hit, mode='hybrid', languages=None, language_breakdown=None,
+                     test_results=None):
+    """Store a CI run result with language information.
+
+    The row is buffered and committed with the next batch; triggers
+    update the hourly, daily and per-mode aggregates and the per-test
+    stats in the same commit. Languages are stored one row per language
+    in run_languages. test_results is the pipeline's {test: record};
+    records served from cache or skipped by fail-fast are left out, so
+    the stats only count tests that ran to completion.
+    """
+    run = (tests_run, time_taken, cache_hit, mode, time.time())
+    # A whole-run cache hit replays old records, which were stored already
+    tests = [] if cache_hit else [
+        (test, record.get("status", "passed"), record.get("duration"), record.get("retries", 0))
+        for test, record in (test_results or {}).items()
+        if not record.get("cached") and record.get("status") != "skipped"
+    ]
+    _writer.add((run, _merge_languages(languages, language_breakdown), tests))
+
+def get_test_stats(tests=None):
+    """{test: {"duration", "failure_rate", "flakiness", "runs"}} from test_stats.
+
+    duration is a moving average in seconds; failure_rate and flakiness
+    are moving averages between 0 and 1. Tests without history are left
+    out. This is the test_stats input of run_pipeline's prioritization.
+    """
+    flush_runs()
+    conn = get_connection()
+    sql = "SELECT test, duration, failure_rate, flakiness, runs FROM test_stats"
+    if tests is None:
+        rows = conn.execute(sql).fetchall()
+    else:
+        tests = sorted(set(tests))
+        rows = []
+        for i in range(0, len(tests), SQL_IN_CHUNK):
+            chunk = tests[i:i + SQL_IN_CHUNK]
+            rows.extend(conn.execute(f"{sql} WHERE test IN ({','.join('?' * len(chunk))})", chunk))
+    return {
+        test: {"duration": duration, "failure_rate": failure_rate, "flakiness": flakiness, "runs": runs}
+        for test, duration, failure_rate, flakiness, runs in rows
+    }
+
+def get_test_durations(tests=None):
+    """{test: seconds} of moving-average duration; tests without history are left out."""
+    return {test: stats["duration"] for test, stats in get_test_stats(tests).items() if stats["duration"] is not None}
+
+def _runs_query(limit, before, mode, cache_hit, language, since, until):
+    """Build the keyset query for iter_runs."""
+    if language is not None:
+        # Drive the scan from the (language, run_id) index
+        sql = (
+            "SELECT r.id, r.tests_run, r.time_taken, r.cache_hit, r.mode, r.created_at "
+            "FROM run_languages l JOIN runs r ON r.id = l.run_id WHERE l.language = ?"
+        )
+        params = [language]
+        id_column = "l.run_id"
+    else:
+        sql = "SELECT r.id, r.tests_run, r.time_taken, r.cache_hit, r.mode, r.created_at FROM runs r WHERE 1"
+        params = []
+        id_column = "r.id"
+    if before is not None:
+        sql += f" AND {id_column} < ?"
+        params.append(int(before))
+    if mode is not None:
+        sql += " AND r.mode = ?"
+        params.append(mode)
+    if cache_hit is not None:
+        sql += " AND r.cache_hit = ?"
+        params.append(int(cache_hit))
+    if since is not None:
+        sql += " AND r.created_at >= ?"
+        params.append(float(since))
+    if until is not None:
+        sql += " AND r.created_at < ?"
+        params.append(float(until))
+    sql += f" ORDER BY {id_column} DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    return sql, params
+
+def iter_runs(limit=None, before=None, mode=None, cache_hit=None, language=None, since=None, until=None):
+    """Yield runs newest first as dicts, optionally filtered.
+
+    before is a keyset cursor: only runs with a smaller id are returned,
+    so a page costs the same however deep into the history it is.
+    Runs are fetched RUNS_FETCH_SIZE at a time with their languages
+    loaded in one query per batch.
+    """
+    flush_runs()
+    conn = get_connection()
+    sql, params = _runs_query(limit, before, mode, cache_hit, language, since, until)
+    cursor = conn.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(RUNS_FETCH_SIZE)
+        if not rows:
+            return
+        runs = [dict(zip(RUN_COLUMNS, row)) for row in rows]
+        placeholders = ",".join("?" * len(runs))
+        by_run = {}
+        for run_id, lang, tests in conn.execute(
+            f"SELECT run_id, language, tests FROM run_languages WHERE run_id IN ({placeholders}) ORDER BY run_id, language",
+            [run["id"] for run in runs]
+        ):
+            by_run.setdefault(run_id, {})[lang] = tests
+        for run in runs:
+            languages = by_run.get(run["id"], {})
+            run["languages"] = list(languages) or None
+            run["language_breakdown"] = {
+                lang: tests for lang, tests in languages.items() if tests is not None
+            } or None
+            yield run
+
+def get_runs_page(limit=RUNS_PAGE_SIZE, before=None, **filters):
+    """Return one page of runs and the cursor for the next one.
+
+    Returns {"runs": [...], "next_cursor": id or None}; pass next_cursor
+    back as before to continue. Filters are those of iter_runs.
+    """
+    runs = list(iter_runs(limit=limit + 1, before=before, **filters))
+    next_cursor = None
+    if len(runs) > limit:
+        runs = runs[:limit]
+        next_cursor = runs[-1]["id"]
+    return {"runs": runs, "next_cursor": next_cursor}
 
 def get_runs(limit=None):
-    """Fetch recent runs from database."""
-    conn = sqlite3.connect("ci.db")
-    c = conn.cursor()
-    query = "SELECT id, tests_run, time_taken, cache_hit, mode, languages, language_breakdown FROM runs ORDER BY id DESC"
-    if limit:
-        query += f" LIMIT {limit}"
-    c.execute(query)
-    rows = c.fetchall()
-    conn.close()
-    return rows
+    """Fetch recent runs from database as tuples.
+
+    Languages are returned JSON-encoded as in the old runs columns.
+    """
+    return [
+        (
+            run["id"], run["tests_run"], run["time_taken"], run["cache_hit"], run["mode"],
+            json.dumps(run["languages"]) if run["languages"] else None,
+            json.dumps(run["language_breakdown"]) if run["language_breakdown"] else None
+        )
+        for run in iter_runs(limit=limit or None)
+    ]
+
+def get_run_series(period="hour", mode=None, points=MAX_CHART_POINTS):
+    """Downsampled run time series from the rollup tables, oldest first.
+
+    Each point is one hour or day bucket with run count and averages,
+    so chart size is bounded by points rather than by the run count.
+    """
+    if period not in ROLLUP_PERIODS:
+        raise ValueError(f"Unknown rollup period: {period}")
+    flush_runs()
+    conn = get_connection()
+    if mode:
+        rows = conn.execute(SELECT_RUN_SERIES_MODE_SQL, (period, mode, points)).fetchall()
+    else:
+        rows = conn.execute(SELECT_RUN_SERIES_SQL, (period, points)).fetchall()
+
+    series = []
+    for bucket, runs, hits, total_time, total_tests, min_time, max_time in reversed(rows):
+        series.append({
+            "bucket": bucket,
+            "runs": runs,
+            "cache_hits": hits,
+            "avg_time": total_time / runs if runs else 0,
+            "avg_tests": total_tests / runs if runs else 0,
+            "min_time": min_time,
+            "max_time": max_time
+        })
+    return series
+
+def get_run_averages():
+    """Average time taken and tests run across all runs."""
+    flush_runs()
+    runs, _, total_time, total_tests = get_connection().execute(SELECT_TOTALS_SQL).fetchone()
+    if not runs:
+        return None, None
+    return total_time / runs, total_tests / runs
 
 def get_cache_statistics():
-    """Get cache hit statistics."""
-    conn = sqlite3.connect("ci.db")
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*), SUM(cache_hit), AVG(time_taken) FROM runs")
-    total, hits, avg_time = c.fetchone()
-    conn.close()
-    
+    """Get cache hit statistics from the maintained totals."""
+    flush_runs()
+    conn = get_connection()
+    total, hits, total_time, _ = conn.execute(SELECT_TOTALS_SQL).fetchone()
+
+    by_mode = {}
+    for mode, runs, mode_hits, mode_time, mode_tests in conn.execute(SELECT_TOTALS_BY_MODE_SQL):
+        by_mode[mode] = {
+            "total_runs": runs,
+            "cache_hits": mode_hits,
+            "cache_hit_rate": (mode_hits / runs * 100) if runs else 0,
+            "avg_execution_time": mode_time / runs if runs else 0
+        }
+
     return {
         "total_runs": total or 0,
         "cache_hits": hits or 0,
         "cache_hit_rate": (hits / total * 100) if total else 0,
-        "avg_execution_time": avg_time or 0
+        "avg_execution_time": (total_time / total) if total else 0,
+        "by_mode": by_mode
     }
@@ -0,0 +1,43 @@
+"""
+Route tests for the dashboard app.
+"""
+
+import os
+import sys
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("flask")
+
+import dashboard.models as models
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # The app builds its test map from sample_repo relative to the repo root,
+    # and creates its database on import
+    monkeypatch.chdir(REPO_ROOT)
+    monkeypatch.setattr(models, "DB_PATH", str(tmp_path / "ci.db"))
+    from dashboard.app import app
+
+    models.init_db()
+    yield app.test_client()
+    models.flush_runs()
+    models.close_connection()
+
+class TestRunSeriesPeriods:
+    """Test that unknown rollup periods never reach the models."""
+
+    def test_index_falls_back_to_hourly(self, client):
+        assert client.get("/?period=week").status_code == 200
+
+    def test_api_rejects_unknown_period(self, client):
+        response = client.get("/api/run-series?period=week")
+        assert response.status_code == 400
+        assert response.get_json()["status"] == "error"
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,106 @@
+"""
+Unit tests for the dashboard job queue.
+"""
+
+import os
+import sys
+import threading
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dashboard.jobs import JobQueue, QueueFull
+
+@pytest.fixture
+def queue():
+    jobs = JobQueue(workers=2, max_queued=4)
+    yield jobs
+    jobs.shutdown()
+
+def fake_pipeline(progress, tests=("a", "b")):
+    progress({"event": "selected", "tests": list(tests)})
+    for test in tests:
+        progress({"event": "test", "test": test, "status": "passed"})
+    return {"tests": list(tests)}
+
+class TestJobQueue:
+    """Test job execution, status and progress events."""
+
+    def test_job_runs_and_records_events(self, queue):
+        job = queue.submit(fake_pipeline)
+        assert job.wait(5)
+
+        assert job.state == "succeeded"
+        assert job.result == {"tests": ["a", "b"]}
+        kinds = [e["event"] for e in job.events]
+        assert kinds == ["queued", "running", "selected", "test", "test", "succeeded"]
+        assert [e["id"] for e in job.events] == list(range(1, 7))
+        assert job.to_dict()["progress"] == {"completed": 2, "selected": 2}
+        assert queue.get(job.id) is job
+
+    def test_failure_is_reported(self, queue):
+        def broken(progress):
+            raise RuntimeError("boom")
+
+        job = queue.submit(broken)
+        job.wait(5)
+        assert job.state == "failed"
+        assert job.error == "boom"
+        assert job.to_dict()["error"] == "boom"
+
+    def test_events_resume_after_last_id(self, queue):
+        job = queue.submit(fake_pipeline)
+        job.wait(5)
+        assert [e["id"] for e in job.events_after(4)] == [5, 6]
+        assert job.events_after(6, timeout=0.01) == []
+
+    def test_stream_wakes_on_new_events(self, queue):
+        release = threading.Event()
+        started = threading.Event()
+
+        def slow(progress):
+            started.set()
+            release.wait(5)
+            progress({"event": "test", "test": "a", "status": "passed"})
+
+        job = queue.submit(slow)
+        started.wait(5)
+        seen = []
+        reader = threading.Thread(target=lambda: seen.extend(job.events_after(2, timeout=5)))
+        reader.start()
+        release.set()
+        reader.join(5)
+        assert seen and seen[0]["event"] == "test"
+
+    def test_bounded_queue(self):
+        jobs = JobQueue(workers=1, max_queued=1)
+        release = threading.Event()
+        started = threading.Event()
+
+        def blocker(progress):
+            started.set()
+            release.wait(5)
+
+        try:
+            jobs.submit(blocker)
+            started.wait(5)
+            jobs.submit(blocker)
+            with pytest.raises(QueueFull):
+                jobs.submit(blocker)
+        finally:
+            release.set()
+            jobs.shutdown()
+
+    def test_jobs_run_concurrently(self, queue):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def meet(progress):
+            barrier.wait()
+
+        first, second = queue.submit(meet), queue.submit(meet)
+        assert first.wait(5) and second.wait(5)
+        assert first.state == second.state == "succeeded"
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,356 @@
+"""
+Unit tests for dashboard run storage.
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dashboard.models as models
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(models, "DB_PATH", str(tmp_path / "ci.db"))
+    models.init_db()
+    yield
+    models.flush_runs()
+    models.close_connection()
+
+class TestRunStorage:
+    """Test buffered writes and pooled reads."""
+
+    def test_store_and_read_back(self, db):
+        models.store_run_result(3, 1.5, 0, mode="hybrid")
+        models.store_run_result(2, 0.5, 1, mode="language_aware", languages='["python"]')
+
+        rows = models.get_runs()
+        assert [r[1] for r in rows] == [2, 3]
+        assert rows[0][4] == "language_aware"
+        assert models.get_runs(limit=1)[0][1] == 2
+
+    def test_writes_are_batched(self, db, monkeypatch):
+        monkeypatch.setattr(models, "RUN_FLUSH_INTERVAL", 60)
+        models.store_run_result(1, 1.0, 0)
+        raw = models.get_connection().execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        assert raw == 0
+        models.flush_runs()
+        raw = models.get_connection().execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        assert raw == 1
+
+    def fail_first_transaction(self, monkeypatch):
+        real = models.get_connection
+        failures = []
+
+        class LockedOnce:
+            def __init__(self, conn):
+                self.conn = conn
+
+            def __enter__(self):
+                return self.conn.__enter__()
+
+            def __exit__(self, *exc):
+                return self.conn.__exit__(*exc)
+
+            def execute(self, *args):
+                if not failures:
+                    failures.append(args)
+                    raise sqlite3.OperationalError("database is locked")
+                return self.conn.execute(*args)
+
+            def executemany(self, *args):
+                return self.conn.executemany(*args)
+
+        monkeypatch.setattr(models, "get_connection", lambda: LockedOnce(real()))
+        return failures
+
+    def test_failed_flush_keeps_batch(self, db, monkeypatch):
+        monkeypatch.setattr(models, "RUN_FLUSH_INTERVAL", 60)
+        failures = self.fail_first_transaction(monkeypatch)
+        models.store_run_result(1, 1.0, 0, test_results={"test_a.py": {"status": "passed", "duration": 0.1}})
+        with pytest.raises(sqlite3.OperationalError):
+            models.flush_runs()
+        models.store_run_result(2, 1.0, 0)
+        models.flush_runs()
+
+        assert failures
+        assert [r[1] for r in models.get_runs()] == [2, 1]
+        assert models.get_test_stats()["test_a.py"]["runs"] == 1
+
+    def test_background_writer_survives_failure(self, db, monkeypatch):
+        monkeypatch.setattr(models, "RUN_FLUSH_INTERVAL", 0.05)
+        # A writer of its own, not one still waiting out another test's interval
+        monkeypatch.setattr(models, "_writer", models.RunWriter())
+        self.fail_first_transaction(monkeypatch)
+        models.store_run_result(1, 1.0, 0)
+
+        def stored():
+            with sqlite3.connect(models.DB_PATH) as conn:
+                return conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+        deadline = time.time() + 5
+        while stored() == 0 and time.time() < deadline:
+            time.sleep(0.02)
+        assert stored() == 1
+        assert models._writer._thread.is_alive()
+
+    def test_cache_statistics(self, db):
+        models.store_run_result(3, 2.0, 1)
+        models.store_run_result(3, 4.0, 0)
+        stats = models.get_cache_statistics()
+        assert stats["total_runs"] == 2
+        assert stats["cache_hits"] == 1
+        assert stats["cache_hit_rate"] == 50
+        assert stats["avg_execution_time"] == 3.0
+
+    def test_connection_reused_per_thread(self, db):
+        assert models.get_connection() is models.get_connection()
+        other = []
+        thread = threading.Thread(target=lambda: other.append(models.get_connection()))
+        thread.start()
+        thread.join()
+        assert other[0] is not models.get_connection()
+
+    def test_concurrent_writers(self, db):
+        threads = [
+            threading.Thread(target=lambda: [models.store_run_result(1, 0.1, 0) for _ in range(40)])
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert models.get_cache_statistics()["total_runs"] == 200
+
+    def test_by_mode_totals(self, db):
+        models.store_run_result(3, 2.0, 1, mode="hybrid")
+        models.store_run_result(5, 4.0, 0, mode="baseline")
+        by_mode = models.get_cache_statistics()["by_mode"]
+        assert by_mode["hybrid"]["cache_hit_rate"] == 100
+        assert by_mode["baseline"]["avg_execution_time"] == 4.0
+
+    def test_wal_mode(self, db):
+        assert models.get_connection().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+class TestRollups:
+    """Test incrementally maintained aggregates."""
+
+    def test_series_buckets_runs(self, db, monkeypatch):
+        clock = [7200.0]
+        monkeypatch.setattr(models.time, "time", lambda: clock[0])
+        models.store_run_result(2, 1.0, 0)
+        models.store_run_result(4, 3.0, 1)
+        clock[0] = 7200.0 + 3600
+        models.store_run_result(6, 5.0, 0)
+
+        series = models.get_run_series("hour")
+        assert [p["bucket"] for p in series] == [7200, 10800]
+        assert series[0]["runs"] == 2
+        assert series[0]["avg_time"] == 2.0
+        assert series[0]["min_time"] == 1.0
+        assert series[0]["max_time"] == 3.0
+        assert series[1]["avg_tests"] == 6
+
+        daily = models.get_run_series("day")
+        assert len(daily) == 1
+        assert daily[0]["runs"] == 3
+
+    def test_series_is_downsampled(self, db, monkeypatch):
+        clock = [0.0]
+        monkeypatch.setattr(models.time, "time", lambda: clock[0])
+        for hour in range(30):
+            clock[0] = hour * 3600.0
+            models.store_run_result(1, 1.0, 0)
+        series = models.get_run_series("hour", points=10)
+        assert len(series) == 10
+        assert series[-1]["bucket"] == 29 * 3600
+
+    def test_averages_from_totals(self, db):
+        models.store_run_result(2, 1.0, 0)
+        models.store_run_result(4, 3.0, 0)
+        assert models.get_run_averages() == (2.0, 3.0)
+
+    def test_backfill_existing_runs(self, tmp_path, monkeypatch):
+        import sqlite3
+        path = str(tmp_path / "legacy.db")
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE runs (id INTEGER PRIMARY KEY AUTOINCREMENT, tests_run INTEGER, time_taken REAL, "
+            "cache_hit INTEGER, mode TEXT DEFAULT 'hybrid', languages TEXT, language_breakdown TEXT)"
+        )
+        conn.executemany("INSERT INTO runs (tests_run, time_taken, cache_hit) VALUES (?, ?, ?)", [(3, 1.0, 1), (3, 2.0, 0)])
+        conn.commit()
+        conn.close()
+
+        monkeypatch.setattr(models, "DB_PATH", path)
+        try:
+            models.init_db()
+            stats = models.get_cache_statistics()
+            assert stats["total_runs"] == 2
+            assert stats["cache_hits"] == 1
+            assert sum(p["runs"] for p in models.get_run_series("day")) == 2
+        finally:
+            models.close_connection()
+
+class TestRunHistory:
+    """Test keyset pagination, filters and normalized languages."""
+
+    def test_pages_follow_cursor(self, db):
+        for i in range(7):
+            models.store_run_result(i, 1.0, 0)
+        first = models.get_runs_page(limit=3)
+        assert [r["tests_run"] for r in first["runs"]] == [6, 5, 4]
+        second = models.get_runs_page(limit=3, before=first["next_cursor"])
+        assert [r["tests_run"] for r in second["runs"]] == [3, 2, 1]
+        last = models.get_runs_page(limit=3, before=second["next_cursor"])
+        assert [r["tests_run"] for r in last["runs"]] == [0]
+        assert last["next_cursor"] is None
+
+    def test_filters(self, db, monkeypatch):
+        clock = [100.0]
+        monkeypatch.setattr(models.time, "time", lambda: clock[0])
+        models.store_run_result(1, 1.0, 1, mode="hybrid")
+        clock[0] = 200.0
+        models.store_run_result(2, 1.0, 0, mode="baseline")
+        clock[0] = 300.0
+        models.store_run_result(3, 1.0, 1, mode="baseline")
+
+        assert [r["tests_run"] for r in models.iter_runs(mode="baseline")] == [3, 2]
+        assert [r["tests_run"] for r in models.iter_runs(cache_hit=1)] == [3, 1]
+        assert [r["tests_run"] for r in models.iter_runs(mode="baseline", cache_hit=0)] == [2]
+        assert [r["tests_run"] for r in models.iter_runs(since=150, until=300)] == [2]
+
+    def test_language_filter(self, db):
+        models.store_run_result(2, 1.0, 0, languages=["python", "javascript"],
+                                language_breakdown={"python": 1, "javascript": 1})
+        models.store_run_result(1, 1.0, 0, languages=["go"])
+        models.store_run_result(0, 1.0, 1)
+
+        runs = list(models.iter_runs(language="python"))
+        assert len(runs) == 1
+        assert runs[0]["languages"] == ["javascript", "python"]
+        assert runs[0]["language_breakdown"] == {"javascript": 1, "python": 1}
+
+        go_run, = models.iter_runs(language="go")
+        assert go_run["language_breakdown"] is None
+        assert models.get_runs(limit=1)[0][5] is None
+
+    def test_json_strings_accepted(self, db):
+        models.store_run_result(1, 1.0, 0, languages='["python"]', language_breakdown='{"python": 1}')
+        row = models.get_runs()[0]
+        assert row[5] == '["python"]'
+        assert row[6] == '{"python": 1}'
+
+    def test_filters_use_indexes(self, db):
+        conn = models.get_connection()
+        for kwargs in ({"mode": "hybrid"}, {"cache_hit": 1}, {"language": "python"}):
+            sql, params = models._runs_query(10, 100, kwargs.get("mode"), kwargs.get("cache_hit"),
+                                             kwargs.get("language"), None, None)
+            plan = " ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+            assert "USING" in plan
+            assert "TEMP B-TREE" not in plan
+
+    def test_migrates_language_columns(self, tmp_path, monkeypatch):
+        import sqlite3
+        path = str(tmp_path / "legacy.db")
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE runs (id INTEGER PRIMARY KEY AUTOINCREMENT, tests_run INTEGER, time_taken REAL, "
+            "cache_hit INTEGER, mode TEXT DEFAULT 'hybrid', languages TEXT, language_breakdown TEXT)"
+        )
+        conn.executemany(
+            "INSERT INTO runs (tests_run, time_taken, cache_hit, languages, language_breakdown) VALUES (?, ?, ?, ?, ?)",
+            [(3, 1.0, 1, '["python", "go"]', '{"python": 2, "go": 1}'), (1, 1.0, 0, None, None), (1, 1.0, 0, "oops", None)]
+        )
+        conn.commit()
+        conn.close()
+
+        monkeypatch.setattr(models, "DB_PATH", path)
+        try:
+            models.init_db()
+            runs = list(models.iter_runs(language="go"))
+            assert [r["id"] for r in runs] == [1]
+            assert runs[0]["language_breakdown"] == {"go": 1, "python": 2}
+            leftover = models.get_connection().execute(
+                "SELECT COUNT(*) FROM runs WHERE languages IS NOT NULL"
+            ).fetchone()[0]
+            assert leftover == 0
+            models.init_db()
+            assert len(list(models.iter_runs(language="python"))) == 1
+        finally:
+            models.close_connection()
+
+class TestTestResults:
+    """Test per-test results and the moving-average stats kept from them."""
+
+    def record(self, duration, status="passed", cached=False, retries=0):
+        return {"status": status, "duration": duration, "cached": cached, "retries": retries}
+
+    def test_durations_are_moving_averages(self, db):
+        for duration in (10.0, 2.0, 4.0):
+            models.store_run_result(1, duration, 0, test_results={"test_a.py": self.record(duration)})
+        models.store_run_result(1, 1.0, 0, test_results={"test_b.py": self.record(1.0)})
+
+        # 10, then 10 + 0.2 * (2 - 10), then 8.4 + 0.2 * (4 - 8.4)
+        assert models.get_test_durations() == {"test_a.py": pytest.approx(7.52), "test_b.py": 1.0}
+        assert models.get_test_durations(["test_b.py", "test_c.py"]) == {"test_b.py": 1.0}
+
+    def test_cached_results_not_recorded(self, db):
+        models.store_run_result(2, 1.0, 0, test_results={
+            "test_a.py": self.record(1.0), "test_b.py": self.record(0.0, cached=True)
+        })
+        models.store_run_result(1, 0.1, 1, test_results={"test_a.py": self.record(9.0)})
+        models.flush_runs()
+        rows = models.get_connection().execute("SELECT test, status, duration, retries FROM test_results").fetchall()
+        assert rows == [("test_a.py", "passed", 1.0, 0)]
+
+    def test_failure_rate_and_flakiness(self, db):
+        for status in ("failed", "passed", "passed", "failed"):
+            models.store_run_result(1, 1.0, 0, test_results={"test_a.py": self.record(2.0, status)})
+        models.store_run_result(1, 1.0, 0, test_results={"test_a.py": self.record(0.0, "skipped")})
+        models.store_run_result(1, 1.0, 0, test_results={"test_b.py": self.record(1.0, retries=2)})
+
+        stats = models.get_test_stats()
+        assert stats["test_a.py"] == {"duration": 2.0, "failure_rate": pytest.approx(0.712), "flakiness": 0, "runs": 4}
+        assert stats["test_b.py"]["flakiness"] == 1
+        assert stats["test_b.py"]["failure_rate"] == 0
+        assert models.get_test_stats(["test_c.py"]) == {}
+
+    def test_stats_chunked(self, db, monkeypatch):
+        monkeypatch.setattr(models, "SQL_IN_CHUNK", 3)
+        results = {f"test_{i}.py": self.record(float(i)) for i in range(10)}
+        models.store_run_result(10, 1.0, 0, test_results=results)
+        assert models.get_test_durations(sorted(results)) == {t: r["duration"] for t, r in results.items()}
+
+    def test_backfill_from_existing_results(self, tmp_path, monkeypatch):
+        import sqlite3
+        path = str(tmp_path / "results.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE runs (id INTEGER PRIMARY KEY AUTOINCREMENT, tests_run INTEGER, time_taken REAL, "
+                     "cache_hit INTEGER, mode TEXT DEFAULT 'hybrid', created_at REAL)")
+        conn.execute("CREATE TABLE test_results (run_id INTEGER NOT NULL, test TEXT NOT NULL, status TEXT NOT NULL, "
+                     "duration REAL, PRIMARY KEY (run_id, test)) WITHOUT ROWID")
+        conn.executemany("INSERT INTO test_results VALUES (?, 'test_a.py', ?, ?)",
+                         [(2, "passed", 2.0), (1, "failed", 10.0)])
+        conn.commit()
+        conn.close()
+
+        monkeypatch.setattr(models, "DB_PATH", path)
+        try:
+            models.init_db()
+            stats = models.get_test_stats()["test_a.py"]
+            assert stats["runs"] == 2
+            assert stats["duration"] == pytest.approx(8.4)
+            assert stats["failure_rate"] == pytest.approx(0.8)
+            models.init_db()
+            assert models.get_test_stats()["test_a.py"]["runs"] == 2
+        finally:
+            models.close_connection()
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])